@@ -0,0 +1,191 @@
+# trunk-ignore-all(black)
+"""
+Admission control for pipeline runs.
+
+Limits how many pipelines run at once in this worker, and how many nodes they
+hold in flight, weighted by node kind: an LLM-heavy pipeline counts for more
+than a chain of text nodes. Runs over the limits wait for at most
+ADMISSION_QUEUE_TIMEOUT seconds, in a queue bounded per tenant and in total;
+tenants take turns by weighted deficit round robin over run cost (see
+tenants.py). When the queue is full or the wait runs out, they are rejected right away with a Retry-After estimate. Throughput
+then stays at what the admitted runs achieve, instead of every request slowing
+down until all of them time out.
+"""
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, Optional
+import asyncio
+import math
+import os
+import time
+
+from tenants import DEFAULT_TENANT, FairQueue, Tenants, tenants as default_tenants
+
+MAX_CONCURRENT_PIPELINES = int(os.getenv('MAX_CONCURRENT_PIPELINES', '32'))
+
+# Weighted nodes (see NODE_COST_WEIGHTS) of all admitted pipelines together
+MAX_INFLIGHT_NODES = int(os.getenv('MAX_INFLIGHT_NODES', '2048'))
+
+# Runs waiting for admission, per tenant and across all tenants
+ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', '64'))
+ADMISSION_QUEUE_TOTAL = int(os.getenv('ADMISSION_QUEUE_TOTAL', '512'))
+
+# Weighted nodes a tenant may get admitted per round of the fair queue
+ADMISSION_QUANTUM = float(os.getenv('ADMISSION_QUANTUM', '64'))
+
+# Seconds a run may wait for admission before it is rejected
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '5'))
+
+# Admission cost of a node by kind; other kinds cost 1
+NODE_COST_WEIGHTS = {
+    'llm': 10,
+    'timer': 2,
+    'notification': 2,
+}
+
+# Recent run durations kept for the Retry-After estimate
+DURATION_SAMPLES = 256
+
+
+class AdmissionRejected(Exception):
+    """Raised when a run can't be admitted; `retry_after` is in seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def pipeline_cost(kinds: Iterable[str]) -> int:
+    """Admission cost of a pipeline from the kinds of its nodes"""
+    return sum(NODE_COST_WEIGHTS.get(kind, 1) for kind in kinds)
+
+
+class AdmissionController:
+    """Pipeline and weighted-node limits with a bounded, deadline-limited wait queue"""
+
+    def __init__(self, max_pipelines: int = MAX_CONCURRENT_PIPELINES, max_nodes: int = MAX_INFLIGHT_NODES, max_queue: int = ADMISSION_QUEUE_SIZE, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, tenants: Tenants = default_tenants, max_total_queue: int = ADMISSION_QUEUE_TOTAL):
+        self.max_pipelines = max_pipelines
+        self.max_nodes = max_nodes
+        self.max_queue = max_queue
+        # Tenant ids are chosen by clients, so the per-tenant bound alone doesn't bound the queue
+        self.max_total_queue = max_total_queue
+        self.queue_timeout = queue_timeout
+        self.tenants = tenants
+        self.running = 0
+        self.inflight_nodes = 0
+        self._queue = FairQueue(ADMISSION_QUANTUM, tenants.weight)
+        self._durations: Deque[float] = deque(maxlen=DURATION_SAMPLES)
+        self.admitted = 0
+        self.completed = 0
+        self.rejected: Dict[str, int] = {'queue_full': 0, 'queue_timeout': 0}
+        self._total_wait = 0.0
+
+    def _fits(self, cost: int) -> bool:
+        return self.running < self.max_pipelines and self.inflight_nodes + cost <= self.max_nodes
+
+    def _can_start(self, tenant: str, cost: float = 0.0) -> bool:
+        return self.tenants.can_start_pipeline(tenant)
+
+    def _take(self, tenant: str, cost: int) -> None:
+        self.running += 1
+        self.inflight_nodes += cost
+        self.tenants.stats_for(tenant).pipelines += 1
+
+    def _wake(self) -> None:
+        # The run whose turn it is waits until it fits, so large runs aren't
+        # overtaken by smaller ones forever
+        while True:
+            entry = self._queue.peek(self._can_start)
+            if entry is None:
+                return
+            tenant, waiter, cost = entry
+            if not waiter.done():
+                if not self._fits(cost):
+                    return
+                self._take(tenant, cost)
+                waiter.set_result(None)
+            self._queue.pop_head()
+
+    def _leave(self, tenant: str, waiter: asyncio.Future) -> None:
+        waiter.cancel()
+        self._queue.remove(tenant, waiter)
+        # Runs queued behind this one may fit now
+        self._wake()
+
+    def retry_after(self) -> int:
+        """Seconds until a new run would likely be admitted"""
+        average = sum(self._durations) / len(self._durations) if self._durations else 1.0
+        return max(1, math.ceil(average * (len(self._queue) + 1) / self.max_pipelines))
+
+    def _reject(self, tenant: str, reason: str) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        self.tenants.stats_for(tenant).rejected += 1
+        message = 'Admission queue is full' if reason == 'queue_full' else f'Not admitted within {self.queue_timeout:g}s'
+        return AdmissionRejected(message, self.retry_after())
+
+    async def acquire(self, cost: int, tenant: str = DEFAULT_TENANT) -> None:
+        start = time.monotonic()
+        if not self._queue and self._fits(cost) and self._can_start(tenant):
+            self._take(tenant, cost)
+        else:
+            if self._queue.queued(tenant) >= self.max_queue or len(self._queue) >= self.max_total_queue:
+                raise self._reject(tenant, 'queue_full')
+            waiter = asyncio.get_running_loop().create_future()
+            self._queue.push(tenant, waiter, cost)
+            # Capacity may be held back only by other tenants' caps
+            self._wake()
+            try:
+                await asyncio.wait({waiter}, timeout=self.queue_timeout)
+            except asyncio.CancelledError:
+                if waiter.done():
+                    # Admitted just before being cancelled: hand the capacity on
+                    self.release(cost, tenant)
+                else:
+                    self._leave(tenant, waiter)
+                raise
+            if not waiter.done():
+                self._leave(tenant, waiter)
+                raise self._reject(tenant, 'queue_timeout')
+        self.admitted += 1
+        self._total_wait += time.monotonic() - start
+
+    def release(self, cost: int, tenant: str = DEFAULT_TENANT, duration: Optional[float] = None) -> None:
+        self.running -= 1
+        self.inflight_nodes -= cost
+        self.tenants.stats_for(tenant).pipelines -= 1
+        if duration is not None:
+            self.completed += 1
+            self._durations.append(duration)
+        self._wake()
+
+    @asynccontextmanager
+    async def admit(self, cost: int, tenant: str = DEFAULT_TENANT) -> AsyncIterator[None]:
+        """Hold a run's admission; a pipeline costing more than the limit runs alone"""
+        cost = min(cost, self.max_nodes)
+        await self.acquire(cost, tenant)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(cost, tenant, time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_pipelines': self.max_pipelines,
+            'max_inflight_nodes': self.max_nodes,
+            'max_queue': self.max_queue,
+            'max_total_queue': self.max_total_queue,
+            'queue_timeout': self.queue_timeout,
+            'running': self.running,
+            'inflight_nodes': self.inflight_nodes,
+            'queued': len(self._queue),
+            'admitted': self.admitted,
+            'completed': self.completed,
+            'rejected': dict(self.rejected),
+            'avg_wait': self._total_wait / self.admitted if self.admitted else 0.0,
+            'retry_after': self.retry_after()
+        }
+
+
+admission = AdmissionController()
@@ -0,0 +1,109 @@
+# trunk-ignore-all(black)
+"""
+Compare compiled calculator expressions with interpreted evaluation.
+
+The interpreted baseline walks the parsed syntax tree once per row, the way a
+straightforward evaluator would. Compiled expressions are evaluated over whole
+arrays, with numpy if it is installed:
+
+    python benchmark_expressions.py [repeats]
+"""
+from array import array
+import ast
+import operator
+import random
+import sys
+import time
+
+import expressions
+from expressions import ELEMENTWISE_FUNCTIONS, compile_expression
+
+EXPRESSIONS = (
+    '(input_1 * 1.2 + input_2) / n',
+    'where(input_1 > 50, sqrt(input_1), abs(input_2 - 1)) * 2 + input_1 ** 2',
+)
+ROWS = (1_000, 100_000)
+
+OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Gt: operator.gt,
+    ast.Lt: operator.lt,
+}
+
+
+def interpret(node, env):
+    """Evaluate a syntax tree for one row"""
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        return env[node.id]
+    if isinstance(node, ast.BinOp):
+        return OPERATORS[type(node.op)](interpret(node.left, env), interpret(node.right, env))
+    if isinstance(node, ast.UnaryOp):
+        return OPERATORS[type(node.op)](interpret(node.operand, env))
+    if isinstance(node, ast.Compare):
+        return OPERATORS[type(node.ops[0])](interpret(node.left, env), interpret(node.comparators[0], env))
+    if isinstance(node, ast.Call):
+        return ELEMENTWISE_FUNCTIONS[node.func.id][0](*(interpret(arg, env) for arg in node.args))
+    raise ValueError(f'Unsupported syntax: {type(node).__name__}')
+
+
+def best_of(repeats, function):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    rng = random.Random(0)
+    backend = 'numpy' if expressions.numpy is not None else 'python'
+
+    print(f'| Expression | Rows | Interpreted (ms) | Compiled, {backend} (ms) | Speedup |')
+    print('| --- | ---: | ---: | ---: | ---: |')
+    for text in EXPRESSIONS:
+        tree = ast.parse(text, mode='eval').body
+        for rows in ROWS:
+            variables = {
+                'input_1': array('d', (rng.uniform(0, 100) for _ in range(rows))),
+                'input_2': array('d', (rng.uniform(0, 100) for _ in range(rows))),
+                'n': float(rows),
+            }
+            columns = [(name, value) for name, value in variables.items() if isinstance(value, array)]
+            scalars = {name: value for name, value in variables.items() if not isinstance(value, array)}
+
+            # Loop variables are bound as defaults so the closures time this row count
+            def interpreted(tree=tree, scalars=scalars, columns=columns, rows=rows):
+                return [interpret(tree, {**scalars, **{name: column[i] for name, column in columns}}) for i in range(rows)]
+
+            def compiled(text=text, variables=variables):
+                return compile_expression(text).evaluate(variables)
+
+            expected = interpreted()
+            result = compiled()
+            assert all(abs(a - b) <= 1e-9 * max(1.0, abs(a)) for a, b in zip(expected, result, strict=True))
+
+            slow = best_of(repeats, interpreted)
+            fast = best_of(repeats, compiled)
+            print(f'| `{text}` | {rows:,} | {slow * 1000:,.1f} | {fast * 1000:,.2f} | {slow / fast:,.1f}x |')
+
+    compile_expression.cache_clear()
+    first = best_of(1, lambda: compile_expression(EXPRESSIONS[1]))
+    cached = best_of(repeats, lambda: compile_expression(EXPRESSIONS[1]))
+    print()
+    print(f'Compiling `{EXPRESSIONS[1]}`: {first * 1e6:,.0f} us; cached lookup: {cached * 1e6:,.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# trunk-ignore-all(black)
+"""
+Benchmark graph validation and ordering on large generated pipelines.
+
+Compares the previous dict-of-lists implementation (an `is_dag` pass followed
+by a separate `get_topological_order` pass) with `graph.compile_graph`, which
+does both, plus levels, in one pass over a CSR graph:
+
+    python benchmark_graph.py [max_nodes]
+"""
+from collections import defaultdict, deque
+import random
+import sys
+import time
+import tracemalloc
+
+from graph import compile_graph
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+EDGES_PER_NODE = 2
+
+
+def generated_pipeline(num_nodes, seed=0):
+    """Random DAG: every node but the first reads from up to EDGES_PER_NODE earlier nodes"""
+    rng = random.Random(seed)
+    nodes = [{'id': f'node_{i}', 'type': 'text', 'data': {}} for i in range(num_nodes)]
+    edges = []
+    for i in range(1, num_nodes):
+        for _ in range(EDGES_PER_NODE):
+            source = rng.randrange(max(0, i - 64), i)
+            edges.append({'source': f'node_{source}', 'target': f'node_{i}'})
+    return nodes, edges
+
+
+def legacy_is_dag(nodes, edges):
+    graph = defaultdict(list)
+    in_degree = defaultdict(int)
+    for node in nodes:
+        in_degree[node['id']] = 0
+    for edge in edges:
+        graph[edge['source']].append(edge['target'])
+        in_degree[edge['target']] += 1
+    queue = deque([node_id for node_id in in_degree if in_degree[node_id] == 0])
+    processed_count = 0
+    while queue:
+        current = queue.popleft()
+        processed_count += 1
+        for neighbor in graph[current]:
+            in_degree[neighbor] -= 1
+            if in_degree[neighbor] == 0:
+                queue.append(neighbor)
+    return processed_count == len(nodes)
+
+
+def legacy_topological_order(nodes, edges):
+    graph = defaultdict(list)
+    in_degree = defaultdict(int)
+    for node in nodes:
+        in_degree[node['id']] = 0
+    for edge in edges:
+        graph[edge['source']].append(edge['target'])
+        in_degree[edge['target']] += 1
+    queue = deque([node_id for node_id in in_degree if in_degree[node_id] == 0])
+    result = []
+    while queue:
+        current = queue.popleft()
+        result.append(current)
+        for neighbor in graph[current]:
+            in_degree[neighbor] -= 1
+            if in_degree[neighbor] == 0:
+                queue.append(neighbor)
+    return result
+
+
+def legacy(nodes, edges):
+    return legacy_is_dag(nodes, edges), legacy_topological_order(nodes, edges)
+
+
+def compiled(nodes, edges):
+    graph = compile_graph(nodes, edges)
+    return graph.is_dag, graph.order_ids()
+
+
+def measure(func, nodes, edges):
+    start = time.perf_counter()
+    result = func(nodes, edges)
+    elapsed = (time.perf_counter() - start) * 1000
+    del result
+
+    tracemalloc.start()
+    func(nodes, edges)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+def main():
+    max_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1]
+
+    print('| Nodes | Edges | Implementation | Time (ms) | Peak memory (MiB) |')
+    print('| ---: | ---: | --- | ---: | ---: |')
+    for size in SIZES:
+        if size > max_nodes:
+            break
+        nodes, edges = generated_pipeline(size)
+        assert legacy(nodes, edges)[1] == compiled(nodes, edges)[1]
+        for name, func in (('legacy (2 passes)', legacy), ('compiled (CSR)', compiled)):
+            elapsed, peak = measure(func, nodes, edges)
+            print(f'| {size:,} | {len(edges):,} | {name} | {elapsed:,.1f} | {peak:,.1f} |')
+
+    # Cycle reporting: close a long loop at the end of the largest graph measured
+    nodes, edges = generated_pipeline(min(max_nodes, SIZES[-1]))
+    edges.append({'source': nodes[-1]['id'], 'target': nodes[len(nodes) // 2]['id']})
+    start = time.perf_counter()
+    graph = compile_graph(nodes, edges)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f'\nCycle of {len(graph.cycle) - 1:,} nodes found in {elapsed:,.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
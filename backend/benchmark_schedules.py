@@ -0,0 +1,69 @@
+# trunk-ignore-all(black)
+"""
+Measure the scheduler with many schedules.
+
+Adds interval schedules (stored in a temporary database), measures the CPU the
+idle scheduler uses while none is due, then makes them all due at once and
+times how long firing and running them (with a no-op pipeline) takes:
+
+    python benchmark_schedules.py [schedules] [idle seconds]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from schedules import Schedule, Scheduler, ScheduleStore
+
+
+async def measure(count: int, idle: float) -> None:
+    runs = 0
+
+    async def runner(schedule):
+        nonlocal runs
+        runs += 1
+        return 'success', None
+
+    with tempfile.TemporaryDirectory() as directory:
+        scheduler = Scheduler(ScheduleStore(os.path.join(directory, 'schedules.db')), runner, enabled=True)
+        await scheduler.start()
+
+        start = time.perf_counter()
+        now = time.time()
+        for i in range(count):
+            await scheduler.add(Schedule('benchmark', interval=3600, schedule_id=f'schedule-{i}', start_at=now + 3600 + i % 3600))
+        added = time.perf_counter() - start
+
+        cpu = time.process_time()
+        await asyncio.sleep(idle)
+        idle_cpu = time.process_time() - cpu
+
+        start = time.perf_counter()
+        # Make every schedule due now, in the database too so the ticks can be claimed
+        now = time.time()
+        db = scheduler.store._db()
+        db.execute('UPDATE schedules SET next_tick = ?', (now,))
+        db.commit()
+        for schedule in await scheduler.list(limit=count):
+            schedule.next_tick = schedule.due = now
+            scheduler._push(schedule)
+        while runs < count:
+            await asyncio.sleep(0.01)
+        fired = time.perf_counter() - start
+        await scheduler.stop()
+
+    print(f'| {count:,} | {added / count * 1e6:,.0f} | {idle_cpu * 1000:,.1f} ms over {idle:g} s | {fired:,.2f} | {count / fired:,.0f} |')
+
+
+def main():
+    counts = [int(sys.argv[1])] if len(sys.argv) > 1 else [1_000, 10_000, 50_000]
+    idle = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    print('| Schedules | Add, stored (us each) | Idle CPU | Fire and run all (s) | Runs/s |')
+    print('| ---: | ---: | ---: | ---: | ---: |')
+    for count in counts:
+        asyncio.run(measure(count, idle))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# trunk-ignore-all(black)
+"""
+Simulate FIFO and critical-path scheduling on synthetic pipelines.
+
+Generates random DAGs with a mix of cheap nodes and a few expensive ones (LLM
+calls, delays), runs them through `scheduling.simulate` with a limited number of
+worker slots and reports the mean makespan of each policy, relative to the
+lower bound max(critical path, total work / slots):
+
+    python benchmark_scheduling.py [num_graphs]
+"""
+import random
+import statistics
+import sys
+
+from scheduling import SCHEDULING_POLICIES, simulate, upward_ranks
+
+SIZES = (50, 200, 1000)
+WORKERS = (2, 4, 8)
+
+# (probability, mean seconds) of the node kinds in a generated pipeline
+COST_MIX = ((0.7, 0.1), (0.2, 0.5), (0.1, 3.0))
+
+
+def generated_pipeline(num_nodes, rng):
+    """Random DAG in topological order; nodes read from up to 3 of the previous 20"""
+    order = [f'node_{i}' for i in range(num_nodes)]
+    successors = {node_id: [] for node_id in order}
+    for i in range(1, num_nodes):
+        for source in rng.sample(range(max(0, i - 20), i), min(i, rng.randint(1, 3))):
+            successors[order[source]].append(order[i])
+
+    costs = {node_id: rng.expovariate(1 / cost_mean(rng.random())) for node_id in order}
+    return order, successors, costs
+
+
+def cost_mean(draw):
+    """Mean cost of the node kind a uniform draw in [0, 1) falls on in COST_MIX"""
+    for probability, mean in COST_MIX:
+        if draw < probability:
+            return mean
+        draw -= probability
+    return COST_MIX[-1][1]
+
+
+def lower_bound(order, successors, costs, workers):
+    critical_path = max(upward_ranks(order, successors, costs).values())
+    return max(critical_path, sum(costs.values()) / workers)
+
+
+def main():
+    num_graphs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = random.Random(0)
+
+    print('| Nodes | Slots | ' + ' | '.join(f'{policy} (s)' for policy in SCHEDULING_POLICIES) + ' | Speedup | FIFO / bound | critical_path / bound |')
+    print('| ---: | ---: | ' + ' | '.join('---:' for _ in SCHEDULING_POLICIES) + ' | ---: | ---: | ---: |')
+    for size in SIZES:
+        graphs = [generated_pipeline(size, rng) for _ in range(num_graphs)]
+        for workers in WORKERS:
+            makespans = {policy: [] for policy in SCHEDULING_POLICIES}
+            ratios = {policy: [] for policy in SCHEDULING_POLICIES}
+            for order, successors, costs in graphs:
+                bound = lower_bound(order, successors, costs, workers)
+                for policy in SCHEDULING_POLICIES:
+                    makespan = simulate(order, successors, costs, workers, policy)
+                    makespans[policy].append(makespan)
+                    ratios[policy].append(makespan / bound)
+            means = [statistics.mean(makespans[policy]) for policy in SCHEDULING_POLICIES]
+            print(
+                f'| {size:,} | {workers} | ' + ' | '.join(f'{mean:,.2f}' for mean in means)
+                + f' | {means[0] / means[1]:.2f}x | {statistics.mean(ratios["fifo"]):.3f} | {statistics.mean(ratios["critical_path"]):.3f} |'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# trunk-ignore-all(black)
+"""
+Benchmark request/response encodings for /pipelines/parse.
+
+Runs a few typical pipelines once to get realistic results, then measures
+encode/decode time and payload size for every supported wire format:
+
+    python benchmark_wire_formats.py [iterations]
+"""
+import asyncio
+import gzip
+import json
+import sys
+import time
+
+import wire
+from main import PipelineData, PipelineResult, run_pipeline
+
+CSV_ROWS = 5000
+
+
+def typical_pipelines():
+    csv_text = 'id,name,score,city\n' + '\n'.join(
+        f'{i},user_{i},{(i * 37) % 100}.5,city_{i % 20}' for i in range(CSV_ROWS)
+    )
+    article = ('Great results from the pipeline team. Contact ops@example.com for details. ' * 600).strip()
+
+    return {
+        'small': {
+            'nodes': [
+                {'id': 'input_1', 'type': 'customInput', 'data': {'inputType': 'Number', 'inputValue': '20'}},
+                {'id': 'input_2', 'type': 'customInput', 'data': {'inputType': 'Number', 'inputValue': '22'}},
+                {'id': 'calculator_1', 'type': 'calculatorNode', 'data': {'operation': 'add'}},
+                {'id': 'output_1', 'type': 'customOutput', 'data': {'outputFormat': 'text'}},
+            ],
+            'edges': [
+                {'source': 'input_1', 'target': 'calculator_1'},
+                {'source': 'input_2', 'target': 'calculator_1'},
+                {'source': 'calculator_1', 'target': 'output_1'},
+            ],
+        },
+        'text': {
+            'nodes': [
+                {'id': 'input_1', 'type': 'customInput', 'data': {'inputType': 'Text', 'inputValue': article}},
+                {'id': 'text_1', 'type': 'text', 'data': {'text': 'Summary: {{input}}'}},
+                {'id': 'filter_1', 'type': 'filterNode', 'data': {'filterType': 'contains', 'filterValue': 'great'}},
+                {'id': 'timer_1', 'type': 'timerNode', 'data': {'mode': 'timeout'}},
+                {'id': 'notification_1', 'type': 'notificationNode', 'data': {'notificationType': 'slack'}},
+            ],
+            'edges': [
+                {'source': 'input_1', 'target': 'text_1'},
+                {'source': 'text_1', 'target': 'filter_1'},
+                {'source': 'filter_1', 'target': 'timer_1'},
+                {'source': 'timer_1', 'target': 'notification_1'},
+            ],
+            'options': {'include_intermediate': True},
+        },
+        'tabular': {
+            'nodes': [
+                {'id': 'input_1', 'type': 'customInput', 'data': {'inputType': 'File', 'inputValue': csv_text}},
+                {'id': 'dataFormat_1', 'type': 'dataFormat', 'data': {'outputFormat': 'json'}},
+                {'id': 'calculator_1', 'type': 'calculatorNode', 'data': {'operation': 'average', 'column': 'score'}},
+                {'id': 'output_1', 'type': 'customOutput', 'data': {'outputFormat': 'json'}},
+            ],
+            'edges': [
+                {'source': 'input_1', 'target': 'dataFormat_1'},
+                {'source': 'dataFormat_1', 'target': 'calculator_1'},
+                {'source': 'calculator_1', 'target': 'output_1'},
+            ],
+            'options': {'include_intermediate': True},
+        },
+    }
+
+
+def formats():
+    """(name, encode(python) -> bytes, decode(bytes) -> python-or-model)"""
+    codecs = [
+        ('json (stdlib)', lambda obj: json.dumps(obj).encode('utf-8'), json.loads),
+        ('json (pydantic)', None, None),
+    ]
+    if wire.msgpack is not None:
+        codecs.append(('msgpack', wire.encode_msgpack, wire.decode_msgpack))
+    compressions = [
+        ('identity', lambda b: b, lambda b: b),
+        ('gzip', lambda b: gzip.compress(b, compresslevel=wire.GZIP_LEVEL, mtime=0), lambda b: wire.decompress(b, 'gzip')),
+    ]
+    if wire.zstandard is not None:
+        zstd = wire.zstandard.ZstdCompressor(level=wire.ZSTD_LEVEL)
+        compressions.append(('zstd', zstd.compress, lambda b: wire.decompress(b, 'zstd')))
+    return codecs, compressions
+
+
+def timed(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        value = func()
+    return (time.perf_counter() - start) / iterations * 1000, value
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    codecs, compressions = formats()
+
+    print('| Pipeline | Format | Encoding | Request bytes | Request decode (ms) | Response bytes | Response encode (ms) |')
+    print('| --- | --- | --- | ---: | ---: | ---: | ---: |')
+    for name, pipeline in typical_pipelines().items():
+        data = PipelineData.model_validate(pipeline)
+        result: PipelineResult = asyncio.run(run_pipeline(data))
+        request_obj = data.model_dump(mode='json')
+
+        for codec_name, encode, decode in codecs:
+            for encoding, compress, decompress in compressions:
+                # Loop variables are bound as defaults so each closure times its own codec
+                if encode is None:
+                    request_body = compress(data.model_dump_json().encode('utf-8'))
+
+                    def decode_request(body=request_body, decompress=decompress):
+                        return PipelineData.model_validate_json(decompress(body))
+
+                    def encode_response(result=result, compress=compress):
+                        return compress(result.model_dump_json().encode('utf-8'))
+                else:
+                    request_body = compress(encode(request_obj))
+
+                    def decode_request(body=request_body, decompress=decompress, decode=decode):
+                        return PipelineData.model_validate(decode(decompress(body)))
+
+                    def encode_response(result=result, compress=compress, encode=encode):
+                        return compress(encode(result.model_dump(mode='json')))
+
+                decode_ms, _ = timed(decode_request, iterations)
+                encode_ms, response_body = timed(encode_response, iterations)
+                print(f'| {name} | {codec_name} | {encoding} | {len(request_body):,} | {decode_ms:.2f} | {len(response_body):,} | {encode_ms:.2f} |')
+
+
+if __name__ == '__main__':
+    main()
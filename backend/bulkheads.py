@@ -0,0 +1,206 @@
+# trunk-ignore-all(black)
+"""
+Per-node-kind concurrency pools (bulkheads).
+
+Each node kind runs in its own pool with a limit on concurrent nodes and on
+nodes waiting for a slot, across all running pipelines. A surge of slow LLM
+calls or long timers fills their own pools and queues there, while text,
+filter and calculator nodes keep their slots. Nodes that find the queue full
+fail right away instead of waiting behind the backlog.
+
+Waiting nodes are queued per tenant and get free slots by weighted deficit
+round robin over their estimated cost (see tenants.py), so one tenant's batch
+doesn't hold up the nodes of the others.
+
+Limits are configured per kind as `kind=limit:queue` pairs, e.g.
+`NODE_POOLS="llm=4:64,timer=128:1024"`.
+"""
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+import asyncio
+import os
+import time
+
+from tenants import DEFAULT_TENANT, FairQueue, Tenants, percentile, tenants as default_tenants
+
+# kind -> (concurrent nodes, nodes waiting for a slot)
+DEFAULT_POOL_LIMITS: Dict[str, Tuple[int, int]] = {
+    'llm': (8, 256),
+    'timer': (256, 4096),
+    'notification': (16, 256),
+    'input': (64, 1024),
+    'text': (64, 1024),
+    'output': (64, 1024),
+    'calculator': (64, 1024),
+    'filter': (64, 1024),
+    'dataformat': (64, 1024),
+    'generic': (32, 512),
+}
+
+# Recent waits kept per pool for the latency percentiles
+WAIT_SAMPLES = 1024
+
+# Nodes waiting in a pool across all tenants, as a multiple of its per-tenant queue
+NODE_POOL_QUEUE_TOTAL_FACTOR = int(os.getenv('NODE_POOL_QUEUE_TOTAL_FACTOR', '4'))
+
+# Estimated node seconds a tenant may start per round of the fair queue
+NODE_POOL_QUANTUM = float(os.getenv('NODE_POOL_QUANTUM', '0.1'))
+
+
+class BulkheadFull(Exception):
+    """Raised when a pool's wait queue is full"""
+
+
+def parse_pool_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """Parse `kind=limit[:queue],...` on top of the defaults"""
+    limits = dict(DEFAULT_POOL_LIMITS)
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        try:
+            kind, values = item.split('=', 1)
+            limit, _, queue = values.partition(':')
+            default_queue = limits.get(kind.strip(), DEFAULT_POOL_LIMITS['generic'])[1]
+            limits[kind.strip()] = (max(int(limit), 1), max(int(queue), 0) if queue else default_queue)
+        except ValueError as e:
+            raise ValueError(f'Invalid NODE_POOLS entry {item!r}; expected kind=limit[:queue]') from e
+    return limits
+
+
+class Bulkhead:
+    """
+    At most `limit` holders at once; up to `max_queue` more per tenant, and
+    `max_total_queue` in all, wait their turn
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, tenants: Tenants = default_tenants, max_total_queue: Optional[int] = None):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_total_queue = max_queue * NODE_POOL_QUEUE_TOTAL_FACTOR if max_total_queue is None else max_total_queue
+        self.tenants = tenants
+        self.active = 0
+        self._queue = FairQueue(NODE_POOL_QUANTUM, tenants.weight)
+        self.peak_active = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._acquired = 0
+
+    def _can_start(self, tenant: str, cost: float = 0.0) -> bool:
+        return self.tenants.can_start_node(tenant)
+
+    def _take(self, tenant: str) -> None:
+        self.active += 1
+        self.tenants.stats_for(tenant).nodes += 1
+
+    async def acquire(self, tenant: str = DEFAULT_TENANT, cost: float = 1.0) -> None:
+        start = time.monotonic()
+        if self.active < self.limit and not self._queue and self._can_start(tenant):
+            self._take(tenant)
+        else:
+            if self._queue.queued(tenant) >= self.max_queue or len(self._queue) >= self.max_total_queue:
+                self.rejected += 1
+                raise BulkheadFull(f'Node pool {self.name!r} is full ({self.limit} running, {self._queue.queued(tenant)} of the tenant\'s and {len(self._queue)} in all waiting)')
+            waiter = asyncio.get_running_loop().create_future()
+            self._queue.push(tenant, waiter, cost)
+            self.peak_queued = max(self.peak_queued, len(self._queue))
+            # Free slots may be held back only by other tenants' caps
+            self._wake()
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Granted a slot just before being cancelled: pass it on
+                    self.release(tenant)
+                else:
+                    self._queue.remove(tenant, waiter)
+                    self._wake()
+                raise
+        self.peak_active = max(self.peak_active, self.active)
+
+        wait = time.monotonic() - start
+        self._waits.append(wait)
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        self._acquired += 1
+
+    def release(self, tenant: str = DEFAULT_TENANT) -> None:
+        self.completed += 1
+        self.active -= 1
+        self.tenants.stats_for(tenant).nodes -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        # Hand free slots to waiting nodes in fair-queue order
+        while self.active < self.limit:
+            entry = self._queue.pop(self._can_start)
+            if entry is None:
+                return
+            tenant, waiter, _ = entry
+            if not waiter.done():
+                self._take(tenant)
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, tenant: str = DEFAULT_TENANT, cost: float = 1.0) -> AsyncIterator[None]:
+        await self.acquire(tenant, cost)
+        try:
+            yield
+        finally:
+            self.release(tenant)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'limit': self.limit,
+            'max_queue': self.max_queue,
+            'max_total_queue': self.max_total_queue,
+            'active': self.active,
+            'queued': len(self._queue),
+            'occupancy': round(self.active / self.limit, 3),
+            'peak_active': self.peak_active,
+            'peak_queued': self.peak_queued,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'wait': {
+                'avg': self._total_wait / self._acquired if self._acquired else 0.0,
+                'max': self._max_wait,
+                'p50': percentile(self._waits, 0.5),
+                'p99': percentile(self._waits, 0.99)
+            }
+        }
+
+
+class NodePools:
+    """One bulkhead per node kind, created on first use"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, int]], tenants: Tenants = default_tenants):
+        self.limits = limits
+        self.tenants = tenants
+        self._pools: Dict[str, Bulkhead] = {}
+
+    def pool(self, kind: str) -> Bulkhead:
+        pool = self._pools.get(kind)
+        if pool is None:
+            limit, max_queue = self.limits.get(kind, self.limits['generic'])
+            pool = self._pools[kind] = Bulkhead(kind, limit, max_queue, self.tenants)
+        return pool
+
+    @asynccontextmanager
+    async def slot(self, kind: str, tenant: str = DEFAULT_TENANT, cost: float = 1.0) -> AsyncIterator[None]:
+        try:
+            async with self.pool(kind).slot(tenant, cost):
+                yield
+        finally:
+            if self.tenants.node_cap(tenant) > 0:
+                # The tenant's nodes waiting in other pools may be under its cap again
+                for pool in self._pools.values():
+                    pool._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        return {kind: self.pool(kind).stats() for kind in sorted(set(self.limits) | set(self._pools))}
+
+
+node_pools = NodePools(parse_pool_limits(os.getenv('NODE_POOLS', '')))
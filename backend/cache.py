@@ -0,0 +1,159 @@
+# trunk-ignore-all(black)
+"""
+Whole-pipeline result cache.
+
+Results of fully deterministic pipelines are kept in a bounded LRU keyed by a
+canonical hash of the pipeline definition. Each entry also memoizes its encoded
+response bodies, and byte-identical request bodies are mapped straight to their
+entry, so a repeat submission costs one hash and a dictionary lookup.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import os
+import time
+
+PIPELINE_CACHE_TTL = float(os.getenv('PIPELINE_CACHE_TTL', '300'))
+PIPELINE_CACHE_MAX_ENTRIES = int(os.getenv('PIPELINE_CACHE_MAX_ENTRIES', '256'))
+PIPELINE_CACHE_MAX_BYTES = int(os.getenv('PIPELINE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+
+def canonical_hash(payload: Any, strict: bool = False) -> str:
+    """
+    Hash a JSON-compatible value independently of key order and whitespace.
+
+    Other values are hashed by their string form, unless `strict` is set, in
+    which case they raise TypeError.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=None if strict else str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def body_hash(body: bytes, content_type: str) -> str:
+    """Hash a raw request body together with the media type it was sent as"""
+    digest = hashlib.sha256(content_type.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class CacheEntry:
+    __slots__ = ('key', 'result', 'bodies', 'size', 'expires')
+
+    def __init__(self, key: str, result: Any, expires: float):
+        self.key = key
+        self.result = result
+        # (media type, accepted encoding) -> (body, applied content encoding)
+        self.bodies: Dict[Tuple[str, Optional[str]], Tuple[bytes, Optional[str]]] = {}
+        self.size = 0
+        self.expires = expires
+
+    @property
+    def etag(self) -> str:
+        # Weak, because the same result is served with different encodings
+        return f'W/"{self.key}"'
+
+
+class PipelineResultCache:
+    """LRU of pipeline results bounded by entry count, encoded bytes and age"""
+
+    def __init__(self, ttl: float = PIPELINE_CACHE_TTL, max_entries: int = PIPELINE_CACHE_MAX_ENTRIES, max_bytes: int = PIPELINE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._aliases: 'OrderedDict[str, str]' = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def get_by_body(self, raw_key: str) -> Optional[CacheEntry]:
+        """Look up an entry by the hash of a previously seen request body"""
+        key = self._aliases.get(raw_key)
+        if key is None or key not in self._entries:
+            return None
+        return self.get(key)
+
+    def put(self, key: str, result: Any) -> CacheEntry:
+        if key in self._entries:
+            self._remove(key)
+        entry = CacheEntry(key, result, time.monotonic() + self.ttl)
+        self._entries[key] = entry
+        self._evict()
+        return entry
+
+    def alias(self, raw_key: str, key: str) -> None:
+        self._aliases[raw_key] = key
+        self._aliases.move_to_end(raw_key)
+        # Aliases are tiny; keep a few per entry for differently formatted bodies
+        while len(self._aliases) > 4 * self.max_entries:
+            self._aliases.popitem(last=False)
+
+    def add_body(self, entry: CacheEntry, variant: Tuple[str, Optional[str]], body: bytes, content_encoding: Optional[str]) -> None:
+        """Memoize an encoded response body for an entry and account for its size"""
+        if entry.key not in self._entries or variant in entry.bodies:
+            return
+        entry.bodies[variant] = (body, content_encoding)
+        entry.size += len(body)
+        self._bytes += len(body)
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._aliases.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'ttl': self.ttl,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
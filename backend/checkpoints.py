@@ -0,0 +1,202 @@
+# trunk-ignore-all(black)
+"""
+Checkpoints of node outputs for resuming failed runs.
+
+With checkpointing enabled, each successful node output is pickled to
+`CHECKPOINT_DIR/<run_id>/` as soon as the node finishes, next to the pipeline
+definition. Resuming a run only re-executes nodes without a checkpoint (failed
+or never reached) and their descendants; upstream outputs are loaded from disk.
+A resumed run references the checkpoints it reused instead of copying them.
+
+Checkpoints of runs that finished without failed nodes are deleted right away;
+the others are swept once they are older than `CHECKPOINT_TTL`.
+"""
+from typing import Any, Dict, Iterable, Optional
+import asyncio
+import json
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+import uuid
+
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints'))
+
+# Seconds checkpoints of failed runs are kept for resuming, and between sweeps
+CHECKPOINT_TTL = float(os.getenv('CHECKPOINT_TTL', str(7 * 24 * 3600)))
+CHECKPOINT_SWEEP_INTERVAL = float(os.getenv('CHECKPOINT_SWEEP_INTERVAL', '3600'))
+
+_RUN_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+PIPELINE_FILE = 'pipeline.json'
+MANIFEST_FILE = 'manifest.jsonl'
+
+
+class CheckpointError(Exception):
+    """Raised for unknown runs or unreadable checkpoints"""
+
+
+class RunCheckpoint:
+    """Checkpoints of one run: the pipeline definition and node id -> pickle path"""
+
+    def __init__(self, run_id: str, directory: str, pipeline: Dict[str, Any], paths: Dict[str, str]):
+        self.run_id = run_id
+        self.directory = directory
+        self.pipeline = pipeline
+        self.paths = paths
+        self._lock = threading.Lock()
+
+    def save(self, node_id: str, output: Any) -> bool:
+        """
+        Pickle a node output; returns False if the output can't be pickled or
+        written (e.g. a full disk), in which case the run goes on without it.
+        """
+        try:
+            data = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            print(f"Checkpoint of {node_id} skipped: {e}")
+            return False
+        path = os.path.join(self.directory, f'{uuid.uuid4().hex}.pkl')
+        try:
+            with open(path, 'wb') as f:
+                f.write(data)
+            self._append(node_id, path)
+        except OSError as e:
+            print(f"Checkpoint of {node_id} skipped: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return False
+        return True
+
+    def _append(self, node_id: str, path: str) -> None:
+        with self._lock:
+            with open(os.path.join(self.directory, MANIFEST_FILE), 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'node_id': node_id, 'path': path}) + '\n')
+            self.paths[node_id] = path
+
+    def completed(self) -> Dict[str, str]:
+        """Checkpointed nodes whose pickle still exists"""
+        return {node_id: path for node_id, path in self.paths.items() if os.path.exists(path)}
+
+    def load(self, node_ids: Iterable[str]) -> Dict[str, Any]:
+        outputs = {}
+        for node_id in node_ids:
+            try:
+                with open(self.paths[node_id], 'rb') as f:
+                    outputs[node_id] = pickle.load(f)
+            except (OSError, KeyError, pickle.UnpicklingError, EOFError) as e:
+                raise CheckpointError(f'Checkpoint of node {node_id} is unreadable: {str(e)}') from e
+        return outputs
+
+
+class CheckpointStore:
+    """Directory of per-run checkpoints"""
+
+    def __init__(self, root: str = CHECKPOINT_DIR, ttl: float = CHECKPOINT_TTL, sweep_interval: float = CHECKPOINT_SWEEP_INTERVAL):
+        self.root = root
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.swept = 0
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def _directory(self, run_id: str) -> str:
+        if not _RUN_ID_PATTERN.match(run_id):
+            raise CheckpointError(f'Invalid run id: {run_id}')
+        return os.path.join(self.root, run_id)
+
+    def create(self, run_id: str, pipeline: Dict[str, Any], inherited: Optional[Dict[str, str]] = None) -> RunCheckpoint:
+        """
+        Start checkpointing a run. `inherited` maps nodes reused from a previous
+        run to that run's pickles.
+        """
+        directory = self._directory(run_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, PIPELINE_FILE), 'w', encoding='utf-8') as f:
+            json.dump(pipeline, f)
+        checkpoint = RunCheckpoint(run_id, directory, pipeline, {})
+        for node_id, path in (inherited or {}).items():
+            checkpoint._append(node_id, path)
+        return checkpoint
+
+    def open(self, run_id: str) -> RunCheckpoint:
+        directory = self._directory(run_id)
+        try:
+            with open(os.path.join(directory, PIPELINE_FILE), encoding='utf-8') as f:
+                pipeline = json.load(f)
+        except FileNotFoundError as e:
+            raise CheckpointError(f'No checkpoints for run: {run_id}') from e
+
+        paths: Dict[str, str] = {}
+        manifest = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(manifest):
+            with open(manifest, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A write cut short by a crash; everything before it is valid
+                        break
+                    paths[entry['node_id']] = entry['path']
+        return RunCheckpoint(run_id, directory, pipeline, paths)
+
+    def delete(self, run_id: str) -> None:
+        """Delete a run's checkpoints (runs resumed from it will rerun the affected nodes)"""
+        directory = self._directory(run_id)
+        if not os.path.isdir(directory):
+            raise CheckpointError(f'No checkpoints for run: {run_id}')
+        shutil.rmtree(directory)
+
+    def discard(self, run_id: str) -> None:
+        """Delete a run's checkpoints if there are any"""
+        shutil.rmtree(self._directory(run_id), ignore_errors=True)
+
+    def sweep(self, max_age: Optional[float] = None) -> int:
+        """
+        Delete checkpoints not written to for `max_age` seconds (the TTL by
+        default); returns how many runs' checkpoints were deleted.
+        """
+        cutoff = time.time() - (self.ttl if max_age is None else max_age)
+        deleted = 0
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            if not entry.is_dir() or not _RUN_ID_PATTERN.match(entry.name):
+                continue
+            # The manifest is appended to with every checkpoint; new runs may not have one yet
+            manifest = os.path.join(entry.path, MANIFEST_FILE)
+            try:
+                modified = os.stat(manifest).st_mtime if os.path.exists(manifest) else entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if modified < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                deleted += 1
+        self.swept += deleted
+        return deleted
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Checkpoint sweep error: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def start_sweeper(self) -> None:
+        if self.ttl > 0 and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_periodically())
+
+    async def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+
+checkpoint_store = CheckpointStore()
@@ -0,0 +1,139 @@
+# trunk-ignore-all(black)
+"""
+In-flight coalescing of identical pipeline submissions.
+
+Concurrent submissions with the same key share a single execution. Finished
+results are remembered for a short grace window so late duplicates (double
+clicks, client retries) get the same result instead of a new run. Keys come
+either from the client's Idempotency-Key header or from the canonical hash of
+the pipeline. An execution is cancelled once every request waiting for it has
+gone away.
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import os
+import time
+
+# Seconds a finished result is reused for automatic (hash-keyed) duplicates
+PIPELINE_COALESCE_GRACE = float(os.getenv('PIPELINE_COALESCE_GRACE', '2'))
+
+# Seconds a finished result is replayed for a client-supplied Idempotency-Key
+IDEMPOTENCY_KEY_TTL = float(os.getenv('IDEMPOTENCY_KEY_TTL', '300'))
+
+MAX_RECENT_RESULTS = int(os.getenv('PIPELINE_COALESCE_MAX_RESULTS', '1024'))
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an Idempotency-Key is reused for a different pipeline"""
+
+
+class _Flight:
+    __slots__ = ('task', 'fingerprint', 'waiters')
+
+    def __init__(self, task: 'asyncio.Task', fingerprint: str):
+        self.task = task
+        self.fingerprint = fingerprint
+        self.waiters = 0
+
+    async def wait(self) -> Any:
+        # Shielded so one waiter going away doesn't cancel the shared execution;
+        # the last one to go cancels it
+        self.waiters += 1
+        try:
+            return await asyncio.shield(self.task)
+        except asyncio.CancelledError:
+            if self.waiters == 1 and not self.task.done():
+                self.task.cancel()
+            raise
+        finally:
+            self.waiters -= 1
+
+
+class InFlightCoalescer:
+    """Shares one execution between concurrent (and shortly late) identical requests"""
+
+    def __init__(self, grace: float = PIPELINE_COALESCE_GRACE, idempotency_ttl: float = IDEMPOTENCY_KEY_TTL, max_results: int = MAX_RECENT_RESULTS):
+        self.grace = grace
+        self.idempotency_ttl = idempotency_ttl
+        self.max_results = max_results
+        self._inflight: Dict[str, _Flight] = {}
+        self._recent: 'OrderedDict[str, Tuple[float, str, Any]]' = OrderedDict()
+        self.executions = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, fingerprint: str, factory: Callable[[], Awaitable[Any]], idempotent: bool = False) -> Tuple[Any, bool]:
+        """
+        Run `factory()` once per key and return `(result, shared)`.
+
+        `fingerprint` identifies the request content; reusing a key with a
+        different fingerprint raises IdempotencyConflict. `shared` is true when
+        the result came from another request's execution.
+        """
+        recent = self._recent.get(key)
+        if recent is not None:
+            expires, recent_fingerprint, result = recent
+            if expires > time.monotonic():
+                self._check_fingerprint(key, fingerprint, recent_fingerprint)
+                self.coalesced += 1
+                return result, True
+            del self._recent[key]
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self._check_fingerprint(key, fingerprint, flight.fingerprint)
+            self.coalesced += 1
+            return await flight.wait(), True
+
+        task = asyncio.ensure_future(factory())
+        flight = self._inflight[key] = _Flight(task, fingerprint)
+        self.executions += 1
+        try:
+            result = await flight.wait()
+        finally:
+            if task.done():
+                self._inflight.pop(key, None)
+            else:
+                # The first requester went away; finish for the others, then clean up
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        ttl = self.idempotency_ttl if idempotent else self.grace
+        if ttl > 0:
+            self._remember(key, fingerprint, result, ttl)
+        return result, False
+
+    def _check_fingerprint(self, key: str, fingerprint: str, expected: str) -> None:
+        if fingerprint != expected:
+            raise IdempotencyConflict(f'Key {key!r} was already used for a different pipeline')
+
+    def _remember(self, key: str, fingerprint: str, result: Any, ttl: float) -> None:
+        self._recent[key] = (time.monotonic() + ttl, fingerprint, result)
+        self._recent.move_to_end(key)
+        now = time.monotonic()
+        while self._recent:
+            oldest_key, (expires, _, _) = next(iter(self._recent.items()))
+            if expires > now and len(self._recent) <= self.max_results:
+                break
+            del self._recent[oldest_key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': len(self._inflight),
+            'waiters': sum(flight.waiters for flight in self._inflight.values()),
+            'recent_results': len(self._recent),
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'grace': self.grace,
+            'idempotency_ttl': self.idempotency_ttl
+        }
+
+
+def coalescing_key(idempotency_key: Optional[str], pipeline_hash: str, tenant: str) -> Tuple[str, bool]:
+    """
+    Key for a submission: the client's Idempotency-Key if given, else the
+    pipeline hash. Keys are scoped to the tenant, so one tenant's submissions
+    never share (or replay) another tenant's execution.
+    """
+    if idempotency_key:
+        return f'idempotency:{tenant}:{idempotency_key.strip()}', True
+    return f'pipeline:{tenant}:{pipeline_hash}', False
@@ -0,0 +1,80 @@
+# trunk-ignore-all(black)
+"""
+Composite nodes: registered pipelines used as a single node.
+
+A composite node runs a registered sub-pipeline, compiled once per version by
+the registry. Its outputs are memoized per sub-pipeline version and input, so
+instances of the same fragment (in one run or across runs) share results, and
+concurrent instances with the same input share one execution.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+import os
+
+from cache import canonical_hash
+from coalesce import InFlightCoalescer
+from optimizer import FoldCache
+
+COMPOSITE_CACHE_MAX_ENTRIES = int(os.getenv('COMPOSITE_CACHE_MAX_ENTRIES', '1024'))
+
+# Composite nodes nested inside each other's sub-pipelines
+MAX_COMPOSITE_DEPTH = int(os.getenv('MAX_COMPOSITE_DEPTH', '8'))
+
+# Sub-pipelines being run by the current context, outermost first
+_stack: ContextVar[Tuple[str, ...]] = ContextVar('composite_stack', default=())
+
+
+class CompositeError(Exception):
+    """Raised for recursive composites and failed sub-pipeline runs"""
+
+
+@contextmanager
+def composite_scope(pipeline_id: str) -> Iterator[None]:
+    """Run the block as part of `pipeline_id`, refusing recursion and deep nesting"""
+    stack = _stack.get()
+    if pipeline_id in stack:
+        raise CompositeError(f'Composite pipeline {pipeline_id!r} includes itself ({" -> ".join(stack + (pipeline_id,))})')
+    if len(stack) >= MAX_COMPOSITE_DEPTH:
+        raise CompositeError(f'Composite pipelines nested deeper than {MAX_COMPOSITE_DEPTH}')
+    token = _stack.set(stack + (pipeline_id,))
+    try:
+        yield
+    finally:
+        _stack.reset(token)
+
+
+def memo_key(definition_hash: str, inputs: Dict[str, Any], input_data: Any) -> Optional[str]:
+    """Key of a composite run, or None when its input isn't plain JSON (e.g. a lazy record stream)"""
+    try:
+        return canonical_hash({'pipeline': definition_hash, 'inputs': inputs, 'input': input_data}, strict=True)
+    except (TypeError, ValueError):
+        return None
+
+
+class CompositeMemo:
+    """Bounded LRU of sub-pipeline outputs, with in-flight runs shared per key"""
+
+    def __init__(self, max_entries: int = COMPOSITE_CACHE_MAX_ENTRIES):
+        self._outputs = FoldCache(max_entries)
+        self._inflight = InFlightCoalescer(grace=0)
+        self.hits = 0
+        self.misses = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        if key in self._outputs:
+            self.hits += 1
+            return self._outputs.get(key)
+        output, shared = await self._inflight.run(key, key, factory)
+        if shared:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._outputs.put(key, output)
+        return output
+
+    def clear(self) -> None:
+        self._outputs.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._outputs.stats(), 'hits': self.hits, 'misses': self.misses, 'in_flight': self._inflight.stats()['in_flight']}
@@ -0,0 +1,67 @@
+# trunk-ignore-all(black)
+"""
+Remaining-time budget of the running node.
+
+`execute_node` opens a budget for every node: the smaller of the node's timeout
+and what is left of the pipeline's `timeout_ms`. Handlers read it to degrade
+instead of being cut off (shorter provider timeouts, cheaper fallbacks,
+truncated delays). The budget is kept in a context variable, so it follows the
+handler into the tasks and worker threads it starts.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+import time
+
+_deadline: ContextVar[Optional[float]] = ContextVar('node_deadline', default=None)
+
+# Time a node kind needs at least to produce a (possibly degraded) result. Nodes
+# the pipeline's remaining budget can't cover are skipped before they start.
+# LLM, timer and notification nodes adapt to any budget.
+MIN_BUDGET_SECONDS = {
+    'input': 0.1,
+    'text': 0.1,
+    'output': 0.2,
+    'calculator': 0.1,
+    'filter': 0.1,
+    'dataformat': 0.1,
+    'generic': 0.2,
+    'llm': 0.0,
+    'timer': 0.0,
+    'notification': 0.0,
+}
+
+# Left unused by handlers so they return before the node's timeout fires
+BUDGET_MARGIN = 0.01
+
+
+@contextmanager
+def node_budget(seconds: float) -> Iterator[None]:
+    """Give the code in the block `seconds` (never more than an enclosing budget)"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(deadline, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left in the current budget, or None outside of one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def within_budget(seconds: float) -> float:
+    """`seconds` shortened to fit the current budget"""
+    remaining = remaining_budget()
+    if remaining is None:
+        return seconds
+    return max(min(seconds, remaining - BUDGET_MARGIN), 0.0)
+
+
+def min_budget(kind: str) -> float:
+    return MIN_BUDGET_SECONDS.get(kind, MIN_BUDGET_SECONDS['generic'])
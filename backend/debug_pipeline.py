@@ -3,7 +3,6 @@ sys.path.append('c:/Users/91892/Downloads/Geo_Joseph_technical_assessment-1/back
 
 from main import execute_calculator_node, execute_input_node, execute_output_node
 import asyncio
-import json
 
 async def test_pipeline():
     try:
@@ -0,0 +1,31 @@
+# trunk-ignore-all(black)
+"""
+Progress events of a running pipeline.
+
+The executor reports every finished node, and map nodes every finished element,
+to the listener of the current context. /pipelines/stream installs one and
+writes the events out as NDJSON while the run goes on; without a listener,
+nothing is reported. Like the tenant and the time budget, the listener is kept
+in a context variable, so it follows the run into the tasks it starts.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+Listener = Callable[[Dict[str, Any]], None]
+
+_listener: ContextVar[Optional[Listener]] = ContextVar('pipeline_events', default=None)
+
+
+@contextmanager
+def listen(listener: Optional[Listener]) -> Iterator[None]:
+    """Send the events of the code in the block to `listener` (None silences them)"""
+    token = _listener.set(listener)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def current_listener() -> Optional[Listener]:
+    return _listener.get()
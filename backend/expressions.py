@@ -0,0 +1,288 @@
+# trunk-ignore-all(black)
+"""
+Safe arithmetic expressions for calculator nodes.
+
+An expression such as `(input_1 * 1.2 + input_2) / n` is parsed once, checked
+against a whitelist (numbers, variables, arithmetic, single comparisons and the
+functions below) and compiled to a Python function. Compiled expressions are
+cached by their text. Attribute access, indexing, strings, calls to anything
+else and names starting with an underscore are rejected at compile time.
+
+Variables are numbers or arrays of numbers. Arrays are evaluated elementwise,
+with numbers broadcast, using numpy when it is installed and a loop over the
+compiled function otherwise. Aggregates (`sum(x)`, `mean(x)`, `min(x)`, ...)
+reduce their argument to a number first, so `x - mean(x)` works on whole arrays.
+"""
+from array import array
+from functools import lru_cache, reduce
+from itertools import repeat
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import ast
+import math
+import os
+import statistics
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+# Compiled expressions kept, by expression text
+EXPRESSION_CACHE_SIZE = int(os.getenv('EXPRESSION_CACHE_SIZE', '256'))
+
+MAX_EXPRESSION_LENGTH = 1000
+MAX_EXPRESSION_NODES = 256
+
+BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+UNARY_OPERATORS = (ast.UAdd, ast.USub)
+COMPARISON_OPERATORS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+
+# floor, ceil and round return floats like every other function, so that their
+# results can't be raised to unbounded integer powers either
+def _floor(value: float) -> float:
+    return float(math.floor(value))
+
+
+def _ceil(value: float) -> float:
+    return float(math.ceil(value))
+
+
+def _round(value: float, digits: float = 0) -> float:
+    return float(round(value, int(digits)))
+
+
+def _where(condition: Any, if_true: Any, if_false: Any) -> Any:
+    return if_true if condition else if_false
+
+
+# name -> (scalar implementation, numpy implementation name, min args, max args)
+ELEMENTWISE_FUNCTIONS: Dict[str, Tuple[Callable, str, int, int]] = {
+    'abs': (abs, 'absolute', 1, 1),
+    'sqrt': (math.sqrt, 'sqrt', 1, 1),
+    'exp': (math.exp, 'exp', 1, 1),
+    'log': (math.log, 'log', 1, 1),
+    'log10': (math.log10, 'log10', 1, 1),
+    'floor': (_floor, 'floor', 1, 1),
+    'ceil': (_ceil, 'ceil', 1, 1),
+    'round': (_round, 'round', 1, 2),
+    'min': (min, 'minimum', 2, 8),
+    'max': (max, 'maximum', 2, 8),
+    'where': (_where, 'where', 3, 3),
+}
+
+# name -> (reduction of a list of floats, numpy implementation name); `min` and
+# `max` aggregate when called with one argument
+AGGREGATE_FUNCTIONS: Dict[str, Tuple[Callable[[Sequence[float]], float], str]] = {
+    'sum': (math.fsum, 'sum'),
+    'mean': (statistics.fmean, 'mean'),
+    'median': (statistics.median, 'median'),
+    'std': (statistics.pstdev, 'std'),
+    'count': (len, 'size'),
+    'min': (min, 'min'),
+    'max': (max, 'max'),
+}
+
+
+class ExpressionError(Exception):
+    """Raised for expressions that are invalid or unsafe, or fail to evaluate"""
+
+
+NOT_FINITE_ERROR = 'Result is not finite (division by zero, overflow or invalid operation)'
+
+
+def _finite(value: float) -> float:
+    if not math.isfinite(value):
+        raise ExpressionError(NOT_FINITE_ERROR)
+    return value
+
+
+def _numpy_function(name: str) -> Callable:
+    function = getattr(numpy, name)
+    if name in ('minimum', 'maximum'):
+        return lambda *args: reduce(function, args)
+    if name == 'round':
+        return lambda value, digits=0: numpy.round(value, int(digits))
+    return function
+
+
+def _is_vector(value: Any) -> bool:
+    return isinstance(value, (list, tuple, array)) or (numpy is not None and isinstance(value, numpy.ndarray))
+
+
+class _Checker:
+    """Validates a parsed expression and rewrites it for compilation"""
+
+    def __init__(self, text: str, size: int = 0):
+        self.text = text
+        self.size = size
+        self.variables: List[str] = []
+        # (placeholder name, aggregate function, compiled argument)
+        self.aggregates: List[Tuple[str, str, 'Expression']] = []
+
+    def compile(self, tree: ast.expr) -> 'Expression':
+        body = self.visit(tree)
+        return Expression(self.text, body, self.variables, self.aggregates)
+
+    def visit(self, node: ast.AST) -> ast.expr:
+        self.size += 1
+        if self.size > MAX_EXPRESSION_NODES:
+            raise ExpressionError(f'Expression is too complex (more than {MAX_EXPRESSION_NODES} elements)')
+
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ExpressionError(f'Unsupported constant {node.value!r}; only numbers are allowed')
+            # Floats only, so that powers overflow instead of growing without bound
+            return ast.Constant(float(node.value))
+        if isinstance(node, ast.Name):
+            if node.id.startswith('_'):
+                raise ExpressionError(f'Invalid name {node.id!r}')
+            if node.id in ELEMENTWISE_FUNCTIONS or node.id in AGGREGATE_FUNCTIONS:
+                raise ExpressionError(f'{node.id!r} is a function')
+            if node.id not in self.variables:
+                self.variables.append(node.id)
+            return ast.Name(node.id, ast.Load())
+        if isinstance(node, ast.BinOp) and isinstance(node.op, BINARY_OPERATORS):
+            return ast.BinOp(self.visit(node.left), node.op, self.visit(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, UNARY_OPERATORS):
+            return ast.UnaryOp(node.op, self.visit(node.operand))
+        if isinstance(node, ast.Compare):
+            if len(node.ops) != 1 or not isinstance(node.ops[0], COMPARISON_OPERATORS):
+                raise ExpressionError('Only single comparisons (<, <=, >, >=, ==, !=) are allowed')
+            return ast.Compare(self.visit(node.left), node.ops, [self.visit(node.comparators[0])])
+        if isinstance(node, ast.Call):
+            return self.visit_call(node)
+        if isinstance(node, ast.IfExp):
+            raise ExpressionError('Use where(condition, if_true, if_false) instead of if/else')
+        raise ExpressionError(f'Unsupported syntax: {type(node).__name__}')
+
+    def visit_call(self, node: ast.Call) -> ast.expr:
+        name = node.func.id if isinstance(node.func, ast.Name) else None
+        if name is None or (name not in ELEMENTWISE_FUNCTIONS and name not in AGGREGATE_FUNCTIONS):
+            raise ExpressionError(f'Unknown function; expected one of {sorted(set(ELEMENTWISE_FUNCTIONS) | set(AGGREGATE_FUNCTIONS))}')
+        if node.keywords or any(isinstance(arg, ast.Starred) for arg in node.args):
+            raise ExpressionError(f'{name}() takes positional arguments only')
+
+        if name in AGGREGATE_FUNCTIONS and (name not in ELEMENTWISE_FUNCTIONS or len(node.args) == 1):
+            if len(node.args) != 1:
+                raise ExpressionError(f'{name}() takes exactly one argument')
+            # The argument is compiled and evaluated on its own, and its
+            # aggregate passed in as a number
+            argument = _Checker(self.text, self.size)
+            compiled = argument.compile(node.args[0])
+            self.size = argument.size
+            placeholder = f'_aggregate_{len(self.aggregates)}'
+            self.aggregates.append((placeholder, name, compiled))
+            return ast.Name(placeholder, ast.Load())
+
+        _, _, min_args, max_args = ELEMENTWISE_FUNCTIONS[name]
+        if not min_args <= len(node.args) <= max_args:
+            expected = min_args if min_args == max_args else f'{min_args} to {max_args}'
+            raise ExpressionError(f'{name}() takes {expected} arguments, got {len(node.args)}')
+        return ast.Call(ast.Name(name, ast.Load()), [self.visit(arg) for arg in node.args], [])
+
+
+class _LazyWhere(ast.NodeTransformer):
+    """Rewrites where(c, a, b) to `a if c else b`, so that only the chosen branch is evaluated"""
+
+    def visit_Call(self, node: ast.Call) -> ast.expr:
+        self.generic_visit(node)
+        if node.func.id != 'where':
+            return node
+        condition, if_true, if_false = node.args
+        return ast.IfExp(condition, if_true, if_false)
+
+
+def _function(parameters: List[str], body: ast.expr, functions: Dict[str, Callable]) -> Callable:
+    tree = ast.Expression(ast.Lambda(
+        ast.arguments(posonlyargs=[], args=[ast.arg(name) for name in parameters], kwonlyargs=[], kw_defaults=[], defaults=[]),
+        body
+    ))
+    code = compile(ast.fix_missing_locations(tree), '<expression>', 'eval')
+    # Only the whitelisted functions are reachable from the compiled code
+    return eval(code, {'__builtins__': {}, **functions})
+
+
+class Expression:
+    """A compiled expression; `evaluate` it with a value for each of its `variables`"""
+    __slots__ = ('text', 'variables', 'aggregates', '_scalar', '_vector')
+
+    def __init__(self, text: str, body: ast.expr, variables: List[str], aggregates: List[Tuple[str, str, 'Expression']]):
+        self.text = text
+        # Variables used outside of aggregates, in parameter order
+        self.variables = tuple(variables)
+        self.aggregates = aggregates
+        parameters = list(self.variables) + [placeholder for placeholder, _, _ in aggregates]
+        self._vector = None
+        if numpy is not None:
+            self._vector = _function(parameters, body, {name: _numpy_function(spec[1]) for name, spec in ELEMENTWISE_FUNCTIONS.items()})
+        self._scalar = _function(parameters, _LazyWhere().visit(body), {name: spec[0] for name, spec in ELEMENTWISE_FUNCTIONS.items()})
+
+    def evaluate(self, variables: Dict[str, Any]) -> Any:
+        """A number, or an array('d') when any variable is an array"""
+        values = []
+        for name in self.variables:
+            if name not in variables:
+                raise ExpressionError(f'Unknown variable {name!r}; available: {sorted(variables)}')
+            values.append(variables[name])
+        for _, name, argument in self.aggregates:
+            values.append(_aggregate(name, argument.evaluate(variables)))
+        try:
+            return self._apply(values)
+        except ZeroDivisionError as e:
+            raise ExpressionError('Division by zero') from e
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise ExpressionError(f'Evaluation failed: {e}') from e
+
+    def _apply(self, values: List[Any]) -> Any:
+        vectors = [index for index, value in enumerate(values) if _is_vector(value)]
+        if not vectors:
+            return _finite(float(self._scalar(*(float(value) for value in values))))
+
+        lengths = {len(values[index]) for index in vectors}
+        if len(lengths) > 1:
+            names = list(self.variables) + [placeholder for placeholder, _, _ in self.aggregates]
+            raise ExpressionError('Arrays of different lengths: ' + ', '.join(f'{names[index]} has {len(values[index])}' for index in vectors))
+
+        if self._vector is not None:
+            arguments = [numpy.asarray(value, dtype=float) if _is_vector(value) else float(value) for value in values]
+            # where() computes both branches; only non-finite results that were chosen are errors
+            with numpy.errstate(all='ignore'):
+                result = numpy.asarray(self._vector(*arguments), dtype=float)
+            if not numpy.isfinite(result).all():
+                raise ExpressionError(NOT_FINITE_ERROR)
+            result = numpy.broadcast_to(result, (lengths.pop(),))
+            return array('d', numpy.ascontiguousarray(result).tobytes())
+
+        columns = [value if _is_vector(value) else repeat(float(value)) for value in values]
+        # Same errors as with numpy: every element must be finite. Not strict:
+        # scalars are repeated endlessly next to the (equally long) arrays
+        return array('d', [_finite(float(self._scalar(*row))) for row in zip(*columns, strict=False)])
+
+    def __repr__(self) -> str:
+        return f'Expression({self.text!r})'
+
+
+def _aggregate(name: str, value: Any) -> float:
+    reducer, numpy_name = AGGREGATE_FUNCTIONS[name]
+    if not _is_vector(value):
+        value = [value]
+    if len(value) == 0 and name not in ('sum', 'count'):
+        raise ExpressionError(f'{name}() of no values')
+    if numpy is not None:
+        return float(getattr(numpy, numpy_name)(numpy.asarray(value, dtype=float)))
+    return float(reducer(value))
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(text: str) -> Expression:
+    """Parse, check and compile an expression (cached by its text)"""
+    if not isinstance(text, str) or not text.strip():
+        raise ExpressionError('Expression is empty')
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f'Expression is longer than {MAX_EXPRESSION_LENGTH} characters')
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError(f'Invalid expression: {e.msg}') from e
+    return _Checker(text).compile(tree.body)
@@ -0,0 +1,134 @@
+# trunk-ignore-all(black)
+"""
+Compact pipeline graph.
+
+Node ids are interned to dense integers and edges are stored in CSR form (an
+offsets array into a flat targets array), so validation and topological order
+come out of a single Kahn pass without per-node Python containers. When the
+graph has a cycle, one offending cycle is reported as a path of node ids; edges
+referring to unknown nodes are reported instead of silently skewing the
+in-degrees.
+"""
+from array import array
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class CompiledGraph:
+    """Validated pipeline graph with its topological order"""
+    __slots__ = ('ids', 'index', 'offsets', 'targets', 'order', 'cycle', 'dangling_edges')
+
+    def __init__(self, ids: List[str], index: Dict[str, int], offsets: array, targets: array):
+        self.ids = ids
+        self.index = index
+        # Successors of node i are targets[offsets[i]:offsets[i + 1]]
+        self.offsets = offsets
+        self.targets = targets
+        # Node indexes in topological order (only the acyclic part when there is a cycle)
+        self.order = array('l')
+        self.cycle: Optional[List[str]] = None
+        self.dangling_edges: List[Tuple[str, str]] = []
+
+    @property
+    def is_dag(self) -> bool:
+        return self.cycle is None
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.ids)
+
+    def successors(self, node: int) -> array:
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def order_ids(self) -> List[str]:
+        ids = self.ids
+        return [ids[i] for i in self.order]
+
+    def describe_cycle(self) -> str:
+        return ' -> '.join(self.cycle) if self.cycle else ''
+
+    def describe_dangling_edges(self) -> str:
+        return ', '.join(f'{source} -> {target}' for source, target in self.dangling_edges)
+
+
+def compile_graph(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> CompiledGraph:
+    """Intern ids, build CSR adjacency and run one Kahn pass over the graph"""
+    index: Dict[str, int] = {}
+    ids: List[str] = []
+    for node in nodes:
+        node_id = node['id']
+        if node_id not in index:
+            index[node_id] = len(ids)
+            ids.append(node_id)
+    n = len(ids)
+
+    sources = array('l')
+    targets = array('l')
+    dangling: List[Tuple[str, str]] = []
+    out_degree = array('l', [0]) * n
+    in_degree = array('l', out_degree)
+    for edge in edges:
+        source = index.get(edge['source'])
+        target = index.get(edge['target'])
+        if source is None or target is None:
+            dangling.append((edge['source'], edge['target']))
+            continue
+        sources.append(source)
+        targets.append(target)
+        out_degree[source] += 1
+        in_degree[target] += 1
+
+    # CSR: counting sort of the edges by source, stable in edge order
+    offsets = array('l', accumulate(out_degree, initial=0))
+    csr_targets = array('l', [0]) * len(targets)
+    cursor = array('l', offsets)
+    for source, target in zip(sources, targets, strict=True):
+        csr_targets[cursor[source]] = target
+        cursor[source] += 1
+
+    graph = CompiledGraph(ids, index, offsets, csr_targets)
+    graph.dangling_edges = dangling
+
+    # Kahn's algorithm; the order array doubles as the FIFO queue
+    order = array('l', [i for i in range(n) if in_degree[i] == 0])
+    append = order.append
+    for current in order:
+        # Iterating an array while appending to it visits the appended items too
+        for neighbor in csr_targets[offsets[current]:offsets[current + 1]]:
+            remaining = in_degree[neighbor] - 1
+            in_degree[neighbor] = remaining
+            if remaining == 0:
+                append(neighbor)
+
+    if len(order) < n:
+        # Nodes left over are on a cycle or downstream of one
+        graph.cycle = _find_cycle(graph, sources, targets, in_degree)
+
+    graph.order = order
+    return graph
+
+
+def _find_cycle(graph: CompiledGraph, sources: array, targets: array, in_degree: array) -> List[str]:
+    """
+    Extract one cycle from the nodes Kahn's algorithm couldn't order.
+
+    Every such node still has a predecessor among them, so walking predecessors
+    from any of them must revisit a node; the revisited stretch is a cycle.
+    """
+    predecessor: Dict[int, int] = {}
+    for source, target in zip(sources, targets, strict=True):
+        if in_degree[target] > 0 and in_degree[source] > 0 and target not in predecessor:
+            predecessor[target] = source
+
+    current = next(iter(predecessor))
+    seen: Dict[int, int] = {}
+    path: List[int] = []
+    while current not in seen:
+        seen[current] = len(path)
+        path.append(current)
+        current = predecessor[current]
+
+    # path walks backwards; reverse it into edge direction and close the loop
+    cycle = path[seen[current]:][::-1]
+    cycle.append(cycle[0])
+    return [graph.ids[i] for i in cycle]
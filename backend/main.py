@@ -1,16 +1,54 @@
 # trunk-ignore-all(black)
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
-from collections import defaultdict, deque
+from pydantic import BaseModel, Field, ValidationError, field_serializer
+from pydantic_core import to_json, to_jsonable_python
+from typing import Annotated, List, Dict, Any, Awaitable, Callable, FrozenSet, Iterable, Literal, Optional, Tuple, Type, Union
+from array import array
+from collections import defaultdict
 import asyncio
 import json
+import os
 import re
 import time
 
+from streaming import RecordStream, SNIFF_PREFIX_SIZE, record_stream_for, sniff_format
+from table import Table, find_table
+from coalesce import IdempotencyConflict, InFlightCoalescer, coalescing_key
+from cache import CacheEntry, PipelineResultCache, body_hash, canonical_hash, etag_matches
+from projection import project_results, sink_node_ids
+from graph import CompiledGraph, compile_graph
+from optimizer import ExecutionPlan, FoldCache, optimize_pipeline
+from providers import OLLAMA_URL, ollama_session, openai_client, warm_up_llm_clients
+from registry import CompiledPipeline, PipelineRegistry, RegisteredPipeline, RegistryError
+from checkpoints import CheckpointError, RunCheckpoint, checkpoint_store
+from deadlines import min_budget, node_budget, remaining_budget, within_budget
+from scheduling import PIPELINE_MAX_CONCURRENCY, CostModel, ReadyQueue, upward_ranks
+from bulkheads import node_pools
+from admission import AdmissionRejected, admission, pipeline_cost
+from tenants import TENANT_HEADER, TenantError, current_tenant, tenant_id, tenants
+from events import current_listener, listen
+from composites import CompositeError, CompositeMemo, composite_scope, memo_key
+from expressions import ExpressionError, compile_expression
+from templates import compile_template
+from notifications import NOTIFICATION_DRAIN_TIMEOUT, destination, notification_queue
+from schedules import Schedule, ScheduleError, current_tick, scheduler
+from run_store import DEFAULT_PAGE_SIZE, RunRecord, RunStore, RunStoreError, new_run_id
+import wire
+from uploads import PREVIEW_SIZE, UPLOAD_CHUNK_SIZE, UploadError, UploadNotFound, UploadTooLarge, upload_store
+
 app = FastAPI()
 
+pipeline_cache = PipelineResultCache()
+pipeline_coalescer = InFlightCoalescer()
+fold_cache = FoldCache()
+composite_memo = CompositeMemo()
+cost_model = CostModel()
+pipeline_registry = PipelineRegistry()
+run_store = RunStore()
+
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
     CORSMiddleware,
@@ -20,9 +58,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class ExecutionOptions(BaseModel):
+    # Intermediate (non-sink) node outputs are released as soon as their last
+    # consumer has read them and are only returned when explicitly requested
+    include_intermediate: bool = False
+    # 'sinks' drops intermediate results entirely, 'summary' keeps only scalar fields
+    response_mode: Literal['full', 'sinks', 'summary'] = 'full'
+    # Dotted output paths to return, for every node or keyed by node id / node type
+    fields: Optional[Union[List[str], Dict[str, List[str]]]] = None
+    # Encode objects repeated across outputs once, in PipelineResult.shared_objects
+    share_objects: bool = False
+    # Eliminate dead nodes, fold constant subgraphs and fuse chains of pure nodes
+    optimize: bool = True
+    # Report what the optimizer rewrote in PipelineResult.optimization
+    explain: bool = False
+    # Save successful node outputs so a failed run can be resumed (POST /runs/{run_id}/resume)
+    checkpoint: bool = False
+    # Wall-clock limit for the whole run; nodes still running or not started get status 'timeout'
+    timeout_ms: Optional[int] = Field(default=None, gt=0)
+    # Nodes run at once (PIPELINE_MAX_CONCURRENCY by default) and which ready node starts first
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    schedule: Literal['fifo', 'critical_path'] = 'critical_path'
+
 class PipelineData(BaseModel):
     nodes: List[Dict[str, Any]]
     edges: List[Dict[str, Any]]
+    options: ExecutionOptions = Field(default_factory=ExecutionOptions)
 
 class NodeResult(BaseModel):
     node_id: str
@@ -32,6 +93,37 @@ class NodeResult(BaseModel):
     error: Optional[str] = None
     execution_time: float
 
+    @field_serializer('output')
+    def serialize_output(self, output: Any) -> Any:
+        # Lazy values (record streams etc.) are only materialized at the JSON boundary
+        return to_jsonable_python(output, fallback=_jsonable_fallback)
+
+def _jsonable_fallback(value: Any) -> Any:
+    if isinstance(value, array):
+        return value.tolist()
+    if hasattr(value, 'to_jsonable'):
+        return value.to_jsonable()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def summarize_input(value: Any) -> Any:
+    """
+    Compact description of a node's input, for outputs that report what they
+    received without carrying (and serializing) the whole input again.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, Table):
+        return {'kind': 'table', 'rows': len(value), 'columns': list(value.schema.index)}
+    if isinstance(value, dict):
+        summary = {'kind': 'object', 'keys': list(value)[:20]}
+        if isinstance(value.get('type'), str):
+            summary['type'] = value['type']
+        return summary
+    if isinstance(value, (list, tuple, array)):
+        return {'kind': 'list', 'length': len(value)}
+    text = str(value)
+    return text[:100] + '...' if len(text) > 100 else text
+
 class PipelineResult(BaseModel):
     num_nodes: int
     num_edges: int
@@ -39,6 +131,20 @@ class PipelineResult(BaseModel):
     execution_results: List[NodeResult]
     total_execution_time: float
     status: str
+    shared_objects: Optional[Dict[str, Any]] = None
+    optimization: Optional[Dict[str, Any]] = None
+    # Id of the stored run, see /runs/{run_id}
+    run_id: Optional[str] = None
+    # Run this one resumed, reusing its checkpointed outputs
+    resumed_from: Optional[str] = None
+    # One offending cycle as a path of node ids, when is_dag is false
+    cycle: Optional[List[str]] = None
+    # Edges (source, target) naming a node that isn't in the pipeline; they are ignored
+    dangling_edges: Optional[List[Tuple[str, str]]] = None
+
+    @field_serializer('shared_objects')
+    def serialize_shared_objects(self, shared_objects: Optional[Dict[str, Any]]) -> Any:
+        return to_jsonable_python(shared_objects, fallback=_jsonable_fallback)
 
 @app.get('/')
 def read_root():
@@ -90,82 +196,77 @@ def configure_api_key(request: dict):
     
     return {'message': 'No valid configuration provided', 'status': 'error'}
 
+async def _iter_upload_file(file: UploadFile):
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+@app.post('/uploads')
+async def upload_file(file: Annotated[UploadFile, File()]):
+    """Upload a whole file (multipart) and get a handle to reference from input nodes"""
+    handle = upload_store.create(file.filename)
+    try:
+        await upload_store.append(handle.file_id, _iter_upload_file(file))
+    except UploadTooLarge as e:
+        upload_store.delete(handle.file_id)
+        raise HTTPException(status_code=413, detail=str(e)) from e
+    finally:
+        await file.close()
+    return (await upload_store.complete(handle.file_id, sniff_format, SNIFF_PREFIX_SIZE)).metadata()
+
+@app.post('/uploads/sessions')
+def start_chunked_upload(name: str = 'upload'):
+    """Start a chunked upload; send the body in pieces to /uploads/{file_id}/chunks"""
+    return upload_store.create(name).metadata()
+
+@app.put('/uploads/{file_id}/chunks')
+async def upload_chunk(file_id: str, request: Request, offset: Optional[int] = None):
+    """Append the raw request body to a chunked upload without buffering it in memory"""
+    try:
+        handle = await upload_store.append(file_id, request.stream(), offset)
+    except UploadNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e)) from e
+    except UploadError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    return handle.metadata()
+
+@app.post('/uploads/{file_id}/complete')
+async def complete_chunked_upload(file_id: str):
+    try:
+        return (await upload_store.complete(file_id, sniff_format, SNIFF_PREFIX_SIZE)).metadata()
+    except UploadError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+@app.get('/uploads/{file_id}')
+def get_upload(file_id: str):
+    try:
+        return upload_store.get(file_id).metadata()
+    except UploadError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+@app.delete('/uploads/{file_id}')
+def delete_upload(file_id: str):
+    try:
+        upload_store.delete(file_id)
+    except UploadError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    return {'message': 'Upload deleted', 'status': 'success'}
+
 def is_dag(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> bool:
     """
     Check if the graph formed by nodes and edges is a Directed Acyclic Graph (DAG)
-    using Kahn's algorithm (topological sorting)
     """
-    if not nodes:
-        return True
-
-    # Create adjacency list and in-degree count
-    graph = defaultdict(list)
-    in_degree = defaultdict(int)
-
-    # Initialize all nodes with in-degree 0
-    for node in nodes:
-        in_degree[node['id']] = 0
-
-    # Build graph and calculate in-degrees
-    for edge in edges:
-        source = edge['source']
-        target = edge['target']
-        graph[source].append(target)
-        in_degree[target] += 1
-
-    # Find all nodes with no incoming edges
-    queue = deque([node_id for node_id in in_degree if in_degree[node_id] == 0])
-    processed_count = 0
-
-    # Process nodes with no incoming edges
-    while queue:
-        current = queue.popleft()
-        processed_count += 1
-
-        # Remove edges from current node and update in-degrees
-        for neighbor in graph[current]:
-            in_degree[neighbor] -= 1
-            if in_degree[neighbor] == 0:
-                queue.append(neighbor)
-
-    # If we processed all nodes, it's a DAG
-    return processed_count == len(nodes)
+    return compile_graph(nodes, edges).is_dag
 
 def get_topological_order(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> List[str]:
     """
     Get the topological order of nodes for execution
     """
-    if not nodes:
-        return []
-
-    graph = defaultdict(list)
-    in_degree = defaultdict(int)
-
-    # Initialize all nodes
-    for node in nodes:
-        in_degree[node['id']] = 0
-
-    # Build graph
-    for edge in edges:
-        source = edge['source']
-        target = edge['target']
-        graph[source].append(target)
-        in_degree[target] += 1
-
-    # Topological sort
-    queue = deque([node_id for node_id in in_degree if in_degree[node_id] == 0])
-    result = []
-
-    while queue:
-        current = queue.popleft()
-        result.append(current)
-
-        for neighbor in graph[current]:
-            in_degree[neighbor] -= 1
-            if in_degree[neighbor] == 0:
-                queue.append(neighbor)
-
-    return result
+    return compile_graph(nodes, edges).order_ids()
 
 async def execute_input_node(node: Dict[str, Any]) -> Any:
     """Execute an Input node - use actual user-provided data"""
@@ -178,14 +279,45 @@ async def execute_input_node(node: Dict[str, Any]) -> Any:
     
     await asyncio.sleep(0.1)  # Minimal processing time for real input
     
-    if input_type.lower() == 'file':
+    if node_data.get('fileId'):
+        # Uploaded files are referenced by handle and never loaded into a string
+        handle = upload_store.get(node_data['fileId'])
+        if not handle.complete:
+            raise UploadError(f'Upload {handle.file_id} is not complete; finish it with /uploads/{handle.file_id}/complete')
+        if handle.format_info is None:
+            # Completed before uploads were scanned at completion
+            await asyncio.to_thread(handle.scan, sniff_format, SNIFF_PREFIX_SIZE)
+        format_info = handle.format_info
+        result = {
+            'type': 'file',
+            'name': handle.name,
+            'file_id': handle.file_id,
+            'content': handle,
+            'preview': await asyncio.to_thread(handle.read_text, PREVIEW_SIZE),
+            'size': handle.size,
+            'lines': handle.lines,
+            'format': format_info['format']
+        }
+        records = record_stream_for(handle, format_info)
+        if records is not None:
+            result['records'] = records
+        return result
+    elif input_type.lower() == 'file':
         # For file type, treat the input as file content
-        return {
+        result = {
             'type': 'file',
             'name': f'{input_name}.txt',
             'content': user_input if user_input else 'No file content provided',
             'size': len(user_input) if user_input else 0
         }
+        if user_input:
+            # Structured files are exposed as lazily parsed records as well
+            format_info = sniff_format(user_input[:SNIFF_PREFIX_SIZE], complete=len(user_input) <= SNIFF_PREFIX_SIZE)
+            result['format'] = format_info['format']
+            records = record_stream_for(user_input, format_info)
+            if records is not None:
+                result['records'] = records
+        return result
     elif input_type.lower() == 'text':
         return {
             'type': 'text',
@@ -221,26 +353,17 @@ async def execute_text_node(node: Dict[str, Any], input_data: Any) -> Any:
 
     await asyncio.sleep(0.1)
 
-    # Real variable substitution with multiple patterns
+    # Variable substitution in one pass over the compiled template: {{input}},
+    # {input}, $input, top-level keys, input_1.. per upstream node and dotted paths
+    template = compile_template(text_content)
     processed_text = text_content
     
     if input_data:
-        # Handle different input data formats
-        if isinstance(input_data, dict):
-            input_value = input_data.get('value', input_data.get('content', str(input_data)))
-        else:
-            input_value = str(input_data)
-        
-        # Replace common variable patterns
-        processed_text = processed_text.replace('{{input}}', str(input_value))
-        processed_text = processed_text.replace('{input}', str(input_value))
-        processed_text = processed_text.replace('$input', str(input_value))
-        
-        # Extract and replace custom variables like {{variable_name}}
-        variables = re.findall(r'\{\{(\w+)\}\}', processed_text)
-        for var in variables:
-            if var != 'input' and isinstance(input_data, dict) and var in input_data:
-                processed_text = processed_text.replace(f'{{{{{var}}}}}', str(input_data[var]))
+        context = dict(input_data) if isinstance(input_data, dict) else {}
+        for position, (_, source_output) in enumerate(upstream_outputs(input_data), 1):
+            context[f'input_{position}'] = source_output
+        context['input'] = input_data
+        processed_text = template.render(context)
     
     # Advanced text analysis and operations
     words = processed_text.split()
@@ -334,7 +457,7 @@ async def execute_text_node(node: Dict[str, Any], input_data: Any) -> Any:
             'char_count': char_count,
             'line_count': len(processed_text.split('\n'))
         },
-        'variables_found': re.findall(r'\{\{(\w+)\}\}', text_content)
+        'variables_found': template.variables
     }
 
 def generate_intelligent_response(prompt: str) -> str:
@@ -437,6 +560,9 @@ I'm an AI assistant designed to provide helpful, accurate, and comprehensive res
 
 If you have a specific question or need help with a particular topic, feel free to ask! I'm here to provide detailed, thoughtful responses tailored to your needs."""
 
+# Below this time budget (ms) an LLM node answers from the local fallback instead of a provider
+LLM_MIN_PROVIDER_BUDGET_MS = float(os.getenv('LLM_MIN_PROVIDER_BUDGET_MS', '2000'))
+
 async def execute_llm_node(node: Dict[str, Any], input_data: Any) -> Any:
     """Execute an LLM node - real AI processing using OpenAI or Ollama"""
     import os
@@ -453,22 +579,40 @@ async def execute_llm_node(node: Dict[str, Any], input_data: Any) -> Any:
     else:
         content = "No input provided"
     
+    # Not enough time left for a provider round trip: answer locally
+    remaining = remaining_budget()
+    if remaining is not None and remaining * 1000 < LLM_MIN_PROVIDER_BUDGET_MS:
+        response = generate_intelligent_response(content)
+        return {
+            'type': 'llm_response',
+            'model': 'intelligent-fallback',
+            'response': response,
+            'input_tokens': len(content.split()),
+            'output_tokens': len(response.split()),
+            'provider': 'fallback',
+            'degraded': True,
+            'note': f'Time budget too short for a provider call ({remaining * 1000:.0f} ms left).'
+        }
+    
     try:
         # Try OpenAI first
         openai_key = os.getenv('OPENAI_API_KEY')
         if openai_key:
             try:
-                import openai
-                client = openai.OpenAI(api_key=openai_key)
+                client = openai_client(openai_key)
                 
-                response = client.chat.completions.create(
+                # Blocking call in a worker thread; the provider timeout bounds how long
+                # the thread outlives a cancelled or timed out node
+                response = await asyncio.to_thread(
+                    client.chat.completions.create,
                     model=model if model in ['gpt-3.5-turbo', 'gpt-4', 'gpt-4-turbo'] else 'gpt-3.5-turbo',
                     messages=[
                         {"role": "system", "content": "You are a helpful AI assistant. Provide comprehensive, accurate, and useful responses."},
                         {"role": "user", "content": content}
                     ],
                     max_tokens=1000,
-                    temperature=0.7
+                    temperature=0.7,
+                    timeout=within_budget(node_timeout(node))
                 )
                 
                 ai_response = response.choices[0].message.content
@@ -500,15 +644,15 @@ async def execute_llm_node(node: Dict[str, Any], input_data: Any) -> Any:
         
         # Fallback to Ollama (local)
         try:
-            import requests
-            ollama_response = requests.post(
-                'http://localhost:11434/api/generate',
+            ollama_response = await asyncio.to_thread(
+                ollama_session().post,
+                f'{OLLAMA_URL}/api/generate',
                 json={
                     'model': 'llama2',  # or another model you have installed
                     'prompt': content,
                     'stream': False
                 },
-                timeout=30
+                timeout=within_budget(min(30, node_timeout(node)))
             )
             
             if ollama_response.status_code == 200:
@@ -525,7 +669,7 @@ async def execute_llm_node(node: Dict[str, Any], input_data: Any) -> Any:
             print(f"Ollama error: {e}")
         
         # If all else fails, use a more intelligent fallback
-        await asyncio.sleep(0.5)
+        await asyncio.sleep(within_budget(0.5))
         
         # Create a more intelligent response based on the input
         if 'medical' in content.lower() or 'health' in content.lower():
@@ -596,7 +740,7 @@ async def execute_output_node(node: Dict[str, Any], input_data: Any) -> Any:
         else:
             formatted_output = str(actual_value)
     elif output_format == 'json':
-        formatted_output = json.dumps(actual_value, indent=2)
+        formatted_output = json.dumps(actual_value, indent=2, default=_jsonable_fallback)
     elif output_format == 'csv':
         if isinstance(actual_value, dict):
             headers = list(actual_value.keys())
@@ -671,7 +815,7 @@ async def execute_calculator_node(node: Dict[str, Any], input_data: Any) -> Any:
                 numbers.extend(extract_numbers_recursive(data['value']))
             else:
                 # For other keys, skip metadata like 'length', 'size', 'type' etc.
-                skip_keys = {'type', 'length', 'size', 'count', 'format', 'name', 'status', 'error', 'original_input'}
+                skip_keys = {'type', 'length', 'size', 'count', 'format', 'name', 'status', 'error', 'original_input', 'preview', 'file_id'}
                 for key, value in data.items():
                     if key not in skip_keys:
                         numbers.extend(extract_numbers_recursive(value))
@@ -682,7 +826,53 @@ async def execute_calculator_node(node: Dict[str, Any], input_data: Any) -> Any:
         
         return numbers
 
-    numbers = extract_numbers_recursive(input_data)
+    def expression_variables():
+        """All input numbers, the numbers of each input (or table column) and the configured constants"""
+        variables = {'values': numbers, 'n': float(len(numbers))}
+        if table is not None:
+            variables['n'] = float(table.num_rows)
+            for name, column in table.numeric_columns():
+                variables[name] = column
+        else:
+            sources = upstream_outputs(input_data)
+            for position, (source_id, source_output) in enumerate(sources, 1):
+                source_numbers = extract_numbers_recursive(source_output)
+                value = source_numbers[0] if len(source_numbers) == 1 else source_numbers
+                variables[f'input_{position}'] = value
+                if len(sources) > 1:
+                    variables[re.sub(r'\W', '_', source_id)] = value
+        for name, value in (node_data.get('variables') or {}).items():
+            variables[name] = value
+        return variables
+
+    table = find_table(input_data)
+    if table is not None:
+        # Tabular input is reduced column-wise from the typed column arrays
+        columns = node_data.get('columns') or node_data.get('column')
+        if isinstance(columns, str):
+            columns = [columns]
+        numbers = table.numeric_values(columns)
+    else:
+        numbers = extract_numbers_recursive(input_data)
+
+    expression = node_data.get('expression')
+    if expression:
+        # Compiled once per expression text; arrays (e.g. table columns) are evaluated elementwise
+        try:
+            result_value = compile_expression(expression).evaluate(expression_variables())
+        except ExpressionError as e:
+            return {
+                'error': f'Expression error: {str(e)}',
+                'operation': 'expression',
+                'expression': expression
+            }
+        return {
+            'operation': 'expression',
+            'expression': expression,
+            'result': result_value,
+            'input_numbers': numbers,
+            'count': len(result_value) if isinstance(result_value, array) else 1
+        }
     
     if not numbers:
         return {
@@ -766,23 +956,28 @@ async def execute_timer_node(node: Dict[str, Any], input_data: Any) -> Any:
     
     node_data = node.get('data', {})
     duration = node_data.get('duration', 1000)  # milliseconds
-    mode = node_data.get('mode', 'delay')  # delay, interval, or timeout
+    mode = node_data.get('mode', 'delay')  # delay, interval, cron, or timeout
     
     start_time = time.time()
     
     if mode == 'delay':
-        # Simple delay - wait for specified duration
-        await asyncio.sleep(duration / 1000.0)  # Convert ms to seconds
+        # Simple delay - wait for specified duration, cut short to the time budget
+        delay = within_budget(duration / 1000.0)  # Convert ms to seconds
+        await asyncio.sleep(delay)
         actual_duration = (time.time() - start_time) * 1000
         
-        return {
+        result = {
             'type': 'timer_result',
             'mode': 'delay',
             'requested_duration': duration,
             'actual_duration': round(actual_duration, 2),
-            'input_data': input_data,
+            # Passed on by reference, like the other modes
+            'data': input_data,
             'timestamp': int(time.time() * 1000)
         }
+        if delay < duration / 1000.0:
+            result['truncated'] = True
+        return result
     
     elif mode == 'timeout':
         # Timeout - pass through data immediately but track timing
@@ -797,18 +992,25 @@ async def execute_timer_node(node: Dict[str, Any], input_data: Any) -> Any:
             'timestamp': int(time.time() * 1000)
         }
     
-    else:  # interval mode
-        # For interval, we'll simulate by adding timing metadata
+    else:  # interval or cron mode
+        # Registered pipelines run on the timer's schedule; the node passes its input through
         actual_duration = (time.time() - start_time) * 1000
         
-        return {
+        result = {
             'type': 'timer_result',
-            'mode': 'interval',
-            'interval': duration,
+            'mode': mode,
             'elapsed': round(actual_duration, 2),
             'data': input_data,
             'timestamp': int(time.time() * 1000)
         }
+        if mode == 'cron':
+            result['cron'] = node_data.get('cron')
+        else:
+            result['interval'] = duration
+        tick = current_tick.get()
+        if tick is not None:
+            result['schedule'] = tick
+        return result
 
 async def execute_filter_node(node: Dict[str, Any], input_data: Any) -> Any:
     """Execute a Filter node - real data filtering functionality"""
@@ -826,6 +1028,10 @@ async def execute_filter_node(node: Dict[str, Any], input_data: Any) -> Any:
             'passed': False,
             'reason': 'No input data provided'
         }
+
+    table = find_table(input_data)
+    if table is not None and node_data.get('filterField'):
+        return filter_table(table, node_data.get('filterField'), filter_type, filter_value)
     
     # Extract text from input data for filtering
     text_to_filter = ""
@@ -891,8 +1097,63 @@ async def execute_filter_node(node: Dict[str, Any], input_data: Any) -> Any:
         'filtered_count': 1 if passed else 0
     }
 
+def filter_table(table: Table, field: str, filter_type: str, filter_value: str) -> Dict[str, Any]:
+    """Filter the rows of a table by evaluating the predicate over a single column"""
+    result = {
+        'type': 'filter_result',
+        'filter_type': filter_type,
+        'filter_value': filter_value,
+        'filter_field': field,
+        'total_count': len(table)
+    }
+
+    if field not in table.schema.index:
+        result.update({'passed': False, 'reason': f"Unknown column '{field}'", 'original_data': None, 'filtered_count': 0})
+        return result
+
+    needle = str(filter_value).lower()
+    if filter_type == 'contains':
+        def predicate(v: Any) -> bool:
+            return needle in str(v).lower()
+    elif filter_type == 'starts_with':
+        def predicate(v: Any) -> bool:
+            return str(v).lower().startswith(needle)
+    elif filter_type == 'ends_with':
+        def predicate(v: Any) -> bool:
+            return str(v).lower().endswith(needle)
+    elif filter_type == 'regex':
+        try:
+            pattern = re.compile(filter_value, re.IGNORECASE)
+        except re.error as e:
+            result.update({'passed': False, 'reason': f"Invalid regex pattern: {str(e)}", 'original_data': None, 'filtered_count': 0})
+            return result
+
+        def predicate(v: Any) -> bool:
+            return bool(pattern.search(str(v)))
+    elif filter_type == 'length':
+        try:
+            target_length = int(filter_value)
+        except ValueError:
+            result.update({'passed': False, 'reason': f"Invalid length value: {filter_value}", 'original_data': None, 'filtered_count': 0})
+            return result
+
+        def predicate(v: Any) -> bool:
+            return len(str(v)) >= target_length
+    else:
+        def predicate(v: Any) -> bool:
+            return True
+
+    filtered = table.take(v is not None and predicate(v) for v in table.present(field))
+    result.update({
+        'passed': len(filtered) > 0,
+        'reason': f"{len(filtered)} of {len(table)} rows matched {filter_type} '{filter_value}' on '{field}'",
+        'original_data': filtered,
+        'filtered_count': len(filtered)
+    })
+    return result
+
 async def execute_notification_node(node: Dict[str, Any], input_data: Any) -> Any:
-    """Execute a Notification node - real notification functionality (simulated)"""
+    """Execute a Notification node - queues the message for background delivery"""
     import json
     import time
     
@@ -901,8 +1162,6 @@ async def execute_notification_node(node: Dict[str, Any], input_data: Any) -> An
     recipient = node_data.get('recipient', 'user@example.com')
     message = node_data.get('message', 'Pipeline notification')
     
-    await asyncio.sleep(0.2)  # Simulate network delay
-    
     # Extract content from input data for notification
     content = ""
     if isinstance(input_data, dict):
@@ -913,48 +1172,54 @@ async def execute_notification_node(node: Dict[str, Any], input_data: Any) -> An
         elif 'value' in input_data:
             content = str(input_data['value'])
         else:
-            content = json.dumps(input_data, indent=2)
+            content = json.dumps(input_data, indent=2, default=_jsonable_fallback)
     else:
         content = str(input_data)
     
     # Format notification message
     full_message = f"{message}\n\nPipeline Result:\n{content}"
+    subject = f"Pipeline Notification - {time.strftime('%Y-%m-%d %H:%M:%S')}"
     
-    # Simulate different notification types
     notification_result = {
         'type': 'notification_sent',
         'notification_type': notification_type,
         'recipient': recipient,
         'message': full_message,
         'timestamp': int(time.time() * 1000),
-        'status': 'sent',
-        'input_data': input_data
+        'input_summary': summarize_input(input_data)
     }
     
+    body = full_message
     if notification_type == 'email':
         notification_result.update({
-            'subject': f"Pipeline Notification - {time.strftime('%Y-%m-%d %H:%M:%S')}",
-            'delivery_method': 'SMTP simulation',
+            'subject': subject,
             'email_size': len(full_message)
         })
     
     elif notification_type == 'sms':
         # SMS has character limits
         sms_message = full_message[:160] + "..." if len(full_message) > 160 else full_message
+        body = sms_message
         notification_result.update({
             'sms_message': sms_message,
-            'character_count': len(sms_message),
-            'delivery_method': 'SMS gateway simulation'
+            'character_count': len(sms_message)
         })
     
     elif notification_type == 'slack':
+        body = f"```\n{full_message}\n```"
+        recipient = node_data.get('channel', '#pipeline-notifications')
         notification_result.update({
-            'channel': '#pipeline-notifications',
-            'webhook_url': 'https://hooks.slack.com/services/...',
-            'delivery_method': 'Slack webhook simulation',
-            'formatted_message': f"```\n{full_message}\n```"
+            'channel': recipient,
+            'formatted_message': body
         })
     
+    # The pipeline doesn't wait for delivery; its status is at /notifications/{id}
+    notification = notification_queue.enqueue(notification_type, recipient, subject, body, destination(notification_type, node_data.get('webhookUrl')))
+    notification_result.update({
+        'status': notification.status,
+        'notification_id': notification.notification_id,
+        'delivery_method': notification.transport
+    })
     return notification_result
 
 async def execute_data_format_node(node: Dict[str, Any], input_data: Any) -> Any:
@@ -962,6 +1227,7 @@ async def execute_data_format_node(node: Dict[str, Any], input_data: Any) -> Any
     import json
     import csv
     import io
+    import textwrap
     
     node_data = node.get('data', {})
     input_format = node_data.get('inputFormat', 'auto')
@@ -980,39 +1246,48 @@ async def execute_data_format_node(node: Dict[str, Any], input_data: Any) -> Any
     detected_format = 'unknown'
     raw_data = input_data
     
-    if isinstance(input_data, dict):
+    if isinstance(input_data, Table):
+        detected_format = 'table'
+        raw_data = input_data
+    elif isinstance(input_data, RecordStream):
+        detected_format = input_data.format
+        raw_data = input_data
+    elif isinstance(input_data, dict) and isinstance(input_data.get('records'), RecordStream):
+        # File inputs carry their parsed records alongside the raw content
+        detected_format = input_data['records'].format
+        raw_data = input_data['records']
+    elif isinstance(input_data, dict) and find_table(input_data, depth=1) is not None:
+        detected_format = 'table'
+        raw_data = find_table(input_data, depth=1)
+    elif isinstance(input_data, dict):
         detected_format = 'dict'
         raw_data = input_data
     elif isinstance(input_data, list):
         detected_format = 'list'
         raw_data = input_data
     elif isinstance(input_data, str):
-        # Try to detect string format
-        input_data_stripped = input_data.strip()
-        if input_data_stripped.startswith('{') and input_data_stripped.endswith('}'):
-            try:
-                raw_data = json.loads(input_data_stripped)
-                detected_format = 'json'
-            except:
-                detected_format = 'text'
-                raw_data = input_data
-        elif input_data_stripped.startswith('[') and input_data_stripped.endswith(']'):
+        # Detect the string format from a bounded prefix only
+        format_info = sniff_format(input_data[:SNIFF_PREFIX_SIZE], complete=len(input_data) <= SNIFF_PREFIX_SIZE)
+        detected_format = format_info['format']
+        raw_data = input_data
+        if detected_format == 'json':
             try:
-                raw_data = json.loads(input_data_stripped)
-                detected_format = 'json_array'
+                raw_data = json.loads(input_data)
             except (json.JSONDecodeError, ValueError):
                 detected_format = 'text'
                 raw_data = input_data
-        elif ',' in input_data and '\n' in input_data:
-            detected_format = 'csv'
-            raw_data = input_data
-        else:
+        elif detected_format == 'json_array' and not input_data.rstrip().endswith(']'):
             detected_format = 'text'
-            raw_data = input_data
+        elif detected_format in ('json_array', 'ndjson', 'csv'):
+            raw_data = record_stream_for(input_data, format_info)
     else:
         detected_format = 'primitive'
         raw_data = input_data
-    
+
+    if isinstance(raw_data, RecordStream) and raw_data.format == 'csv':
+        # CSV is tabular by nature, so it is held column-wise rather than as row dicts
+        raw_data = Table.from_records(raw_data)
+
     # Convert to output format
     formatted_output = ""
     conversion_info = {
@@ -1023,10 +1298,56 @@ async def execute_data_format_node(node: Dict[str, Any], input_data: Any) -> Any
     }
     
     try:
-        if output_format == 'json':
+        if isinstance(raw_data, (RecordStream, Table)) and output_format not in ('json', 'csv'):
+            # Only JSON and CSV are written record by record; other formats need the list
+            raw_data = list(raw_data)
+
+        if output_format == 'json' and isinstance(raw_data, (RecordStream, Table)):
+            output = io.StringIO()
+            record_count = 0
+            for record in raw_data:
+                output.write(',\n' if record_count else '[\n')
+                output.write(textwrap.indent(json.dumps(record, indent=2, ensure_ascii=False), '  '))
+                record_count += 1
+            output.write('\n]' if record_count else '[]')
+            formatted_output = output.getvalue()
+            conversion_info['conversion_notes'].append(f"Streamed {record_count} {detected_format} records to JSON with 2-space indentation")
+
+        elif output_format == 'json':
             formatted_output = json.dumps(raw_data, indent=2, ensure_ascii=False)
             conversion_info['conversion_notes'].append(f"Converted {detected_format} to JSON with 2-space indentation")
         
+        elif output_format == 'csv' and isinstance(raw_data, Table):
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(raw_data.schema.names)
+            writer.writerows([row[k] for k in row] for row in raw_data.rows())
+            formatted_output = output.getvalue()
+            conversion_info['conversion_notes'].append(f"Wrote table with {len(raw_data)} rows and {len(raw_data.schema.names)} columns to CSV")
+
+        elif output_format == 'csv' and isinstance(raw_data, RecordStream):
+            output = io.StringIO()
+            writer = None
+            record_count = 0
+            for record in raw_data:
+                if writer is None:
+                    if isinstance(record, dict):
+                        writer = csv.DictWriter(output, fieldnames=list(record.keys()), extrasaction='ignore')
+                        writer.writeheader()
+                    else:
+                        writer = csv.writer(output)
+                        writer.writerow(['value'])
+                # The header is already written, so the records must all be objects or all values
+                elif isinstance(record, dict) != isinstance(writer, csv.DictWriter):
+                    raise ValueError(f"Record {record_count + 1} is {'an object' if isinstance(record, dict) else 'a value'} but earlier records are not; can't write a mix of objects and values to CSV")
+                if isinstance(record, dict):
+                    writer.writerow(record)
+                else:
+                    writer.writerow([record])
+                record_count += 1
+            formatted_output = output.getvalue()
+            conversion_info['conversion_notes'].append(f"Streamed {record_count} {detected_format} records to CSV")
+
         elif output_format == 'csv':
             output = io.StringIO()
             if isinstance(raw_data, list) and len(raw_data) > 0:
@@ -1099,47 +1420,289 @@ async def execute_data_format_node(node: Dict[str, Any], input_data: Any) -> Any
     
     return {
         'type': 'data_format_result',
+        # The parsed input (e.g. a Table) by reference, for downstream column operations;
+        # not under 'data', which output nodes would return instead of the formatted text
         'original_data': raw_data,
         'formatted_output': formatted_output,
         'output_size': len(formatted_output),
         'conversion_info': conversion_info
     }
 
-async def execute_node(node: Dict[str, Any], input_data: Any = None) -> NodeResult:
-    """Execute a single node based on its type"""
+async def execute_generic_node(node: Dict[str, Any], input_data: Any) -> Any:
+    """Generic node processing for unknown node types"""
+    await asyncio.sleep(0.2)
+    return {
+        'type': 'generic',
+        'processed_input': input_data,
+        'node_type': node['type']
+    }
+
+# Elements a map node processes at once unless its data sets `concurrency`, and the upper bound
+MAP_DEFAULT_CONCURRENCY = int(os.getenv('MAP_DEFAULT_CONCURRENCY', '4'))
+MAP_MAX_CONCURRENCY = int(os.getenv('MAP_MAX_CONCURRENCY', '64'))
+
+def subgraph_output(results: List[NodeResult], sinks: Iterable[str]) -> Any:
+    """Output of a nested run: its sink's output, or the sink outputs by node id if there are several"""
+    sinks = set(sinks)
+    outputs = {result.node_id: result.output for result in results if result.node_id in sinks and result.status == 'success'}
+    if len(sinks) == 1:
+        return next(iter(outputs.values()), None)
+    return outputs
+
+def map_items(input_data: Any) -> Iterable[Any]:
+    """Elements a map node fans out over, read lazily from record streams and tables"""
+    if input_data is None:
+        return []
+    if isinstance(input_data, (list, tuple, RecordStream)):
+        return input_data
+    table = find_table(input_data)
+    if table is not None:
+        return table.rows()
+    if isinstance(input_data, dict):
+        for key in ('records', 'items'):
+            if isinstance(input_data.get(key), (list, RecordStream)):
+                return input_data[key]
+        value = input_data.get('value', input_data.get('content'))
+        if isinstance(value, (list, str)):
+            return map_items(value)
+    if isinstance(input_data, str):
+        # JSON arrays, NDJSON and CSV give one element per record, other text one per line
+        records = record_stream_for(input_data)
+        if records is not None:
+            return records
+        return [line for line in input_data.splitlines() if line.strip()]
+    return [input_data]
+
+async def execute_map_node(node: Dict[str, Any], input_data: Any) -> Any:
+    """
+    Execute a Map node - run a nested subgraph for every element of the input list.
+
+    `data.subgraph` holds the nodes and edges (and optionally execution options)
+    run per element; its input nodes receive the element. Up to
+    `data.concurrency` elements run at once. Results are gathered in input order,
+    or in completion order with `data.ordered: false`, and reported as
+    'map_item' events as they become available.
+    """
+    node_data = node.get('data', {})
+    subgraph = node_data.get('subgraph') or {}
+    nodes = subgraph.get('nodes') or []
+    edges = subgraph.get('edges') or []
+    if not nodes:
+        raise ValueError('Map node has no subgraph')
+    graph = compile_graph(nodes, edges)
+    if not graph.is_dag:
+        raise ValueError(f'Map subgraph contains cycles ({graph.describe_cycle()})')
+    input_ids = [sub_node['id'] for sub_node in nodes if resolve_node_kind(sub_node) == 'input']
+    if not input_ids:
+        raise ValueError('Map subgraph needs an input node to receive the elements')
+
+    # Planned once for all elements; the input nodes are its parameters
+    options = ExecutionOptions.model_validate(subgraph.get('options') or {})
+    plan = plan_pipeline(nodes, edges, graph, options, frozenset(input_ids))
+    sinks = sink_node_ids(plan.nodes, plan.edges)
+    concurrency = min(max(int(node_data.get('concurrency') or MAP_DEFAULT_CONCURRENCY), 1), MAP_MAX_CONCURRENCY)
+    ordered = bool(node_data.get('ordered', True))
+    report = current_listener()
+
+    async def run_item(index: int, item: Any) -> Dict[str, Any]:
+        element = {'type': 'item', 'value': item, 'index': index}
+        results = await execute_pipeline(plan.nodes, plan.edges, options, plan.instance(), dict.fromkeys(input_ids, element))
+        entry = {'index': index, 'status': 'success', 'output': subgraph_output(results, sinks)}
+        failed = [result for result in results if result.status != 'success']
+        if failed:
+            entry['status'] = failed[0].status
+            entry['error'] = f'{failed[0].node_id}: {failed[0].error}'
+        return entry
+
+    entries = []
+    buffered = {}
+    next_index = 0
+    running: Dict[asyncio.Future, int] = {}
+    items = enumerate(map_items(input_data))
+    exhausted = False
+    # Nodes of the subgraph are not reported themselves, only the elements
+    with listen(None):
+        try:
+            while True:
+                while not exhausted and len(running) < concurrency:
+                    index, item = next(items, (None, None))
+                    if index is None:
+                        exhausted = True
+                        break
+                    running[asyncio.ensure_future(run_item(index, item))] = index
+                if not running:
+                    break
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=running.get):
+                    del running[task]
+                    entry = task.result()
+                    entries.append(entry)
+                    if report is None:
+                        continue
+                    if not ordered:
+                        report({'event': 'map_item', 'node_id': node['id'], **entry})
+                        continue
+                    # In order: hold back elements finished before earlier ones
+                    buffered[entry['index']] = entry
+                    while next_index in buffered:
+                        report({'event': 'map_item', 'node_id': node['id'], **buffered.pop(next_index)})
+                        next_index += 1
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    if ordered:
+        entries.sort(key=lambda entry: entry['index'])
+    succeeded = sum(1 for entry in entries if entry['status'] == 'success')
+    return {
+        'type': 'map_result',
+        'count': len(entries),
+        'succeeded': succeeded,
+        'failed': len(entries) - succeeded,
+        'ordered': ordered,
+        'concurrency': concurrency,
+        'results': entries
+    }
+
+async def execute_composite_node(node: Dict[str, Any], input_data: Any) -> Any:
+    """
+    Execute a Composite node - run a registered pipeline as a single node.
+
+    `data.pipelineId` (and optionally `data.version`) names the sub-pipeline,
+    compiled once per version by the registry. `data.inputs` binds its inputs
+    like an invocation; the other input nodes receive this node's input. The
+    output is the sub-pipeline's sink output. Outputs of deterministic
+    sub-pipelines are memoized per input, or of any with `data.memoize: true`.
+    """
+    node_data = node.get('data', {})
+    pipeline_id = node_data.get('pipelineId')
+    if not pipeline_id:
+        raise ValueError('Composite node has no pipelineId')
+    compiled = await load_compiled_pipeline(pipeline_id, node_data.get('version'))
+    inputs = node_data.get('inputs') or {}
+    bound_ids = {compiled.input_ids[name] for name in inputs if name in compiled.input_ids}
+    seeded = frozenset(() if input_data is None else set(compiled.input_ids.values()) - bound_ids)
+    nodes, plan = compiled.bind(inputs, seeded)
+
+    async def run() -> Any:
+        # Nodes of the sub-pipeline are not reported, only the composite node
+        with listen(None):
+            results = await execute_pipeline(plan.nodes, plan.edges, compiled.options, plan, dict.fromkeys(seeded, input_data))
+        failed = [result for result in results if result.status != 'success']
+        if failed:
+            raise CompositeError(f'{pipeline_id}/{failed[0].node_id}: {failed[0].error}')
+        return subgraph_output(results, sink_node_ids(plan.nodes, plan.edges))
+
+    with composite_scope(pipeline_id):
+        memoize = node_data.get('memoize')
+        if memoize is None:
+            memoize = all(is_deterministic_node(sub_node) for sub_node in nodes)
+        key = memo_key(compiled.record.definition_hash, inputs, input_data) if memoize else None
+        if key is None:
+            return await run()
+        return await composite_memo.run(key, run)
+
+# Node kinds in dispatch order: a node gets the first kind whose keyword appears
+# in its type or id (data format nodes match 'dataformat' in the type, 'data' in the id)
+NODE_KIND_KEYWORDS = [
+    ('input', 'input', 'custominput'),
+    ('text', 'text', 'text'),
+    ('llm', 'llm', 'llm'),
+    ('output', 'output', 'output'),
+    ('calculator', 'calculator', 'calculator'),
+    ('timer', 'timer', 'timer'),
+    ('filter', 'filter', 'filter'),
+    ('notification', 'notification', 'notification'),
+    ('map', 'map', 'map'),
+    ('composite', 'composite', 'composite'),
+    ('dataformat', 'dataformat', 'data'),
+]
+
+NODE_HANDLERS = {
+    'input': lambda node, input_data: execute_input_node(node),
+    'text': execute_text_node,
+    'llm': execute_llm_node,
+    'output': execute_output_node,
+    'calculator': execute_calculator_node,
+    'timer': execute_timer_node,
+    'filter': execute_filter_node,
+    'notification': execute_notification_node,
+    'dataformat': execute_data_format_node,
+    'map': execute_map_node,
+    'composite': execute_composite_node,
+    'generic': execute_generic_node,
+}
+
+# Kinds whose output depends only on node data and inputs (no clock, network or side effects)
+DETERMINISTIC_NODE_KINDS = {'input', 'text', 'output', 'calculator', 'filter', 'dataformat'}
+
+def resolve_node_kind(node: Dict[str, Any]) -> str:
+    """Map a node to the handler kind used to execute it"""
+    node_type = node['type'].lower()
+    node_id = node['id'].lower()
+    for kind, type_keyword, id_keyword in NODE_KIND_KEYWORDS:
+        if type_keyword in node_type or id_keyword in node_id:
+            return kind
+    return 'generic'
+
+def is_deterministic_node(node: Dict[str, Any]) -> bool:
+    """Whether re-running the node with the same inputs always gives the same output"""
+    if resolve_node_kind(node) not in DETERMINISTIC_NODE_KINDS:
+        return False
+    # Uploaded files can be deleted or replaced behind the same pipeline definition
+    return not node.get('data', {}).get('fileId')
+
+# Upper bound for a single node unless its data sets `timeout` (milliseconds)
+DEFAULT_NODE_TIMEOUT_MS = float(os.getenv('NODE_TIMEOUT_MS', '120000'))
+
+PIPELINE_TIMEOUT_ERROR = 'Pipeline timeout reached'
+
+def node_timeout(node: Dict[str, Any]) -> float:
+    """Seconds a node may run: its `data.timeout` (ms) or the default"""
+    timeout_ms = node.get('data', {}).get('timeout')
+    try:
+        timeout_ms = float(timeout_ms) if timeout_ms is not None else DEFAULT_NODE_TIMEOUT_MS
+    except (TypeError, ValueError):
+        timeout_ms = DEFAULT_NODE_TIMEOUT_MS
+    return max(timeout_ms, 0.0) / 1000.0
+
+# Kinds that only run nested nodes; they take no pool slot, so nested nodes never
+# wait for slots held by the nodes that started them
+NESTING_NODE_KINDS = {'map', 'composite'}
+
+async def run_in_pool(kind: str, node: Dict[str, Any], input_data: Any) -> Any:
+    """Run a node's handler in the concurrency pool of its kind, in its tenant's turn"""
+    if kind in NESTING_NODE_KINDS:
+        return await NODE_HANDLERS[kind](node, input_data)
+    async with node_pools.slot(kind, current_tenant.get(), cost_model.estimate(node, kind)):
+        return await NODE_HANDLERS[kind](node, input_data)
+
+async def execute_node(node: Dict[str, Any], input_data: Any = None, kind: Optional[str] = None, remaining: Optional[float] = None) -> NodeResult:
+    """
+    Execute a single node based on its type (or its already resolved kind).
+
+    The handler is stopped after the node's timeout, or after `remaining`
+    seconds of the pipeline's time limit if that is shorter, including the
+    time spent waiting for a slot in its kind's pool. It can read the time it
+    has left with `deadlines.remaining_budget()`.
+    """
     start_time = time.time()
     node_id = node['id']
     node_type = node['type']
+    timeout = node_timeout(node)
+    limited_by_pipeline = remaining is not None and remaining < timeout
+    if limited_by_pipeline:
+        timeout = remaining
 
     try:
-        if 'input' in node_type.lower() or 'custominput' in node_id.lower():
-            result = await execute_input_node(node)
-        elif 'text' in node_type.lower() or 'text' in node_id.lower():
-            result = await execute_text_node(node, input_data)
-        elif 'llm' in node_type.lower() or 'llm' in node_id.lower():
-            result = await execute_llm_node(node, input_data)
-        elif 'output' in node_type.lower() or 'output' in node_id.lower():
-            result = await execute_output_node(node, input_data)
-        elif 'calculator' in node_type.lower() or 'calculator' in node_id.lower():
-            result = await execute_calculator_node(node, input_data)
-        elif 'timer' in node_type.lower() or 'timer' in node_id.lower():
-            result = await execute_timer_node(node, input_data)
-        elif 'filter' in node_type.lower() or 'filter' in node_id.lower():
-            result = await execute_filter_node(node, input_data)
-        elif 'notification' in node_type.lower() or 'notification' in node_id.lower():
-            result = await execute_notification_node(node, input_data)
-        elif 'dataformat' in node_type.lower() or 'data' in node_id.lower():
-            result = await execute_data_format_node(node, input_data)
-        else:
-            # Generic node processing
-            await asyncio.sleep(0.2)
-            result = {
-                'type': 'generic',
-                'processed_input': input_data,
-                'node_type': node_type
-            }
+        kind = kind or resolve_node_kind(node)
+        with node_budget(timeout):
+            result = await asyncio.wait_for(run_in_pool(kind, node, input_data), timeout)
 
         execution_time = time.time() - start_time
+        cost_model.observe(node_type, execution_time)
 
         return NodeResult(
             node_id=node_id,
@@ -1149,6 +1712,16 @@ async def execute_node(node: Dict[str, Any], input_data: Any = None) -> NodeResu
             execution_time=execution_time
         )
 
+    except asyncio.TimeoutError:
+        return NodeResult(
+            node_id=node_id,
+            node_type=node_type,
+            status='timeout',
+            output=None,
+            error=PIPELINE_TIMEOUT_ERROR if limited_by_pipeline else f'Node timed out after {timeout * 1000:g} ms',
+            execution_time=time.time() - start_time
+        )
+
     except Exception as e:
         execution_time = time.time() - start_time
         return NodeResult(
@@ -1160,60 +1733,977 @@ async def execute_node(node: Dict[str, Any], input_data: Any = None) -> NodeResu
             execution_time=execution_time
         )
 
-async def execute_pipeline(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> List[NodeResult]:
-    """Execute the entire pipeline in topological order"""
-    execution_order = get_topological_order(nodes, edges)
+def plan_pipeline(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]], graph: CompiledGraph, options: ExecutionOptions, parameters: FrozenSet[str] = frozenset()) -> ExecutionPlan:
+    """
+    Build the execution plan for a validated pipeline, optimized unless disabled.
+
+    `parameters` are input nodes whose values change between runs of the same
+    plan; they are never treated as constants.
+    """
+    order = graph.order_ids()
+    if not options.optimize:
+        plan = ExecutionPlan(nodes, edges, order)
+        plan.kinds = {node['id']: resolve_node_kind(node) for node in nodes}
+        return plan
+    def is_pure(node: Dict[str, Any]) -> bool:
+        return node['id'] not in parameters and is_deterministic_node(node)
+
+    return optimize_pipeline(nodes, edges, order, resolve_node_kind, is_pure)
+
+def gather_inputs(input_sources: List[str], node_outputs: Dict[str, Any]) -> Any:
+    """Input data for a node: the single upstream output, or a dict of them by source id"""
+    if not input_sources:
+        return None
+    if len(input_sources) == 1:
+        return node_outputs.get(input_sources[0])
+    input_data = {}
+    for source_id in input_sources:
+        source_output = node_outputs.get(source_id)
+        if source_output:
+            input_data[source_id] = source_output
+    return input_data
+
+def node_event(result: NodeResult, with_output: bool) -> Dict[str, Any]:
+    """Progress event for a finished node"""
+    event = {'event': 'node', 'node_id': result.node_id, 'node_type': result.node_type, 'status': result.status, 'execution_time': result.execution_time}
+    if result.error:
+        event['error'] = result.error
+    if with_output and result.status == 'success':
+        event['output'] = result.output
+    return event
+
+def upstream_outputs(input_data: Any) -> List[Tuple[str, Any]]:
+    """
+    `(source id, output)` of each upstream node in edge order: the entries of the
+    dict `gather_inputs` builds for several inputs, or the single input.
+    """
+    several = (
+        isinstance(input_data, dict) and len(input_data) > 1
+        and all(isinstance(value, dict) for value in input_data.values())
+        # Node outputs carry these keys, dicts of outputs by node id don't
+        and not {'type', 'value', 'result'} & input_data.keys()
+    )
+    if several:
+        return list(input_data.items())
+    return [('input', input_data)]
+
+async def execute_planned_node(node: Dict[str, Any], input_data: Any, plan: ExecutionPlan, remaining: Optional[float] = None) -> NodeResult:
+    """Execute a node, replaying constant nodes from the fold cache"""
+    kind = plan.kinds.get(node['id'])
+    key = plan.constant_keys.get(node['id'])
+    if key is None:
+        return await execute_node(node, input_data, kind, remaining)
+
+    if key in fold_cache:
+        plan.folded.append(node['id'])
+        return NodeResult(node_id=node['id'], node_type=node['type'], status='success', output=fold_cache.get(key), execution_time=0.0)
+
+    result = await execute_node(node, input_data, kind, remaining)
+    if result.status == 'success':
+        fold_cache.put(key, result.output)
+    return result
+
+async def execute_fused_chain(chain: List[Dict[str, Any]], input_data: Any, plan: ExecutionPlan, remaining: Optional[float] = None) -> List[NodeResult]:
+    """
+    Execute a fused chain as one step: a single slot in the head's pool and a
+    single timeout (the members' timeouts added up, or `remaining` if shorter),
+    with each handler called inline on the previous node's output. Returns one
+    result per member; members after a timeout are reported as timed out.
+    """
+    head_kind = plan.kinds.get(chain[0]['id']) or resolve_node_kind(chain[0])
+    timeout = sum(node_timeout(node) for node in chain)
+    limited_by_pipeline = remaining is not None and remaining < timeout
+    if limited_by_pipeline:
+        timeout = remaining
+    cost = sum(cost_model.estimate(node, plan.kinds.get(node['id']) or resolve_node_kind(node)) for node in chain)
+    results: List[NodeResult] = []
+    step_start = time.time()
+
+    async def run_chain() -> None:
+        nonlocal step_start
+        value = input_data
+        async with node_pools.slot(head_kind, current_tenant.get(), cost):
+            for node in chain:
+                step_start = time.time()
+                try:
+                    output = await NODE_HANDLERS[plan.kinds.get(node['id']) or resolve_node_kind(node)](node, value)
+                except Exception as e:
+                    results.append(NodeResult(node_id=node['id'], node_type=node['type'], status='error', output=None, error=str(e), execution_time=time.time() - step_start))
+                    # Like an unfused node after a failed one, the next member gets no input
+                    value = None
+                    continue
+                execution_time = time.time() - step_start
+                cost_model.observe(node['type'], execution_time)
+                results.append(NodeResult(node_id=node['id'], node_type=node['type'], status='success', output=output, execution_time=execution_time))
+                value = output
+
+    try:
+        with node_budget(timeout):
+            await asyncio.wait_for(run_chain(), timeout)
+    except asyncio.TimeoutError:
+        error = PIPELINE_TIMEOUT_ERROR if limited_by_pipeline else f'Node timed out after {timeout * 1000:g} ms'
+        for index, node in enumerate(chain[len(results):]):
+            execution_time = time.time() - step_start if index == 0 else 0.0
+            results.append(NodeResult(node_id=node['id'], node_type=node['type'], status='timeout', output=None, error=error, execution_time=execution_time))
+    return results
+
+def budget_shortfall(node: Dict[str, Any], plan: ExecutionPlan, remaining: float) -> Optional[str]:
+    """Why the node can't finish in the `remaining` seconds, or None if it can"""
+    key = plan.constant_keys.get(node['id'])
+    if key is not None and key in fold_cache:
+        return None
+    needed = min(min_budget(plan.kinds.get(node['id']) or resolve_node_kind(node)), node_timeout(node))
+    if remaining >= needed:
+        return None
+    return f'Skipped: needs at least {needed * 1000:g} ms, {remaining * 1000:.0f} ms of the time budget left'
+
+async def execute_pipeline(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]], options: Optional[ExecutionOptions] = None, plan: Optional[ExecutionPlan] = None, seed_outputs: Optional[Dict[str, Any]] = None, checkpoint: Optional[RunCheckpoint] = None, on_cancel: Optional[Callable[[List[NodeResult]], None]] = None) -> List[NodeResult]:
+    """
+    Execute the entire pipeline, running up to `max_concurrency` nodes at once.
+
+    Each node's output is kept only until its last consumer has read it, so peak
+    memory follows the widest frontier of live outputs rather than the whole run.
+    When a plan is given, its nodes and edges are executed instead; fused chains
+    run as one step and constant nodes are replayed from the fold cache. Ready
+    nodes start in topological order, or by critical path with the
+    'critical_path' schedule and more than one slot.
+
+    Nodes in `seed_outputs` already ran (e.g. in a checkpointed run being
+    resumed) and are reported with the given output instead of executed. With a
+    `checkpoint`, every successful output is saved as soon as its node finishes.
+
+    With `options.timeout_ms`, nodes still running when the limit passes, and
+    nodes not started by then, get status 'timeout'; nodes the remaining time
+    can't cover are 'skipped' up front, and the others adapt to it. If the run
+    is cancelled (e.g. the client disconnected), the remaining nodes are
+    reported to `on_cancel` as 'cancelled' before the cancellation propagates.
+
+    Finished nodes are reported to the current event listener as they finish,
+    with their output if it is a sink's (or intermediate outputs are included).
+    """
+    options = options or ExecutionOptions()
+    listener = current_listener()
+    seed_outputs = seed_outputs or {}
+    if plan is not None:
+        nodes, edges = plan.nodes, plan.edges
+    else:
+        plan = ExecutionPlan(nodes, edges, get_topological_order(nodes, edges))
+    execution_order = plan.order
+    chain_members = plan.chain_members()
     node_outputs = {}
     results = []
 
     # Create node lookup
     node_lookup = {node['id']: node for node in nodes}
 
-    # Create edge lookup for getting inputs
+    # Create edge lookup for getting inputs, and count pending reads per output
     input_edges = defaultdict(list)
+    pending_reads = defaultdict(int)
     for edge in edges:
         input_edges[edge['target']].append(edge['source'])
+        if edge['target'] in node_lookup:
+            pending_reads[edge['source']] += 1
+
+    # Units of work: single nodes, and fused chains run by their head
+    units = [node_id for node_id in execution_order if node_id in node_lookup and node_id not in chain_members]
+    unit_of = {}
+    for head in units:
+        for node_id in plan.chains.get(head, [head]):
+            unit_of[node_id] = head
+    successors = defaultdict(list)
+    waiting = {}
+    for head in units:
+        producers = [unit_of[source_id] for source_id in input_edges[head] if source_id in unit_of]
+        waiting[head] = len(producers)
+        for producer in producers:
+            successors[producer].append(head)
+
+    max_concurrency = options.max_concurrency or PIPELINE_MAX_CONCURRENCY
+    ranks = None
+    if options.schedule == 'critical_path' and max_concurrency > 1:
+        costs = {
+            head: sum(cost_model.estimate(node_lookup[node_id], plan.kinds.get(node_id) or resolve_node_kind(node_lookup[node_id])) for node_id in plan.chains.get(head, [head]))
+            for head in units
+        }
+        ranks = upward_ranks(units, successors, costs)
+    ready = ReadyQueue(units, ranks)
+    for head in units:
+        if waiting[head] == 0:
+            ready.push(head)
 
-    # Execute nodes in topological order
-    for node_id in execution_order:
-        if node_id not in node_lookup:
-            continue
-
-        node = node_lookup[node_id]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + options.timeout_ms / 1000.0 if options.timeout_ms else None
 
+    async def run_unit(head: str) -> NodeResult:
         # Get input data from predecessor nodes
-        input_data = None
-        input_sources = input_edges[node_id]
-
-        if input_sources:
-            if len(input_sources) == 1:
-                # Single input
-                source_id = input_sources[0]
-                input_data = node_outputs.get(source_id)
+        input_sources = input_edges[head]
+        input_data = gather_inputs(input_sources, node_outputs)
+
+        # Release upstream outputs that have no readers left
+        for source_id in input_sources:
+            pending_reads[source_id] -= 1
+            if pending_reads[source_id] <= 0:
+                node_outputs.pop(source_id, None)
+
+        # A fused chain runs as one step unless it's being resumed or is short of time
+        chain = plan.chains.get(head, [head])
+        remaining = deadline - loop.time() if deadline is not None else None
+        fused = (
+            len(chain) > 1 and not seed_outputs.keys() & set(chain)
+            and (remaining is None or (remaining > 0 and not budget_shortfall(node_lookup[head], plan, remaining)))
+        )
+        if fused:
+            chain_results = await execute_fused_chain([node_lookup[node_id] for node_id in chain], input_data, plan, remaining)
+            for result in chain_results:
+                if checkpoint is not None and result.status == 'success' and not (isinstance(result.output, dict) and result.output.get('error')):
+                    await asyncio.to_thread(checkpoint.save, result.node_id, result.output)
+                results.append(result)
+                if listener is not None:
+                    listener(node_event(result, options.include_intermediate or pending_reads[result.node_id] == 0))
+            if not options.include_intermediate:
+                for result in chain_results[:-1]:
+                    result.output = None
+            return chain_results[-1]
+
+        # Otherwise each node of the chain runs in turn, its output handed straight to the next
+        result = None
+        for chain_node_id in chain:
+            if result is not None and not options.include_intermediate:
+                result.output = None
+            node = node_lookup[chain_node_id]
+            remaining = deadline - loop.time() if deadline is not None else None
+            skip_reason = budget_shortfall(node, plan, remaining) if remaining is not None else None
+            if chain_node_id in seed_outputs:
+                result = NodeResult(node_id=chain_node_id, node_type=node['type'], status='success', output=seed_outputs[chain_node_id], execution_time=0.0)
+            elif remaining is not None and remaining <= 0:
+                result = NodeResult(node_id=chain_node_id, node_type=node['type'], status='timeout', output=None, error=PIPELINE_TIMEOUT_ERROR, execution_time=0.0)
+            elif skip_reason:
+                result = NodeResult(node_id=chain_node_id, node_type=node['type'], status='skipped', output=None, error=skip_reason, execution_time=0.0)
             else:
-                # Multiple inputs - combine them
-                input_data = {}
-                for source_id in input_sources:
-                    source_output = node_outputs.get(source_id)
-                    if source_output:
-                        input_data[source_id] = source_output
+                result = await execute_planned_node(node, input_data, plan, remaining)
+                # Outputs carrying an 'error' (e.g. the LLM quota fallback) are retried on resume
+                if checkpoint is not None and result.status == 'success' and not (isinstance(result.output, dict) and result.output.get('error')):
+                    await asyncio.to_thread(checkpoint.save, chain_node_id, result.output)
+            input_data = result.output if result.status == 'success' else None
+            results.append(result)
+            if listener is not None:
+                listener(node_event(result, options.include_intermediate or pending_reads[chain_node_id] == 0))
+        return result
+
+    running: Dict[asyncio.Future, str] = {}
+    try:
+        while ready or running:
+            while ready and len(running) < max_concurrency:
+                head = ready.pop()
+                running[asyncio.ensure_future(run_unit(head))] = head
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                head = running.pop(task)
+                result = task.result()
+
+                # Store output for downstream nodes
+                last_id = result.node_id
+                if result.status == 'success' and pending_reads[last_id] > 0:
+                    node_outputs[last_id] = result.output
+                    if not options.include_intermediate:
+                        result.output = None
+                for successor in successors[head]:
+                    waiting[successor] -= 1
+                    if waiting[successor] == 0:
+                        ready.push(successor)
+    except asyncio.CancelledError:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        finished = {result.node_id for result in results}
+        for node_id in execution_order:
+            if node_id in node_lookup and node_id not in finished:
+                node = node_lookup[node_id]
+                results.append(NodeResult(node_id=node_id, node_type=node['type'], status='cancelled', output=None, error='Pipeline execution was cancelled', execution_time=0.0))
+        if on_cancel is not None:
+            on_cancel(results)
+        raise
+    finally:
+        for task in running:
+            task.cancel()
 
-        # Execute the node
-        result = await execute_node(node, input_data)
-        results.append(result)
+    return results
 
-        # Store output for downstream nodes
-        if result.status == 'success':
-            node_outputs[node_id] = result.output
+# Seconds between checks whether the client of a running pipeline is still connected
+DISCONNECT_POLL_INTERVAL = float(os.getenv('DISCONNECT_POLL_INTERVAL', '0.25'))
 
-    return results
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[Any]) -> Any:
+    """
+    Await `awaitable`, cancelling it if the client disconnects first.
+
+    A cancelled run answers 499 (Client Closed Request), which nobody reads,
+    but its nodes stop instead of running on for a client that's gone.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail='Client closed request')
+    finally:
+        if not task.done():
+            task.cancel()
+
+def request_tenant(request: Request) -> str:
+    try:
+        return tenant_id(request.headers.get(TENANT_HEADER))
+    except TenantError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+async def run_admitted(cost: int, run: Callable[[], Awaitable[PipelineResult]], tenant: str) -> PipelineResult:
+    """
+    Start `run()` for `tenant` once admission control lets it in, or answer 503
+    with Retry-After. Its nodes then take turns with other tenants' nodes.
+    """
+    start_time = time.monotonic()
+    try:
+        async with admission.admit(cost, tenant):
+            current_tenant.set(tenant)
+            result = await run()
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': str(e.retry_after)}) from e
+    tenants.record_latency(tenant, time.monotonic() - start_time)
+    return result
+
+async def read_request_body(request: Request) -> bytes:
+    """Read the request body and undo its Content-Encoding"""
+    try:
+        return wire.decompress(await request.body(), request.headers.get('content-encoding'))
+    except wire.WireFormatError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail) from e
 
-@app.post('/pipelines/parse')
-async def parse_pipeline(pipeline_data: PipelineData):
+def parse_pipeline_body(body: bytes, content_type: str, model: Type[BaseModel] = PipelineData) -> Any:
+    """Decode and validate a JSON or MessagePack pipeline (or other `model`) body"""
+    try:
+        if wire.is_msgpack(content_type):
+            return model.model_validate(wire.decode_msgpack(body))
+        return model.model_validate_json(body)
+    except wire.WireFormatError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail) from e
+    except ValidationError as e:
+        errors = [{**error, 'loc': ('body', *error['loc'])} for error in e.errors(include_url=False)]
+        raise RequestValidationError(errors) from e
+
+def request_body_openapi(model: Type[BaseModel], required: bool = True) -> Dict[str, Any]:
+    """
+    `openapi_extra` documenting a `model` body for endpoints that read the raw
+    request (to accept MessagePack and compressed bodies) instead of declaring it
+    """
+    schema = model.model_json_schema()
+    definitions = schema.pop('$defs', {})
+
+    def inline(value: Any) -> Any:
+        # Nested models are inlined; '#/$defs/...' refs don't resolve inside the OpenAPI document
+        if isinstance(value, dict):
+            if '$ref' in value:
+                resolved = inline(definitions[value['$ref'].rsplit('/', 1)[-1]])
+                return {**resolved, **{key: inline(item) for key, item in value.items() if key != '$ref'}}
+            return {key: inline(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [inline(item) for item in value]
+        return value
+
+    schema = inline(schema)
+    content = {media_type: {'schema': schema} for media_type in (wire.JSON_MEDIA_TYPE, wire.MSGPACK_MEDIA_TYPES[0])}
+    return {'requestBody': {'required': required, 'content': content}}
+
+def encode_pipeline_result(result: PipelineResult, request: Request, cache_entry: Optional[CacheEntry] = None) -> Response:
+    """Encode the result as JSON or MessagePack and compress it per Accept-Encoding"""
+    media_type = wire.choose_media_type(request.headers.get('accept'))
+    accepted_encoding = wire.choose_encoding(request.headers.get('accept-encoding'))
+    variant = (media_type, accepted_encoding)
+
+    if cache_entry is not None and variant in cache_entry.bodies:
+        body, content_encoding = cache_entry.bodies[variant]
+    else:
+        if media_type == wire.JSON_MEDIA_TYPE:
+            body = result.model_dump_json().encode('utf-8')
+        else:
+            body = wire.encode_msgpack(result.model_dump(mode='json'))
+        body, content_encoding = wire.compress(body, accepted_encoding)
+        if cache_entry is not None:
+            pipeline_cache.add_body(cache_entry, variant, body, content_encoding)
+
+    headers = {'Vary': 'Accept, Accept-Encoding'}
+    if content_encoding:
+        headers['Content-Encoding'] = content_encoding
+    if cache_entry is not None:
+        headers['ETag'] = cache_entry.etag
+        headers['Cache-Control'] = 'no-cache'
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def is_deterministic_pipeline(pipeline_data: PipelineData) -> bool:
+    return bool(pipeline_data.nodes) and all(is_deterministic_node(node) for node in pipeline_data.nodes)
+
+@app.post('/pipelines/parse', openapi_extra=request_body_openapi(PipelineData))
+async def parse_pipeline(request: Request):
     """
-    Parse and execute the pipeline, returning statistics and execution results
+    Parse and execute the pipeline, returning statistics and execution results.
+
+    The body may be JSON or MessagePack (optionally gzip/zstd compressed); the
+    response format follows the Accept and Accept-Encoding headers. Results of
+    fully deterministic pipelines are cached and carry an ETag, so a matching
+    If-None-Match is answered with 304 Not Modified. Concurrent identical
+    submissions (or ones sharing an Idempotency-Key) share one execution.
+    """
+    body = await read_request_body(request)
+    content_type = wire.media_type(request.headers.get('content-type'))
+
+    use_cache = pipeline_cache.enabled and 'no-cache' not in request.headers.get('cache-control', '').lower()
+    raw_key = body_hash(body, content_type)
+    entry = pipeline_cache.get_by_body(raw_key) if use_cache else None
+    cache_status = 'hit'
+
+    if entry is None:
+        pipeline_data = parse_pipeline_body(body, content_type)
+        pipeline_hash = canonical_hash(pipeline_data.model_dump(mode='json'))
+        key = pipeline_hash if pipeline_cache.enabled and is_deterministic_pipeline(pipeline_data) else None
+        entry = pipeline_cache.get(key) if use_cache and key is not None else None
+
+        if entry is None:
+            cache_status = 'miss'
+            tenant = request_tenant(request)
+            flight_key, idempotent = coalescing_key(request.headers.get('idempotency-key'), pipeline_hash, tenant)
+            try:
+                cost = pipeline_cost(resolve_node_kind(node) for node in pipeline_data.nodes)
+
+                async def execute() -> PipelineResult:
+                    return await run_pipeline(pipeline_data, pipeline_hash=pipeline_hash)
+
+                async def run() -> PipelineResult:
+                    return await run_admitted(cost, execute, tenant)
+
+                result, shared = await cancel_on_disconnect(request, pipeline_coalescer.run(flight_key, pipeline_hash, run, idempotent))
+            except IdempotencyConflict as e:
+                raise HTTPException(status_code=422, detail=str(e)) from e
+
+            if key is None or result.status != 'success':
+                response = encode_pipeline_result(result, request)
+                if shared:
+                    response.headers['X-Coalesced'] = 'true'
+                return response
+            entry = pipeline_cache.get(key) if shared else None
+            if entry is None:
+                entry = pipeline_cache.put(key, result)
+        pipeline_cache.alias(raw_key, key)
+
+    if etag_matches(request.headers.get('if-none-match'), entry.etag):
+        return Response(status_code=304, headers={'ETag': entry.etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept, Accept-Encoding'})
+
+    response = encode_pipeline_result(entry.result, request, entry)
+    response.headers['X-Cache'] = cache_status
+    return response
+
+def encode_event(event: Dict[str, Any]) -> bytes:
+    return to_json(event, fallback=_jsonable_fallback) + b'\n'
+
+@app.post('/pipelines/stream', openapi_extra=request_body_openapi(PipelineData))
+async def stream_pipeline(request: Request):
+    """
+    Execute the pipeline and stream its progress as NDJSON.
+
+    Every finished node is sent as a 'node' event and every finished element
+    of a map node as a 'map_item' event, while the run goes on; the last line
+    is a 'result' event with the full result, or an 'error' event. Streamed
+    runs are neither cached nor coalesced. Disconnecting cancels the run.
+    """
+    body = await read_request_body(request)
+    pipeline_data = parse_pipeline_body(body, wire.media_type(request.headers.get('content-type')))
+    cost = pipeline_cost(resolve_node_kind(node) for node in pipeline_data.nodes)
+    tenant = request_tenant(request)
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run() -> PipelineResult:
+        with listen(events.put_nowait):
+            return await run_admitted(cost, lambda: run_pipeline(pipeline_data), tenant)
+
+    async def lines():
+        task = asyncio.ensure_future(run())
+        try:
+            while True:
+                next_event = asyncio.ensure_future(events.get())
+                await asyncio.wait({next_event, task}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_event.done():
+                    next_event.cancel()
+                    break
+                yield encode_event(next_event.result())
+            while not events.empty():
+                yield encode_event(events.get_nowait())
+            try:
+                result = task.result()
+            except HTTPException as e:
+                error = {'event': 'error', 'status_code': e.status_code, 'detail': e.detail}
+                if e.headers and 'Retry-After' in e.headers:
+                    error['retry_after'] = int(e.headers['Retry-After'])
+                yield encode_event(error)
+            else:
+                yield encode_event({'event': 'result', 'result': result.model_dump(mode='json')})
+        finally:
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+@app.get('/pipelines/cache')
+def get_pipeline_cache_stats():
+    """Pipeline result cache, constant folding, composite memo and in-flight coalescing statistics"""
+    return {**pipeline_cache.stats(), 'folding': fold_cache.stats(), 'composites': composite_memo.stats(), 'coalescing': pipeline_coalescer.stats()}
+
+@app.delete('/pipelines/cache')
+def clear_pipeline_cache():
+    pipeline_cache.clear()
+    fold_cache.clear()
+    composite_memo.clear()
+    return {'message': 'Pipeline cache cleared', 'status': 'success'}
+
+@app.get('/metrics')
+def get_metrics():
+    """Admission control, occupancy and wait times of the per-kind node pools, per-tenant load and latency, notification delivery and schedules"""
+    return {'admission': admission.stats(), 'node_pools': node_pools.stats(), 'tenants': tenants.stats(), 'notifications': notification_queue.stats(), 'schedules': scheduler.stats()}
+
+@app.get('/notifications')
+def get_notification_stats():
+    """Delivery queue depth, batching, retries, latency and throughput"""
+    return notification_queue.stats()
+
+@app.get('/notifications/dead-letters')
+def list_dead_letters():
+    return {'dead_letters': [notification.to_dict() for notification in notification_queue.dead_letters]}
+
+@app.post('/notifications/dead-letters/retry')
+async def retry_dead_letters():
+    """Queue every dead-lettered notification for delivery again"""
+    return {'retried': notification_queue.retry_dead_letters()}
+
+@app.get('/notifications/{notification_id}')
+def get_notification(notification_id: str):
+    notification = notification_queue.get(notification_id)
+    if notification is None:
+        raise HTTPException(status_code=404, detail=f'Unknown notification: {notification_id}')
+    return notification.to_dict()
+
+@app.get('/scheduler')
+def get_scheduler_stats():
+    """Default concurrency and the per-node-type cost estimates used for scheduling"""
+    return {'max_concurrency': PIPELINE_MAX_CONCURRENCY, 'costs': cost_model.stats()}
+
+@app.on_event('startup')
+async def seed_cost_model():
+    """Start the scheduler's cost estimates from the run history"""
+    if run_store.enabled:
+        stats = await asyncio.to_thread(run_store.node_latency_stats)
+        cost_model.seed((row['node_type'], row['avg_time'], row['count']) for row in stats if row['status'] == 'success')
+
+@app.on_event('startup')
+async def start_scheduler():
+    """Load stored schedules; ticks missed while the server was down fire under their policies"""
+    await scheduler.start()
+
+@app.on_event('shutdown')
+async def stop_scheduler():
+    await scheduler.stop()
+
+@app.on_event('startup')
+async def start_checkpoint_sweeper():
+    """Delete checkpoints of failed runs once they are older than CHECKPOINT_TTL"""
+    checkpoint_store.start_sweeper()
+
+@app.on_event('shutdown')
+async def stop_checkpoint_sweeper():
+    await checkpoint_store.stop_sweeper()
+
+@app.on_event('startup')
+async def start_upload_sweeper():
+    """Delete uploads left incomplete for UPLOAD_SESSION_TTL"""
+    upload_store.start_sweeper()
+
+@app.on_event('shutdown')
+async def stop_upload_sweeper():
+    await upload_store.stop_sweeper()
+
+@app.on_event('shutdown')
+async def flush_run_store():
+    await run_store.flush()
+
+@app.on_event('shutdown')
+async def drain_notifications():
+    """Give queued notifications a chance to go out before exiting"""
+    await notification_queue.drain(NOTIFICATION_DRAIN_TIMEOUT)
+
+@app.get('/runs')
+async def list_runs(pipeline_hash: Optional[str] = None, pipeline_id: Optional[str] = None, status: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0):
+    """Stored runs, newest first; `since`/`until` are Unix timestamps"""
+    runs = await asyncio.to_thread(run_store.query_runs, pipeline_hash, pipeline_id, status, since, until, limit, offset)
+    return {'runs': runs, 'store': run_store.stats()}
+
+@app.get('/runs/nodes')
+async def list_node_results(node_type: Optional[str] = None, status: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0):
+    """Stored node results across runs, newest first"""
+    return {'node_results': await asyncio.to_thread(run_store.query_node_results, node_type, status, since, until, limit, offset)}
+
+@app.get('/runs/nodes/stats')
+async def get_node_latency_stats(node_type: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None):
+    """Execution time aggregates per node type and status"""
+    return {'stats': await asyncio.to_thread(run_store.node_latency_stats, node_type, since, until)}
+
+@app.get('/runs/{run_id}')
+async def get_run(run_id: str):
+    await run_store.wait_written(run_id)
+    try:
+        return await asyncio.to_thread(run_store.get_run, run_id)
+    except RunStoreError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+@app.get('/runs/{run_id}/nodes/{node_id}/output')
+async def get_run_output(run_id: str, node_id: str, path: Optional[str] = None, offset: int = 0, limit: int = DEFAULT_PAGE_SIZE):
+    """
+    A stored node output. Large lists come back as `{"$items": <path>, "length": n}`;
+    pass that `path` (empty for a list output itself) to page through the items.
+    """
+    await run_store.wait_written(run_id)
+    try:
+        if path is None:
+            return {'output': await asyncio.to_thread(run_store.get_output, run_id, node_id)}
+        return await asyncio.to_thread(run_store.get_output_items, run_id, node_id, path, offset, limit)
+    except RunStoreError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+def descendants(node_ids: Iterable[str], edges: List[Dict[str, Any]]) -> set:
+    """The given nodes and every node reachable from them"""
+    successors = defaultdict(list)
+    for edge in edges:
+        successors[edge['source']].append(edge['target'])
+    reached = set(node_ids)
+    stack = list(reached)
+    while stack:
+        for target in successors[stack.pop()]:
+            if target not in reached:
+                reached.add(target)
+                stack.append(target)
+    return reached
+
+@app.post('/runs/{run_id}/resume')
+async def resume_run(run_id: str, request: Request):
+    """
+    Resume a checkpointed run: nodes without a checkpoint (failed or never
+    reached) and their descendants are executed again; everything upstream is
+    loaded from the run's checkpoints. The new run is checkpointed as well.
+    """
+    try:
+        previous = await asyncio.to_thread(checkpoint_store.open, run_id)
+    except CheckpointError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+    definition = previous.pipeline
+    pipeline_data = PipelineData.model_validate({key: definition[key] for key in ('nodes', 'edges', 'options')})
+    nodes, edges, options = pipeline_data.nodes, pipeline_data.edges, pipeline_data.options
+    plan = plan_pipeline(nodes, edges, compile_graph(nodes, edges), options)
+
+    completed = previous.completed()
+    rerun = descendants([node['id'] for node in plan.nodes if node['id'] not in completed], plan.edges)
+    if not rerun:
+        raise HTTPException(status_code=409, detail=f'Run {run_id} has no failed nodes to resume')
+
+    # Only outputs read by re-executed nodes, and the ones returned to the client, are loaded
+    reused = [node['id'] for node in plan.nodes if node['id'] not in rerun]
+    needed = {edge['source'] for edge in plan.edges if edge['target'] in rerun and edge['source'] not in rerun}
+    if options.include_intermediate:
+        needed.update(reused)
+    else:
+        needed.update(set(reused) & sink_node_ids(plan.nodes, plan.edges))
+    try:
+        loaded = await asyncio.to_thread(previous.load, needed)
+    except CheckpointError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    seed_outputs = {node_id: loaded.get(node_id) for node_id in reused}
+
+    cost = pipeline_cost(plan.kinds[node_id] for node_id in rerun if node_id in plan.kinds)
+
+    async def run() -> PipelineResult:
+        return await run_pipeline(pipeline_data, plan, definition.get('pipeline_hash'), definition.get('pipeline_id'), seed_outputs, previous)
+
+    result = await cancel_on_disconnect(request, run_admitted(cost, run, request_tenant(request)))
+    return encode_pipeline_result(result, request)
+
+@app.delete('/runs/{run_id}/checkpoints')
+def delete_run_checkpoints(run_id: str):
+    try:
+        checkpoint_store.delete(run_id)
+    except CheckpointError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    return {'message': 'Checkpoints deleted', 'status': 'success'}
+
+class PipelineRegistration(PipelineData):
+    name: Optional[str] = None
+
+class PipelineInvocation(BaseModel):
+    # Values keyed by input node id or inputName
+    inputs: Dict[str, Any] = Field(default_factory=dict)
+    # Response options for this invocation; planning options come from the registered pipeline
+    options: Optional[ExecutionOptions] = None
+
+def compile_registered_pipeline(record: RegisteredPipeline) -> CompiledPipeline:
+    """Validate a registered definition and prepare its plans and provider clients"""
+    pipeline_data = PipelineData.model_validate(record.definition)
+    nodes, edges, options = pipeline_data.nodes, pipeline_data.edges, pipeline_data.options
+    graph = compile_graph(nodes, edges)
+    if not graph.is_dag:
+        raise RegistryError(f'Pipeline contains cycles ({graph.describe_cycle()})')
+    if graph.dangling_edges:
+        raise RegistryError(f'Pipeline has edges to unknown nodes ({graph.describe_dangling_edges()})')
+
+    input_ids = {}
+    for node in nodes:
+        if resolve_node_kind(node) == 'input':
+            input_ids[node['id']] = node['id']
+            input_name = node.get('data', {}).get('inputName')
+            if input_name:
+                input_ids.setdefault(input_name, node['id'])
+
+    compiled = CompiledPipeline(record, nodes, edges, options, input_ids, lambda bound: plan_pipeline(nodes, edges, graph, options, bound))
+    # Warm the plans for "no inputs bound" and "all inputs bound"
+    compiled.plan_for(frozenset())
+    compiled.plan_for(frozenset(input_ids.values()))
+    if any(resolve_node_kind(node) == 'llm' for node in nodes):
+        warm_up_llm_clients()
+    return compiled
+
+async def load_compiled_pipeline(pipeline_id: str, version: Optional[int] = None) -> CompiledPipeline:
+    """A registered pipeline's compiled form; cold versions are loaded and compiled in a worker thread"""
+    compiled = pipeline_registry.warm(pipeline_id, version)
+    if compiled is None:
+        compiled = await asyncio.to_thread(pipeline_registry.compiled, pipeline_id, version, compile_registered_pipeline)
+    return compiled
+
+async def get_compiled_pipeline(pipeline_id: str, version: Optional[int] = None) -> CompiledPipeline:
+    try:
+        return await load_compiled_pipeline(pipeline_id, version)
+    except RegistryError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+def register_pipeline(registration: PipelineRegistration, pipeline_id: Optional[str] = None) -> Dict[str, Any]:
+    definition = registration.model_dump(mode='json', exclude={'name'})
+    graph = compile_graph(registration.nodes, registration.edges)
+    if not graph.is_dag:
+        raise HTTPException(status_code=422, detail={'message': 'Pipeline contains cycles', 'cycle': graph.cycle})
+    if graph.dangling_edges:
+        raise HTTPException(status_code=422, detail={'message': 'Pipeline has edges to unknown nodes', 'dangling_edges': graph.dangling_edges})
+    try:
+        record, created = pipeline_registry.register(definition, pipeline_id, registration.name)
+    except RegistryError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    try:
+        compiled = pipeline_registry.compiled(record.pipeline_id, record.version, compile_registered_pipeline)
+    except RegistryError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    return {**record.metadata(), 'new_version': created, 'inputs': sorted(compiled.input_ids)}
+
+def timer_schedules(nodes: List[Dict[str, Any]], tenant: str) -> List[Schedule]:
+    """Schedules declared by timer nodes in interval or cron mode; ids are set once the pipeline is registered"""
+    declared = []
+    for node in nodes:
+        data = node.get('data', {})
+        mode = data.get('mode')
+        if resolve_node_kind(node) != 'timer' or mode not in ('interval', 'cron'):
+            continue
+        try:
+            # Timer durations and jitter are in milliseconds
+            declared.append(Schedule(
+                '', interval=data.get('duration', 1000) / 1000.0 if mode == 'interval' else None, cron=data.get('cron') if mode == 'cron' else None,
+                timezone=data.get('timezone'), jitter=data.get('jitter', 0) / 1000.0, missed=data.get('missed', 'once'), tenant=tenant, node_id=node['id']
+            ))
+        except (ScheduleError, TypeError) as e:
+            raise HTTPException(status_code=422, detail=f"Timer node {node['id']}: {e}") from e
+    return declared
+
+async def register_with_schedules(registration: PipelineRegistration, request: Request, pipeline_id: Optional[str] = None) -> Dict[str, Any]:
+    """Register a pipeline and replace the schedules declared by its timer nodes"""
+    declared = timer_schedules(registration.nodes, request_tenant(request))
+    registered = await asyncio.to_thread(register_pipeline, registration, pipeline_id)
+    for schedule in declared:
+        schedule.pipeline_id = registered['pipeline_id']
+        schedule.schedule_id = f"{registered['pipeline_id']}:{schedule.node_id}"
+    schedules = await scheduler.sync_pipeline(registered['pipeline_id'], declared)
+    return {**registered, 'schedules': [schedule.schedule_id for schedule in schedules]}
+
+@app.post('/pipelines/registry')
+async def create_registered_pipeline(registration: PipelineRegistration, request: Request):
+    """Register a pipeline under a new id; it can then be invoked by id"""
+    return await register_with_schedules(registration, request)
+
+@app.put('/pipelines/registry/{pipeline_id}')
+async def update_registered_pipeline(pipeline_id: str, registration: PipelineRegistration, request: Request):
+    """Register a new version of a pipeline (a no-op if the definition is unchanged)"""
+    return await register_with_schedules(registration, request, pipeline_id)
+
+@app.get('/pipelines/registry')
+def list_registered_pipelines():
+    return {'pipelines': pipeline_registry.list(), **pipeline_registry.stats()}
+
+@app.get('/pipelines/registry/{pipeline_id}')
+def get_registered_pipeline(pipeline_id: str, version: Optional[int] = None):
+    try:
+        record = pipeline_registry.get(pipeline_id, version)
+    except RegistryError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    return {**record.metadata(), 'definition': record.definition}
+
+@app.get('/pipelines/registry/{pipeline_id}/versions')
+def list_registered_pipeline_versions(pipeline_id: str):
+    try:
+        return {'versions': pipeline_registry.versions(pipeline_id)}
+    except RegistryError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+@app.delete('/pipelines/registry/{pipeline_id}')
+async def delete_registered_pipeline(pipeline_id: str):
+    """Delete every version of a pipeline, and its schedules"""
+    try:
+        await asyncio.to_thread(pipeline_registry.delete, pipeline_id)
+    except RegistryError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    await scheduler.remove_pipeline(pipeline_id)
+    return {'message': 'Pipeline deleted', 'status': 'success'}
+
+@app.post('/pipelines/registry/{pipeline_id}/invoke', openapi_extra=request_body_openapi(PipelineInvocation, required=False))
+async def invoke_registered_pipeline(pipeline_id: str, request: Request, version: Optional[int] = None):
+    """
+    Run a registered pipeline (latest version by default) with the given inputs.
+
+    The body is `{"inputs": {...}, "options": {...}}` as JSON or MessagePack;
+    the response is encoded like /pipelines/parse.
+    """
+    body = await read_request_body(request)
+    invocation = parse_pipeline_body(body, wire.media_type(request.headers.get('content-type')), PipelineInvocation) if body else PipelineInvocation()
+    compiled = await get_compiled_pipeline(pipeline_id, version)
+    try:
+        nodes, plan = compiled.bind(invocation.inputs)
+    except RegistryError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+
+    # Already validated when the pipeline was registered; options given with the
+    # invocation override the registered ones
+    options = compiled.options
+    if invocation.options is not None:
+        options = options.model_copy(update=invocation.options.model_dump(exclude_unset=True))
+    pipeline_data = PipelineData.model_construct(nodes=nodes, edges=compiled.edges, options=options)
+
+    async def run() -> PipelineResult:
+        return await run_pipeline(pipeline_data, plan, compiled.record.definition_hash, pipeline_id)
+
+    result = await cancel_on_disconnect(request, run_admitted(pipeline_cost(plan.kinds.values()), run, request_tenant(request)))
+    response = encode_pipeline_result(result, request)
+    response.headers['X-Pipeline-Version'] = str(compiled.record.version)
+    return response
+
+class ScheduleSpec(BaseModel):
+    pipeline_id: str
+    # Latest version by default
+    version: Optional[int] = None
+    # Values keyed by input node id or inputName, as for /invoke
+    inputs: Dict[str, Any] = Field(default_factory=dict)
+    # Seconds between runs, or a cron rule such as "*/15 * * * *" in `timezone` (UTC by default)
+    interval: Optional[float] = None
+    cron: Optional[str] = None
+    timezone: Optional[str] = None
+    # Runs start up to this many seconds after their tick
+    jitter: float = 0.0
+    missed: Literal['skip', 'once', 'all'] = 'once'
+    enabled: bool = True
+    # Unix timestamp of the first tick; by default one interval from now, or the cron rule's next time
+    start_at: Optional[float] = None
+
+async def schedule_from_spec(spec: ScheduleSpec, tenant: str, schedule_id: Optional[str] = None) -> Schedule:
+    compiled = await get_compiled_pipeline(spec.pipeline_id, spec.version)
+    try:
+        compiled.bind(spec.inputs)
+        return Schedule(
+            spec.pipeline_id, spec.interval, spec.cron, spec.timezone, spec.jitter, spec.missed, spec.inputs, spec.version,
+            spec.enabled, tenant, schedule_id, start_at=spec.start_at
+        )
+    except (ScheduleError, RegistryError) as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+
+async def get_schedule(schedule_id: str) -> Schedule:
+    try:
+        return await scheduler.get(schedule_id)
+    except ScheduleError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+async def run_scheduled_pipeline(schedule: Schedule) -> Tuple[str, Optional[str]]:
+    """Run a schedule's registered pipeline as an invocation by the schedule's tenant"""
+    try:
+        compiled = await load_compiled_pipeline(schedule.pipeline_id, schedule.version)
+        nodes, plan = compiled.bind(schedule.inputs)
+    except RegistryError as e:
+        raise ScheduleError(str(e)) from e
+    pipeline_data = PipelineData.model_construct(nodes=nodes, edges=compiled.edges, options=compiled.options)
+
+    async def run() -> PipelineResult:
+        return await run_pipeline(pipeline_data, plan, compiled.record.definition_hash, schedule.pipeline_id)
+
+    try:
+        result = await run_admitted(pipeline_cost(plan.kinds.values()), run, schedule.tenant)
+    except HTTPException as e:
+        raise ScheduleError(f'Not admitted: {e.detail}') from e
+    return result.status, result.run_id
+
+scheduler.runner = run_scheduled_pipeline
+
+@app.post('/schedules')
+async def create_schedule(spec: ScheduleSpec, request: Request):
+    """Run a registered pipeline on an interval or cron rule"""
+    return (await scheduler.add(await schedule_from_spec(spec, request_tenant(request)))).to_dict()
+
+@app.get('/schedules')
+async def list_schedules(pipeline_id: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0):
+    """Schedules by next run time, and scheduler statistics"""
+    schedules = await scheduler.list(pipeline_id, limit, offset)
+    return {'schedules': [schedule.to_dict() for schedule in schedules], **scheduler.stats()}
+
+@app.get('/schedules/{schedule_id}')
+async def get_schedule_state(schedule_id: str):
+    return (await get_schedule(schedule_id)).to_dict()
+
+@app.put('/schedules/{schedule_id}')
+async def update_schedule(schedule_id: str, spec: ScheduleSpec, request: Request):
+    """Replace a schedule's rule; its run history is kept"""
+    await get_schedule(schedule_id)
+    return (await scheduler.add(await schedule_from_spec(spec, request_tenant(request), schedule_id))).to_dict()
+
+@app.delete('/schedules/{schedule_id}')
+async def delete_schedule(schedule_id: str):
+    try:
+        await scheduler.remove([schedule_id])
+    except ScheduleError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    return {'message': 'Schedule deleted', 'status': 'success'}
+
+@app.post('/schedules/{schedule_id}/run')
+async def run_schedule_now(schedule_id: str):
+    """Run a schedule's pipeline now (after a run in progress), without moving its next tick"""
+    await get_schedule(schedule_id)
+    return (await scheduler.trigger(schedule_id)).to_dict()
+
+async def run_pipeline(pipeline_data: PipelineData, plan: Optional[ExecutionPlan] = None, pipeline_hash: Optional[str] = None, pipeline_id: Optional[str] = None, seed_outputs: Optional[Dict[str, Any]] = None, resumed: Optional[RunCheckpoint] = None) -> PipelineResult:
+    """
+    Validate and execute a pipeline and build its (projected) result.
+
+    A precompiled `plan` (from the registry) skips validation and planning.
+    Executed runs are recorded in the run store under `pipeline_hash` (and the
+    registry's `pipeline_id`). When resuming, `seed_outputs` are the outputs
+    reused from the `resumed` run's checkpoints.
     """
     start_time = time.time()
+    run_id = new_run_id()
 
     try:
         nodes = pipeline_data.nodes
@@ -1221,25 +2711,82 @@ async def parse_pipeline(pipeline_data: PipelineData):
 
         num_nodes = len(nodes)
         num_edges = len(edges)
-        dag_check = is_dag(nodes, edges)
-
-        if not dag_check:
-            return PipelineResult(
-                num_nodes=num_nodes,
-                num_edges=num_edges,
-                is_dag=False,
-                execution_results=[],
-                total_execution_time=0,
-                status="error: Pipeline contains cycles"
-            )
+        dag_check = True
+        dangling_edges = None
+        options = pipeline_data.options
+
+        if plan is None:
+            graph = compile_graph(nodes, edges)
+            dag_check = graph.is_dag
+
+            if not dag_check:
+                return PipelineResult(
+                    num_nodes=num_nodes,
+                    num_edges=num_edges,
+                    is_dag=False,
+                    execution_results=[],
+                    total_execution_time=0,
+                    status=f"error: Pipeline contains cycles ({graph.describe_cycle()})",
+                    cycle=graph.cycle
+                )
+
+            dangling_edges = graph.dangling_edges or None
+
+            # Optimize the pipeline
+            plan = plan_pipeline(nodes, edges, graph, options)
+
+        checkpoint = None
+        if options.checkpoint:
+            definition = {
+                'nodes': nodes,
+                'edges': edges,
+                'options': options.model_dump(mode='json'),
+                'pipeline_hash': pipeline_hash,
+                'pipeline_id': pipeline_id
+            }
+            inherited = {node_id: resumed.paths[node_id] for node_id in seed_outputs} if resumed is not None else None
+            try:
+                checkpoint = await asyncio.to_thread(checkpoint_store.create, run_id, definition, inherited)
+            except OSError as e:
+                print(f"Checkpointing of run {run_id} skipped: {e}")
+
+        if run_store.enabled and pipeline_hash is None:
+            pipeline_hash = canonical_hash({'nodes': nodes, 'edges': edges})
+
+        def record_cancelled(results: List[NodeResult]) -> None:
+            if run_store.enabled:
+                failed = sum(result.status != 'success' for result in results)
+                run_store.record(RunRecord(run_id, pipeline_hash, pipeline_id, 'cancelled', start_time, time.time() - start_time, num_nodes, num_edges, results, failed))
 
         # Execute the pipeline
-        execution_results = await execute_pipeline(nodes, edges)
+        execution_results = await execute_pipeline(nodes, edges, options, plan, seed_outputs, checkpoint, on_cancel=record_cancelled)
         total_time = time.time() - start_time
 
         # Determine overall status
-        failed_nodes = [r for r in execution_results if r.status == 'error']
-        overall_status = 'success' if not failed_nodes else f'partial_success ({len(failed_nodes)} nodes failed)'
+        failed_nodes = [r for r in execution_results if r.status in ('error', 'timeout', 'skipped')]
+        if any(r.error == PIPELINE_TIMEOUT_ERROR for r in failed_nodes):
+            overall_status = stored_status = 'timeout'
+        elif failed_nodes:
+            overall_status = f'partial_success ({len(failed_nodes)} nodes failed)'
+            stored_status = 'partial_success'
+        else:
+            overall_status = stored_status = 'success'
+
+        if checkpoint is not None and all(result.node_id in checkpoint.paths for result in execution_results):
+            # Every node succeeded with a usable output, so there's nothing to resume
+            await asyncio.to_thread(checkpoint_store.discard, run_id)
+
+        if run_store.enabled:
+            # Stored runs keep the plain status (so they can be filtered by it) and the count apart
+            run_store.record(RunRecord(run_id, pipeline_hash, pipeline_id, stored_status, start_time, total_time, num_nodes, num_edges, execution_results, len(failed_nodes)))
+
+        execution_results, shared_objects = project_results(
+            execution_results,
+            sink_node_ids(nodes, edges),
+            response_mode=options.response_mode,
+            fields=options.fields,
+            share=options.share_objects
+        )
 
         return PipelineResult(
             num_nodes=num_nodes,
@@ -1247,7 +2794,12 @@ async def parse_pipeline(pipeline_data: PipelineData):
             is_dag=dag_check,
             execution_results=execution_results,
             total_execution_time=total_time,
-            status=overall_status
+            status=overall_status,
+            shared_objects=shared_objects,
+            optimization=plan.explain() if options.explain else None,
+            run_id=run_id if run_store.enabled or checkpoint is not None else None,
+            resumed_from=resumed.run_id if resumed is not None else None,
+            dangling_edges=dangling_edges
         )
 
     except Exception as e:
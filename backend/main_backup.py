@@ -20,232 +20,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-async def execute_filter_node(node: Dict[str, Any], input_data: Any) -> Any:
-    """Execute a Filter node - real data filtering"""
-    import pandas as pd
-    
-    node_data = node.get('data', {})
-    filter_type = node_data.get('filterType', 'contains')
-    filter_value = node_data.get('filterValue', '')
-    filter_field = node_data.get('filterField', 'text')
-    
-    await asyncio.sleep(0.1)
-    
-    try:
-        if isinstance(input_data, dict):
-            # Filter dictionary data
-            if filter_type == 'contains':
-                filtered_data = {k: v for k, v in input_data.items() 
-                               if filter_value.lower() in str(v).lower()}
-            elif filter_type == 'equals':
-                filtered_data = {k: v for k, v in input_data.items() 
-                               if str(v).lower() == filter_value.lower()}
-            elif filter_type == 'greater_than':
-                try:
-                    filter_num = float(filter_value)
-                    filtered_data = {k: v for k, v in input_data.items() 
-                                   if isinstance(v, (int, float)) and v > filter_num}
-                except ValueError:
-                    filtered_data = input_data
-            elif filter_type == 'less_than':
-                try:
-                    filter_num = float(filter_value)
-                    filtered_data = {k: v for k, v in input_data.items() 
-                                   if isinstance(v, (int, float)) and v < filter_num}
-                except ValueError:
-                    filtered_data = input_data
-            else:
-                filtered_data = input_data
-                
-        elif isinstance(input_data, list):
-            # Filter list data
-            if filter_type == 'contains':
-                filtered_data = [item for item in input_data 
-                               if filter_value.lower() in str(item).lower()]
-            elif filter_type == 'equals':
-                filtered_data = [item for item in input_data 
-                               if str(item).lower() == filter_value.lower()]
-            elif filter_type == 'greater_than':
-                try:
-                    filter_num = float(filter_value)
-                    filtered_data = [item for item in input_data 
-                                   if isinstance(item, (int, float)) and item > filter_num]
-                except ValueError:
-                    filtered_data = input_data
-            else:
-                filtered_data = input_data
-                
-        elif isinstance(input_data, str):
-            # Filter text data
-            if filter_type == 'contains':
-                filtered_data = input_data if filter_value.lower() in input_data.lower() else ""
-            elif filter_type == 'equals':
-                filtered_data = input_data if input_data.lower() == filter_value.lower() else ""
-            elif filter_type == 'remove_words':
-                words_to_remove = filter_value.split(',')
-                filtered_text = input_data
-                for word in words_to_remove:
-                    filtered_text = filtered_text.replace(word.strip(), '')
-                filtered_data = filtered_text.strip()
-            elif filter_type == 'extract_numbers':
-                import re
-                numbers = re.findall(r'-?\d+\.?\d*', input_data)
-                filtered_data = [float(n) for n in numbers if n]
-            else:
-                filtered_data = input_data
-        else:
-            filtered_data = input_data
-            
-        return {
-            'type': 'filter',
-            'filter_type': filter_type,
-            'filter_value': filter_value,
-            'original_data': input_data,
-            'filtered_data': filtered_data,
-            'items_before': len(input_data) if isinstance(input_data, (list, dict)) else 1,
-            'items_after': len(filtered_data) if isinstance(filtered_data, (list, dict)) else 1 if filtered_data else 0,
-            'filter_efficiency': f"{((len(filtered_data) if isinstance(filtered_data, (list, dict)) else 1 if filtered_data else 0) / (len(input_data) if isinstance(input_data, (list, dict)) else 1)) * 100:.1f}%" if input_data else "0%"
-        }
-        
-    except Exception as e:
-        return {
-            'type': 'filter',
-            'error': f'Filter error: {str(e)}',
-            'original_data': input_data,
-            'filtered_data': input_data
-        }
-
-async def execute_timer_node(node: Dict[str, Any], input_data: Any) -> Any:
-    """Execute a Timer node - add delays and timing"""
-    node_data = node.get('data', {})
-    delay_seconds = float(node_data.get('delay', 1.0))
-    
-    start_time = time.time()
-    await asyncio.sleep(delay_seconds)
-    end_time = time.time()
-    
-    return {
-        'type': 'timer',
-        'delay_requested': delay_seconds,
-        'actual_delay': round(end_time - start_time, 3),
-        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end_time)),
-        'input_data': input_data,
-        'message': f'Delayed execution by {delay_seconds} seconds'
-    }
-
-async def execute_calculator_node(node: Dict[str, Any], input_data: Any) -> Any:
-    """Execute a Calculator node - perform real mathematical operations"""
-    await asyncio.sleep(0.1)
-    
-    # Get calculation settings from node configuration
-    node_data = node.get('data', {})
-    operation = node_data.get('operation', 'sum')  # sum, average, multiply, etc.
-    
-    numbers = []
-    
-    # Extract numbers from various input formats
-    if isinstance(input_data, dict):
-        # Look for numeric values in dictionary
-        for value in input_data.values():
-            if isinstance(value, (int, float)):
-                numbers.append(value)
-            elif isinstance(value, str):
-                try:
-                    # Try to parse string as number
-                    num = float(value)
-                    numbers.append(num)
-                except ValueError:
-                    # Extract numbers from text using regex
-                    found_numbers = re.findall(r'-?\d+\.?\d*', value)
-                    numbers.extend([float(n) for n in found_numbers if n])
-    elif isinstance(input_data, (int, float)):
-        numbers.append(input_data)
-    elif isinstance(input_data, str):
-        # Extract all numbers from text
-        found_numbers = re.findall(r'-?\d+\.?\d*', input_data)
-        numbers = [float(n) for n in found_numbers if n]
-    elif isinstance(input_data, list):
-        # Handle list of numbers
-        for item in input_data:
-            if isinstance(item, (int, float)):
-                numbers.append(item)
-    
-    if not numbers:
-        return {
-            'error': 'No numeric values found in input',
-            'input_received': input_data,
-            'operation': operation
-        }
-    
-    # Perform the requested operation
-    try:
-        if operation == 'sum':
-            result_value = sum(numbers)
-        elif operation == 'add':  # Support both 'add' and 'sum'
-            result_value = sum(numbers)
-        elif operation == 'average' or operation == 'mean':
-            result_value = sum(numbers) / len(numbers)
-        elif operation == 'multiply' or operation == 'product':
-            result_value = 1
-            for num in numbers:
-                result_value *= num
-        elif operation == 'subtract':
-            # For subtract, take first number and subtract all others
-            result_value = numbers[0]
-            for num in numbers[1:]:
-                result_value -= num
-        elif operation == 'divide':
-            # For divide, take first number and divide by all others
-            result_value = numbers[0]
-            for num in numbers[1:]:
-                if num == 0:
-                    return {
-                        'error': 'Division by zero',
-                        'operation': operation,
-                        'input_numbers': numbers
-                    }
-                result_value /= num
-        elif operation == 'max':
-            result_value = max(numbers)
-        elif operation == 'min':
-            result_value = min(numbers)
-        elif operation == 'count':
-            result_value = len(numbers)
-        elif operation == 'median':
-            sorted_numbers = sorted(numbers)
-            n = len(sorted_numbers)
-            if n % 2 == 0:
-                result_value = (sorted_numbers[n//2 - 1] + sorted_numbers[n//2]) / 2
-            else:
-                result_value = sorted_numbers[n//2]
-        elif operation == 'range':
-            result_value = max(numbers) - min(numbers)
-        else:
-            # Default to sum if operation not recognized
-            result_value = sum(numbers)
-            operation = 'sum (default)'
-        
-        return {
-            'operation': operation,
-            'result': result_value,
-            'input_numbers': numbers,
-            'count': len(numbers),
-            'statistics': {
-                'sum': sum(numbers),
-                'average': sum(numbers) / len(numbers),
-                'max': max(numbers),
-                'min': min(numbers),
-                'count': len(numbers)
-            }
-        }
-        
-    except Exception as e:
-        return {
-            'error': f'Calculation error: {str(e)}',
-            'operation': operation,
-            'input_numbers': numbers
-        }
-
 class PipelineData(BaseModel):
     nodes: List[Dict[str, Any]]
     edges: List[Dict[str, Any]]
@@ -282,7 +56,7 @@ def get_setup_info():
         import requests
         response = requests.get('http://localhost:11434/api/tags', timeout=2)
         ollama_available = response.status_code == 200
-    except:
+    except Exception:
         pass
     
     return {
@@ -826,12 +600,9 @@ async def execute_calculator_node(node: Dict[str, Any], input_data: Any) -> Any:
 
 async def execute_filter_node(node: Dict[str, Any], input_data: Any) -> Any:
     """Execute a Filter node - real data filtering"""
-    import pandas as pd
-    
     node_data = node.get('data', {})
     filter_type = node_data.get('filterType', 'contains')
     filter_value = node_data.get('filterValue', '')
-    filter_field = node_data.get('filterField', 'text')
     
     await asyncio.sleep(0.1)
     
@@ -0,0 +1,197 @@
+# trunk-ignore-all(black)
+"""
+Local stand-in for an SMTP server and notification webhooks.
+
+Accepts email over SMTP and JSON posted to any path over HTTP, and keeps what
+it receives in memory; GET /messages on the HTTP port lists it. With
+`--fail-rate` a share of deliveries is answered with a temporary failure, to
+exercise retries. Point the backend at it with
+
+    python notification_sink.py --smtp-port 8025 --http-port 8026
+    SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SLACK_WEBHOOK_URL=http://127.0.0.1:8026/slack \
+        SMS_GATEWAY_URL=http://127.0.0.1:8026/sms uvicorn main:app
+
+or start a `NotificationSink` in-process from a test.
+"""
+from email import message_from_bytes
+from email.policy import default as default_policy
+from typing import Any, Dict, List, Optional, Set
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+class NotificationSink:
+    """SMTP and HTTP servers that record the notifications delivered to them"""
+
+    def __init__(self, host: str = '127.0.0.1', smtp_port: int = 0, http_port: int = 0, fail_rate: float = 0.0):
+        self.host = host
+        self.smtp_port = smtp_port
+        self.http_port = http_port
+        self.fail_rate = fail_rate
+        self.messages: List[Dict[str, Any]] = []
+        self.connections = {'smtp': 0, 'http': 0}
+        self.failures = 0
+        self._servers: List[asyncio.AbstractServer] = []
+        self._sessions: Set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> 'NotificationSink':
+        smtp = await asyncio.start_server(self._smtp_session, self.host, self.smtp_port)
+        http = await asyncio.start_server(self._http_session, self.host, self.http_port)
+        self._servers = [smtp, http]
+        # Port 0 picks free ports
+        self.smtp_port = smtp.sockets[0].getsockname()[1]
+        self.http_port = http.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        for server in self._servers:
+            server.close()
+        # Clients keep connections open between deliveries
+        for writer in list(self._sessions):
+            writer.close()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+
+    def _fail(self) -> bool:
+        if self.fail_rate and random.random() < self.fail_rate:
+            self.failures += 1
+            return True
+        return False
+
+    async def _smtp_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections['smtp'] += 1
+        self._sessions.add(writer)
+        sender: Optional[str] = None
+        recipients: List[str] = []
+
+        def reply(line: str) -> None:
+            writer.write(f'{line}\r\n'.encode('ascii'))
+
+        reply('220 notification-sink ESMTP')
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode('utf-8', 'replace').strip()
+                verb = command[:4].upper()
+                if verb in ('HELO', 'EHLO'):
+                    reply('250 notification-sink')
+                elif verb == 'MAIL':
+                    sender = command.split(':', 1)[-1].strip().strip('<>')
+                    recipients = []
+                    reply('250 OK')
+                elif verb == 'RCPT':
+                    recipients.append(command.split(':', 1)[-1].strip().strip('<>'))
+                    reply('250 OK')
+                elif verb == 'DATA':
+                    reply('354 End data with <CR><LF>.<CR><LF>')
+                    await writer.drain()
+                    lines = []
+                    while True:
+                        data = await reader.readline()
+                        if not data or data == b'.\r\n':
+                            break
+                        # Undo dot-stuffing
+                        lines.append(data[1:] if data.startswith(b'..') else data)
+                    if self._fail():
+                        reply('451 Temporary failure, try again later')
+                    else:
+                        message = message_from_bytes(b''.join(lines), policy=default_policy)
+                        self.messages.append({
+                            'transport': 'smtp',
+                            'from': sender,
+                            'to': recipients,
+                            'subject': message['Subject'],
+                            'body': message.get_content(),
+                            'received': time.time()
+                        })
+                        reply('250 OK')
+                elif verb in ('RSET', 'NOOP'):
+                    sender, recipients = (None, []) if verb == 'RSET' else (sender, recipients)
+                    reply('250 OK')
+                elif verb == 'QUIT':
+                    reply('221 Bye')
+                    break
+                else:
+                    reply('502 Command not implemented')
+                await writer.drain()
+        except ConnectionResetError:
+            pass
+        finally:
+            self._sessions.discard(writer)
+            writer.close()
+
+    async def _http_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections['http'] += 1
+        self._sessions.add(writer)
+        try:
+            # Keep-alive: serve requests until the client closes the connection
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path = request_line.decode('latin-1').split()[:2]
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', '0')))
+
+                if method == 'GET' and path == '/messages':
+                    status, response = 200, {'messages': self.messages, 'connections': self.connections, 'failures': self.failures}
+                elif method != 'POST':
+                    status, response = 405, {'detail': 'Method not allowed'}
+                elif self._fail():
+                    status, response = 503, {'detail': 'Temporary failure, try again later'}
+                else:
+                    try:
+                        payload = json.loads(body or b'null')
+                    except ValueError:
+                        status, response = 400, {'detail': 'Invalid JSON'}
+                    else:
+                        self.messages.append({'transport': 'http', 'path': path, 'payload': payload, 'received': time.time()})
+                        status, response = 200, {'ok': True}
+
+                content = json.dumps(response, default=str).encode('utf-8')
+                writer.write(f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\nContent-Type: application/json\r\nContent-Length: {len(content)}\r\n\r\n'.encode('latin-1') + content)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            self._sessions.discard(writer)
+            writer.close()
+
+
+async def serve(arguments: argparse.Namespace) -> None:
+    sink = await NotificationSink(arguments.host, arguments.smtp_port, arguments.http_port, arguments.fail_rate).start()
+    print(f'SMTP on {sink.host}:{sink.smtp_port}, webhooks on http://{sink.host}:{sink.http_port}/ (GET /messages to list)')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await sink.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--smtp-port', type=int, default=8025)
+    parser.add_argument('--http-port', type=int, default=8026)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of deliveries answered with a temporary failure')
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
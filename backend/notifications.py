@@ -0,0 +1,508 @@
+# trunk-ignore-all(black)
+"""
+Outbound notification delivery.
+
+Notification nodes enqueue their message and return; delivery happens in the
+background. Messages to the same channel and recipient are batched for up to
+NOTIFICATION_BATCH_WINDOW seconds (or NOTIFICATION_BATCH_SIZE messages) and
+sent as one email or webhook request, over connections kept open between
+batches. Failed batches are retried with exponential backoff and jitter.
+Messages that still fail after NOTIFICATION_MAX_ATTEMPTS, or are rejected
+outright (e.g. an unknown recipient), go to a dead-letter list from which they
+can be retried.
+
+Email is sent through SMTP_HOST. Slack goes to SLACK_WEBHOOK_URL, or to the
+node's webhook URL if its host is listed in NOTIFICATION_WEBHOOK_HOSTS, and SMS
+to SMS_GATEWAY_URL. Channels without a destination
+are delivered to a simulated transport. `notification_sink.py` runs a local
+SMTP server and webhook receiver to deliver to in development and tests.
+Queued messages are kept in memory only.
+"""
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from email.message import EmailMessage
+from typing import Any, Callable, Deque, Dict, FrozenSet, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+import asyncio
+import contextvars
+import http.client
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+
+from tenants import percentile
+
+# Notifications waiting for delivery (including retries) before nodes are refused
+NOTIFICATION_QUEUE_SIZE = int(os.getenv('NOTIFICATION_QUEUE_SIZE', '10000'))
+NOTIFICATION_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', '4'))
+NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', '20'))
+NOTIFICATION_BATCH_WINDOW = float(os.getenv('NOTIFICATION_BATCH_WINDOW', '0.5'))
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', '5'))
+# Seconds before the first retry; doubled per attempt up to NOTIFICATION_RETRY_MAX
+NOTIFICATION_RETRY_BASE = float(os.getenv('NOTIFICATION_RETRY_BASE', '1'))
+NOTIFICATION_RETRY_MAX = float(os.getenv('NOTIFICATION_RETRY_MAX', '60'))
+# Socket timeout of SMTP and webhook connections
+NOTIFICATION_TIMEOUT = float(os.getenv('NOTIFICATION_TIMEOUT', '10'))
+# Seconds to wait at shutdown for batched notifications to be sent
+NOTIFICATION_DRAIN_TIMEOUT = float(os.getenv('NOTIFICATION_DRAIN_TIMEOUT', '10'))
+NOTIFICATION_DEAD_LETTERS = int(os.getenv('NOTIFICATION_DEAD_LETTERS', '1000'))
+# Notifications whose status can be looked up
+NOTIFICATION_HISTORY = int(os.getenv('NOTIFICATION_HISTORY', '10000'))
+
+SMTP_HOST = os.getenv('SMTP_HOST')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '25'))
+SMTP_USER = os.getenv('SMTP_USER')
+SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
+SMTP_FROM = os.getenv('SMTP_FROM', 'pipelines@localhost')
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '0') == '1'
+SLACK_WEBHOOK_URL = os.getenv('SLACK_WEBHOOK_URL')
+SMS_GATEWAY_URL = os.getenv('SMS_GATEWAY_URL')
+# Hosts (`host` or `host:port`) that nodes may name in their own webhook URL;
+# nodes can't post anywhere else, so pipelines can't reach internal services
+NOTIFICATION_WEBHOOK_HOSTS = frozenset(filter(None, (host.strip().lower() for host in os.getenv('NOTIFICATION_WEBHOOK_HOSTS', '').split(','))))
+
+# Idle connections kept per destination
+MAX_IDLE_CONNECTIONS = 4
+
+# Recent latencies and delivery times kept for the metrics
+LATENCY_SAMPLES = 1024
+THROUGHPUT_WINDOW = 60.0
+
+
+class QueueFull(Exception):
+    """Raised when the delivery queue can't take another notification"""
+
+
+class DeliveryError(Exception):
+    """Raised by transports; permanent errors are not retried"""
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class DestinationError(Exception):
+    """Raised for webhook URLs a node isn't allowed to post to"""
+
+
+class Notification:
+    __slots__ = ('notification_id', 'channel', 'recipient', 'target', 'subject', 'body', 'created', 'attempts', 'status', 'error', 'delivered_at', 'transport')
+
+    def __init__(self, channel: str, recipient: str, subject: str, body: str, target: Optional[str] = None):
+        self.notification_id = uuid.uuid4().hex
+        self.channel = channel
+        self.recipient = recipient
+        # Webhook URL for webhook-based channels
+        self.target = target
+        self.subject = subject
+        self.body = body
+        self.created = time.time()
+        self.attempts = 0
+        self.status = 'queued'
+        self.error: Optional[str] = None
+        self.delivered_at: Optional[float] = None
+        self.transport: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple[str, str, Optional[str]]:
+        """Notifications with the same key are delivered together"""
+        return self.channel, self.recipient, self.target
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'notification_id': self.notification_id,
+            'channel': self.channel,
+            'recipient': self.recipient,
+            'subject': self.subject,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'transport': self.transport,
+            'created': self.created,
+            'delivered_at': self.delivered_at
+        }
+
+
+def allowed_webhook(url: str, hosts: FrozenSet[str] = NOTIFICATION_WEBHOOK_HOSTS) -> bool:
+    """Whether a node's webhook URL is a configured one or on an allowed host"""
+    if url in (SLACK_WEBHOOK_URL, SMS_GATEWAY_URL):
+        return True
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return False
+    if parts.scheme not in ('http', 'https') or not parts.hostname or parts.username is not None or parts.password is not None:
+        return False
+    host = parts.hostname.lower()
+    return host in hosts or (port is not None and f'{host}:{port}' in hosts)
+
+
+def destination(channel: str, webhook_url: Optional[str] = None) -> Optional[str]:
+    """
+    Webhook URL a notification is posted to, None for email or when not
+    configured. Raises DestinationError for a node URL that isn't allowed.
+    """
+    if channel == 'sms':
+        return SMS_GATEWAY_URL
+    if channel == 'email':
+        return None
+    if webhook_url:
+        if not allowed_webhook(webhook_url):
+            raise DestinationError(f'Webhook URL not allowed: {webhook_url!r}; its host must be listed in NOTIFICATION_WEBHOOK_HOSTS')
+        return webhook_url
+    return SLACK_WEBHOOK_URL if channel == 'slack' else None
+
+
+class ConnectionPool:
+    """Open connections per destination, reused by later batches"""
+
+    def __init__(self, connect: Callable[[Any], Any], close: Callable[[Any], None], max_idle: int = MAX_IDLE_CONNECTIONS):
+        self._connect = connect
+        self._close = close
+        self.max_idle = max_idle
+        self._idle: Dict[Any, List[Any]] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    @contextmanager
+    def connection(self, destination: Any, fresh: bool = False) -> Iterator[Any]:
+        """An idle connection to `destination` (unless `fresh`), or a new one; closed on error"""
+        connection = None
+        if not fresh:
+            with self._lock:
+                idle = self._idle.get(destination)
+                if idle:
+                    connection = idle.pop()
+                    self.reused += 1
+        if connection is None:
+            connection = self._connect(destination)
+            self.opened += 1
+        try:
+            yield connection
+        except BaseException:
+            self._discard(connection)
+            raise
+        with self._lock:
+            idle = self._idle.setdefault(destination, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        self._discard(connection)
+
+    def _discard(self, connection: Any) -> None:
+        try:
+            self._close(connection)
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {'opened': self.opened, 'reused': self.reused, 'idle': sum(len(idle) for idle in self._idle.values())}
+
+
+def digest(batch: List[Notification]) -> str:
+    return '\n\n---\n\n'.join(notification.body for notification in batch)
+
+
+class SimulatedTransport:
+    """Records deliveries instead of sending them, for channels without a destination"""
+    name = 'simulated'
+
+    def __init__(self, keep: int = 1000):
+        self.sent: Deque[Dict[str, Any]] = deque(maxlen=keep)
+
+    def deliver(self, batch: List[Notification]) -> None:
+        self.sent.append({'channel': batch[0].channel, 'recipient': batch[0].recipient, 'messages': len(batch)})
+
+    def stats(self) -> Dict[str, Any]:
+        return {'recent': len(self.sent)}
+
+
+class SmtpTransport:
+    """Sends a batch as one email, over pooled SMTP connections"""
+    name = 'smtp'
+
+    def __init__(self, host: str, port: int = SMTP_PORT, sender: str = SMTP_FROM, username: Optional[str] = SMTP_USER, password: Optional[str] = SMTP_PASSWORD, starttls: bool = SMTP_STARTTLS, timeout: float = NOTIFICATION_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._pool = ConnectionPool(self._connect, lambda smtp: smtp.quit())
+
+    def _connect(self, _: Any) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password or '')
+        return smtp
+
+    def deliver(self, batch: List[Notification]) -> None:
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = batch[0].recipient
+        message['Subject'] = batch[0].subject if len(batch) == 1 else f'{len(batch)} pipeline notifications'
+        message.set_content(digest(batch))
+        # A pooled connection may have been closed by the server since; retry once on a new one
+        for fresh in (False, True):
+            try:
+                with self._pool.connection((self.host, self.port), fresh) as smtp:
+                    smtp.send_message(message)
+                return
+            except smtplib.SMTPServerDisconnected as e:
+                if fresh:
+                    raise DeliveryError(f'SMTP server disconnected: {e}') from e
+            except smtplib.SMTPResponseException as e:
+                raise DeliveryError(f'SMTP error {e.smtp_code}: {e.smtp_error!r}', permanent=500 <= e.smtp_code < 600) from e
+            except smtplib.SMTPRecipientsRefused as e:
+                raise DeliveryError(f'Recipient refused: {batch[0].recipient}', permanent=True) from e
+            except (OSError, smtplib.SMTPException) as e:
+                raise DeliveryError(f'SMTP delivery failed: {e}') from e
+
+    def stats(self) -> Dict[str, Any]:
+        return self._pool.stats()
+
+
+class WebhookTransport:
+    """Posts a batch as one JSON request, over keep-alive HTTP connections"""
+    name = 'webhook'
+
+    def __init__(self, timeout: float = NOTIFICATION_TIMEOUT):
+        self.timeout = timeout
+        self._pool = ConnectionPool(self._connect, lambda connection: connection.close())
+
+    def _connect(self, destination: Tuple[str, str]) -> http.client.HTTPConnection:
+        scheme, netloc = destination
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(netloc, timeout=self.timeout)
+
+    def payload(self, batch: List[Notification]) -> Dict[str, Any]:
+        if batch[0].channel == 'sms':
+            return {'to': batch[0].recipient, 'messages': [notification.body for notification in batch]}
+        # Slack incoming webhooks take a `text`
+        return {'channel': batch[0].recipient, 'text': digest(batch)}
+
+    def deliver(self, batch: List[Notification]) -> None:
+        url = urlsplit(batch[0].target)
+        path = (url.path or '/') + (f'?{url.query}' if url.query else '')
+        body = json.dumps(self.payload(batch)).encode('utf-8')
+        for fresh in (False, True):
+            try:
+                with self._pool.connection((url.scheme, url.netloc), fresh) as connection:
+                    connection.request('POST', path, body, {'Content-Type': 'application/json'})
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status >= 300:
+                        # Throttling and server errors are worth retrying, other rejections aren't
+                        raise DeliveryError(f'Webhook answered {response.status} {response.reason}', permanent=response.status < 500 and response.status != 429)
+                return
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                if fresh:
+                    raise DeliveryError(f'Webhook connection failed: {e}') from e
+            except (OSError, http.client.HTTPException) as e:
+                raise DeliveryError(f'Webhook delivery failed: {e}') from e
+
+    def stats(self) -> Dict[str, Any]:
+        return self._pool.stats()
+
+
+class DeliveryQueue:
+    """Bounded in-memory queue of notifications, batched and delivered by background workers"""
+
+    def __init__(self, smtp: Optional[SmtpTransport] = None, workers: int = NOTIFICATION_WORKERS, max_queue: int = NOTIFICATION_QUEUE_SIZE, batch_size: int = NOTIFICATION_BATCH_SIZE, batch_window: float = NOTIFICATION_BATCH_WINDOW, max_attempts: int = NOTIFICATION_MAX_ATTEMPTS, retry_base: float = NOTIFICATION_RETRY_BASE):
+        self.smtp = smtp
+        self.webhook = WebhookTransport()
+        self.simulated = SimulatedTransport()
+        self.workers = workers
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        # Notifications not yet delivered or dead-lettered
+        self.size = 0
+        self._pending: Dict[Tuple[str, str, Optional[str]], List[Notification]] = {}
+        self._timers: Dict[Tuple[str, str, Optional[str]], asyncio.TimerHandle] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._history: 'OrderedDict[str, Notification]' = OrderedDict()
+        self.dead_letters: Deque[Notification] = deque(maxlen=NOTIFICATION_DEAD_LETTERS)
+        self.enqueued = 0
+        self.delivered = 0
+        self.batches = 0
+        self.failed_attempts = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._delivery_times: Deque[Tuple[float, int]] = deque()
+
+    def transport_for(self, notification: Notification) -> Any:
+        if notification.channel == 'email' and self.smtp is not None:
+            return self.smtp
+        if notification.target:
+            return self.webhook
+        return self.simulated
+
+    def _start(self) -> None:
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._ready = asyncio.Queue()
+        # Workers outlive the request that started them, so they don't inherit
+        # its tenant, time budget or event listener
+        self._tasks = [loop.create_task(self._work(), context=contextvars.Context()) for _ in range(self.workers)]
+
+    def enqueue(self, channel: str, recipient: str, subject: str, body: str, target: Optional[str] = None) -> Notification:
+        """Queue a notification for delivery and return it right away"""
+        if self.size >= self.max_queue:
+            raise QueueFull(f'Notification queue is full ({self.size} waiting)')
+        self._start()
+        notification = Notification(channel, recipient, subject, body, target)
+        notification.transport = self.transport_for(notification).name
+        self.size += 1
+        self.enqueued += 1
+        self._history[notification.notification_id] = notification
+        while len(self._history) > NOTIFICATION_HISTORY:
+            self._history.popitem(last=False)
+        self._add(notification)
+        return notification
+
+    def _add(self, notification: Notification) -> None:
+        key = notification.key
+        batch = self._pending.setdefault(key, [])
+        batch.append(notification)
+        if len(batch) >= self.batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.batch_window, self._flush, key)
+
+    def _flush(self, key: Tuple[str, str, Optional[str]]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            self._ready.put_nowait(batch)
+
+    async def _work(self) -> None:
+        while True:
+            batch = await self._ready.get()
+            try:
+                await self._deliver(batch)
+            finally:
+                self._ready.task_done()
+
+    async def _deliver(self, batch: List[Notification]) -> None:
+        transport = self.transport_for(batch[0])
+        for notification in batch:
+            notification.attempts += 1
+            notification.transport = transport.name
+        self.batches += 1
+        try:
+            await asyncio.to_thread(transport.deliver, batch)
+        except DeliveryError as e:
+            self._failed(batch, str(e), e.permanent)
+            return
+        except Exception as e:
+            self._failed(batch, f'Delivery failed: {e}', False)
+            return
+
+        now = time.time()
+        for notification in batch:
+            notification.status = 'delivered'
+            notification.error = None
+            notification.delivered_at = now
+            self._latencies.append(now - notification.created)
+        self.size -= len(batch)
+        self.delivered += len(batch)
+        self._delivery_times.append((time.monotonic(), len(batch)))
+
+    def _failed(self, batch: List[Notification], error: str, permanent: bool) -> None:
+        self.failed_attempts += 1
+        for notification in batch:
+            notification.error = error
+        if permanent or batch[0].attempts >= self.max_attempts:
+            for notification in batch:
+                notification.status = 'dead'
+                self.dead_letters.append(notification)
+            self.size -= len(batch)
+            self.dead_lettered += len(batch)
+            return
+        # Exponential backoff with jitter, so failed batches don't retry in lockstep
+        delay = min(self.retry_base * 2 ** (batch[0].attempts - 1), NOTIFICATION_RETRY_MAX) * random.uniform(0.5, 1.0)
+        for notification in batch:
+            notification.status = 'retrying'
+        self.retried += len(batch)
+        asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, batch)
+
+    def get(self, notification_id: str) -> Optional[Notification]:
+        return self._history.get(notification_id)
+
+    def retry_dead_letters(self) -> int:
+        """Queue all dead-lettered notifications again with fresh attempts"""
+        self._start()
+        retried = 0
+        while self.dead_letters:
+            notification = self.dead_letters.popleft()
+            notification.attempts = 0
+            notification.status = 'queued'
+            self.size += 1
+            self._add(notification)
+            retried += 1
+        return retried
+
+    async def drain(self, timeout: float) -> None:
+        """Send what is batched now and wait up to `timeout` for it, then stop the workers"""
+        if not self._tasks:
+            return
+        for key in list(self._pending):
+            self._flush(key)
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        cutoff = time.monotonic() - THROUGHPUT_WINDOW
+        while self._delivery_times and self._delivery_times[0][0] < cutoff:
+            self._delivery_times.popleft()
+        transports = {'webhook': self.webhook.stats(), 'simulated': self.simulated.stats()}
+        if self.smtp is not None:
+            transports['smtp'] = self.smtp.stats()
+        return {
+            'queued': self.size,
+            'max_queue': self.max_queue,
+            'pending_batches': len(self._pending),
+            'ready_batches': self._ready.qsize() if self._ready is not None else 0,
+            'workers': len(self._tasks),
+            'enqueued': self.enqueued,
+            'delivered': self.delivered,
+            'batches': self.batches,
+            'avg_batch_size': self.delivered / self.batches if self.batches else 0.0,
+            'failed_attempts': self.failed_attempts,
+            'retried': self.retried,
+            'dead_lettered': self.dead_lettered,
+            'dead_letters': len(self.dead_letters),
+            'latency': {
+                'avg': sum(self._latencies) / len(self._latencies) if self._latencies else 0.0,
+                'p50': percentile(self._latencies, 0.5),
+                'p99': percentile(self._latencies, 0.99)
+            },
+            'throughput_per_second': sum(count for _, count in self._delivery_times) / THROUGHPUT_WINDOW,
+            'transports': transports
+        }
+
+
+notification_queue = DeliveryQueue(SmtpTransport(SMTP_HOST) if SMTP_HOST else None)
@@ -0,0 +1,238 @@
+# trunk-ignore-all(black)
+"""
+Pipeline optimizer run between DAG validation and execution.
+
+- Dead-node elimination: nodes that can't reach a sink (output or notification)
+  are not executed.
+- Constant folding: pure nodes whose inputs are all constant get a structural
+  key; their outputs are computed once and then replayed from a bounded cache.
+- Fusion: chains of lightweight pure nodes with a single producer/consumer
+  between them run as one execution step, without intermediate bookkeeping.
+"""
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import os
+import sys
+
+from cache import canonical_hash
+from table import Table
+
+SINK_KINDS = {'output', 'notification'}
+FUSIBLE_KINDS = {'text', 'filter', 'calculator', 'dataformat'}
+
+FOLD_CACHE_MAX_ENTRIES = int(os.getenv('FOLD_CACHE_MAX_ENTRIES', '1024'))
+FOLD_CACHE_MAX_BYTES = int(os.getenv('FOLD_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Outputs larger than this aren't cached, so one big constant can't flush the rest
+FOLD_CACHE_MAX_ENTRY_BYTES = int(os.getenv('FOLD_CACHE_MAX_ENTRY_BYTES', str(4 * 1024 * 1024)))
+
+
+def approximate_size(value: Any, limit: int) -> int:
+    """Rough in-memory size of an output, counted only until it exceeds `limit`"""
+    size = 0
+    stack = [value]
+    while stack and size <= limit:
+        item = stack.pop()
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif isinstance(item, Table):
+            stack.extend(item.columns)
+            stack.extend(nulls for nulls in item.nulls if nulls is not None)
+    return size
+
+
+class FoldCache:
+    """LRU of outputs of constant nodes, keyed by their structural hash and bounded by entry count and size"""
+
+    def __init__(self, max_entries: int = FOLD_CACHE_MAX_ENTRIES, max_bytes: int = FOLD_CACHE_MAX_BYTES, max_entry_bytes: int = FOLD_CACHE_MAX_ENTRY_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        # key -> (output, approximate size)
+        self._entries: 'OrderedDict[str, Tuple[Any, int]]' = OrderedDict()
+        self._bytes = 0
+        self.skipped = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key: str, output: Any) -> None:
+        self._remove(key)
+        size = approximate_size(output, self.max_entry_bytes)
+        if size > self.max_entry_bytes:
+            self.skipped += 1
+            return
+        self._entries[key] = (output, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'skipped': self.skipped,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'max_entry_bytes': self.max_entry_bytes
+        }
+
+
+class ExecutionPlan:
+    """Result of optimizing a pipeline: what to run and how"""
+    __slots__ = ('nodes', 'edges', 'order', 'kinds', 'eliminated', 'constant_keys', 'chains', 'folded')
+
+    def __init__(self, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]], order: List[str]):
+        self.nodes = nodes
+        self.edges = edges
+        # Topological order of the remaining nodes
+        self.order = order
+        # node id -> resolved handler kind
+        self.kinds: Dict[str, str] = {}
+        self.eliminated: List[str] = []
+        # node id -> structural key, for nodes whose output is a compile-time constant
+        self.constant_keys: Dict[str, str] = {}
+        # chain head id -> ids of the fused chain (head first)
+        self.chains: Dict[str, List[str]] = {}
+        # Constant nodes whose output was replayed from the fold cache, filled in during execution
+        self.folded: List[str] = []
+
+    def instance(self, nodes: Optional[List[Dict[str, Any]]] = None) -> 'ExecutionPlan':
+        """Copy for one execution, optionally with (same-id) nodes replaced"""
+        plan = ExecutionPlan(self.nodes if nodes is None else nodes, self.edges, self.order)
+        plan.kinds = self.kinds
+        plan.eliminated = self.eliminated
+        plan.constant_keys = self.constant_keys
+        plan.chains = self.chains
+        return plan
+
+    def chain_members(self) -> Set[str]:
+        return {node_id for chain in self.chains.values() for node_id in chain[1:]}
+
+    def explain(self) -> Dict[str, Any]:
+        return {
+            'executed_nodes': len(self.nodes) - len(self.folded),
+            'eliminated': self.eliminated,
+            'constant_nodes': sorted(self.constant_keys),
+            'folded': self.folded,
+            'fused': list(self.chains.values())
+        }
+
+
+def eliminate_dead_nodes(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]], kind_of: Callable[[Dict[str, Any]], str]) -> List[str]:
+    """Ids of nodes that can't reach a sink; empty when the pipeline has no sinks"""
+    sinks = [node['id'] for node in nodes if kind_of(node) in SINK_KINDS]
+    if not sinks:
+        return []
+
+    predecessors = defaultdict(list)
+    for edge in edges:
+        predecessors[edge['target']].append(edge['source'])
+
+    live = set(sinks)
+    stack = list(sinks)
+    while stack:
+        for source in predecessors[stack.pop()]:
+            if source not in live:
+                live.add(source)
+                stack.append(source)
+
+    return [node['id'] for node in nodes if node['id'] not in live]
+
+
+def find_constant_nodes(order: List[str], node_lookup: Dict[str, Dict[str, Any]], input_edges: Dict[str, List[str]], is_pure: Callable[[Dict[str, Any]], bool]) -> Dict[str, str]:
+    """
+    Structural keys of pure nodes whose inputs are all constant.
+
+    A node's key hashes its type and data together with the keys of its inputs
+    (in edge order), so identical constant subgraphs share cache entries.
+    """
+    keys: Dict[str, str] = {}
+    for node_id in order:
+        node = node_lookup[node_id]
+        sources = input_edges.get(node_id, [])
+        if not is_pure(node) or any(source not in keys for source in sources):
+            continue
+        keys[node_id] = canonical_hash({
+            'type': node.get('type'),
+            'data': node.get('data', {}),
+            'inputs': [keys[source] for source in sources]
+        })
+    return keys
+
+
+def find_fusible_chains(order: List[str], node_lookup: Dict[str, Dict[str, Any]], input_edges: Dict[str, List[str]], kind_of: Callable[[Dict[str, Any]], str], is_pure: Callable[[Dict[str, Any]], bool], exclude: Set[str]) -> Dict[str, List[str]]:
+    """Maximal chains of fusible nodes linked by single-producer/single-consumer edges"""
+    consumers = defaultdict(list)
+    for target, sources in input_edges.items():
+        for source in sources:
+            consumers[source].append(target)
+
+    def fusible(node_id: str) -> bool:
+        node = node_lookup[node_id]
+        return node_id not in exclude and kind_of(node) in FUSIBLE_KINDS and is_pure(node)
+
+    def next_in_chain(node_id: str) -> Optional[str]:
+        targets = consumers.get(node_id, [])
+        if len(targets) != 1:
+            return None
+        target = targets[0]
+        if target in node_lookup and fusible(target) and input_edges.get(target) == [node_id]:
+            return target
+        return None
+
+    chains: Dict[str, List[str]] = {}
+    in_chain: Set[str] = set()
+    for node_id in order:
+        if node_id in in_chain or not fusible(node_id):
+            continue
+        chain = [node_id]
+        following = next_in_chain(node_id)
+        while following is not None:
+            chain.append(following)
+            following = next_in_chain(following)
+        if len(chain) > 1:
+            chains[node_id] = chain
+            in_chain.update(chain)
+    return chains
+
+
+def optimize_pipeline(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]], order: List[str], kind_of: Callable[[Dict[str, Any]], str], is_pure: Callable[[Dict[str, Any]], bool]) -> ExecutionPlan:
+    """Rewrite a validated pipeline into an execution plan"""
+    eliminated = set(eliminate_dead_nodes(nodes, edges, kind_of))
+    live_nodes = [node for node in nodes if node['id'] not in eliminated]
+    live_edges = [edge for edge in edges if edge['source'] not in eliminated and edge['target'] not in eliminated]
+
+    node_lookup = {node['id']: node for node in live_nodes}
+    live_order = [node_id for node_id in order if node_id in node_lookup]
+
+    plan = ExecutionPlan(live_nodes, live_edges, live_order)
+    plan.kinds = {node['id']: kind_of(node) for node in live_nodes}
+    plan.eliminated = [node['id'] for node in nodes if node['id'] in eliminated]
+
+    input_edges = defaultdict(list)
+    for edge in live_edges:
+        input_edges[edge['target']].append(edge['source'])
+
+    plan.constant_keys = find_constant_nodes(live_order, node_lookup, input_edges, is_pure)
+    plan.chains = find_fusible_chains(live_order, node_lookup, input_edges, kind_of, is_pure, exclude=set(plan.constant_keys))
+    return plan
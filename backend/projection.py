@@ -0,0 +1,160 @@
+# trunk-ignore-all(black)
+"""
+Response projection for pipeline results.
+
+Shrinks `PipelineResult.execution_results` before serialization: results can be
+limited to sink nodes, reduced to summaries or to selected fields, and objects
+that appear in several outputs are encoded once and referenced by id.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+# Strings shorter than this are cheaper to repeat than to reference
+SHARED_STRING_MIN_LENGTH = 256
+
+# Strings longer than this are cut in summaries
+SUMMARY_STRING_LIMIT = 120
+
+FieldSelection = Union[List[str], Dict[str, List[str]], None]
+
+
+def sink_node_ids(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]) -> Set[str]:
+    """Nodes without outgoing edges"""
+    sources = {edge['source'] for edge in edges}
+    return {node['id'] for node in nodes if node['id'] not in sources}
+
+
+def select_fields(output: Any, paths: Iterable[str]) -> Any:
+    """Keep only the dotted `paths` of a dict output (other outputs are returned as is)"""
+    if not isinstance(output, dict):
+        return output
+
+    selected: Dict[str, Any] = {}
+    for path in paths:
+        keys = path.split('.')
+        value = output
+        for key in keys:
+            if isinstance(value, dict) and key in value:
+                value = value[key]
+            else:
+                break
+        else:
+            target = selected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+    return selected
+
+
+def summarize(output: Any) -> Any:
+    """Keep scalar fields and replace containers with their size"""
+    if isinstance(output, dict):
+        return {key: _summarize_value(value) for key, value in output.items()}
+    return _summarize_value(output)
+
+
+def _summarize_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        if len(value) <= SUMMARY_STRING_LIMIT:
+            return value
+        return {'$summary': 'str', 'length': len(value), 'preview': value[:SUMMARY_STRING_LIMIT]}
+    if isinstance(value, (dict, list, tuple)):
+        return {'$summary': type(value).__name__, 'length': len(value)}
+    try:
+        length = len(value)
+    except TypeError:
+        length = None
+    return {'$summary': type(value).__name__, 'length': length}
+
+
+def _fields_for(fields: FieldSelection, node_id: str, node_type: str) -> Optional[List[str]]:
+    if fields is None:
+        return None
+    if isinstance(fields, dict):
+        return fields.get(node_id, fields.get(node_type))
+    return fields
+
+
+def _is_shareable(value: Any) -> bool:
+    if isinstance(value, str):
+        return len(value) >= SHARED_STRING_MIN_LENGTH
+    return isinstance(value, (dict, list)) or hasattr(value, 'to_jsonable')
+
+
+def share_objects(outputs: List[Any]) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Encode objects that occur more than once (by identity) a single time.
+
+    Repeated objects are moved to a shared table and every occurrence is
+    replaced with `{'$ref': <id>}`. The original outputs are not modified.
+    """
+    counts: Dict[int, int] = {}
+
+    def count(value: Any) -> None:
+        if not _is_shareable(value):
+            return
+        key = id(value)
+        seen = counts.get(key, 0)
+        counts[key] = seen + 1
+        if seen:
+            return
+        if isinstance(value, dict):
+            for item in value.values():
+                count(item)
+        elif isinstance(value, list):
+            for item in value:
+                count(item)
+
+    for output in outputs:
+        count(output)
+
+    shared: Dict[str, Any] = {}
+    ref_ids: Dict[int, str] = {}
+
+    def rebuild(value: Any) -> Any:
+        if not _is_shareable(value):
+            return value
+        key = id(value)
+        if counts.get(key, 0) > 1:
+            ref_id = ref_ids.get(key)
+            if ref_id is None:
+                ref_id = f'r{len(ref_ids) + 1}'
+                ref_ids[key] = ref_id
+                shared[ref_id] = copy(value)
+            return {'$ref': ref_id}
+        return copy(value)
+
+    def copy(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {k: rebuild(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [rebuild(v) for v in value]
+        return value
+
+    return [rebuild(output) for output in outputs], shared
+
+
+def project_results(results: List[Any], sinks: Set[str], response_mode: str = 'full', fields: FieldSelection = None, share: bool = False) -> Tuple[List[Any], Optional[Dict[str, Any]]]:
+    """Apply the response options to a list of NodeResults"""
+    if response_mode == 'sinks':
+        results = [result for result in results if result.node_id in sinks]
+
+    if response_mode == 'summary' or fields is not None:
+        projected = []
+        for result in results:
+            output = result.output
+            paths = _fields_for(fields, result.node_id, result.node_type)
+            if paths is not None:
+                output = select_fields(output, paths)
+            if response_mode == 'summary':
+                output = summarize(output)
+            projected.append(result.model_copy(update={'output': output}))
+        results = projected
+
+    if not share:
+        return results, None
+
+    outputs, shared = share_objects([result.output for result in results])
+    results = [result.model_copy(update={'output': output}) for result, output in zip(results, outputs, strict=True)]
+    return results, shared or None
@@ -0,0 +1,52 @@
+# trunk-ignore-all(black)
+"""
+Shared clients for LLM providers.
+
+Creating an OpenAI client or an HTTP session per call costs a TLS handshake and
+connection setup on every LLM node. Clients are created once per API key and
+reused; registered pipelines open them ahead of their first invocation.
+"""
+from typing import Any, Dict, Optional
+import os
+import threading
+
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+
+_lock = threading.Lock()
+_openai_clients: Dict[str, Any] = {}
+_ollama_session: Optional[Any] = None
+
+
+def openai_client(api_key: str) -> Any:
+    """OpenAI client for `api_key`; raises ImportError when openai isn't installed"""
+    client = _openai_clients.get(api_key)
+    if client is None:
+        import openai
+        with _lock:
+            client = _openai_clients.get(api_key)
+            if client is None:
+                client = openai.OpenAI(api_key=api_key)
+                _openai_clients[api_key] = client
+    return client
+
+
+def ollama_session() -> Any:
+    """Keep-alive HTTP session for the local Ollama server"""
+    global _ollama_session
+    if _ollama_session is None:
+        import requests
+        with _lock:
+            if _ollama_session is None:
+                _ollama_session = requests.Session()
+    return _ollama_session
+
+
+def warm_up_llm_clients() -> None:
+    """Open the clients an LLM node would use, ignoring missing packages"""
+    openai_key = os.getenv('OPENAI_API_KEY')
+    try:
+        if openai_key:
+            openai_client(openai_key)
+        ollama_session()
+    except ImportError:
+        pass
@@ -0,0 +1,311 @@
+# trunk-ignore-all(black)
+"""
+Server-side pipeline registry.
+
+Pipeline definitions are stored versioned in a local SQLite database and can be
+invoked by id with just their input values. Each registered version is kept
+compiled in memory (validated graph, execution plans and resolved handlers), so
+an invocation only binds inputs and runs the nodes.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+from cache import canonical_hash
+
+PIPELINE_REGISTRY_DB = os.getenv('PIPELINE_REGISTRY_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipelines.db'))
+
+# Compiled pipeline versions kept warm in memory
+MAX_COMPILED_PIPELINES = int(os.getenv('MAX_COMPILED_PIPELINES', '128'))
+
+# Seconds a worker trusts its cached latest version of a pipeline before checking
+# the database again (other workers may have registered or deleted versions)
+REGISTRY_LATEST_TTL = float(os.getenv('REGISTRY_LATEST_TTL', '1.0'))
+
+_PIPELINE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class RegistryError(Exception):
+    """Raised for unknown pipelines, versions or input bindings"""
+
+
+class RegisteredPipeline:
+    """One stored version of a pipeline definition"""
+    __slots__ = ('pipeline_id', 'version', 'name', 'definition', 'definition_hash', 'created')
+
+    def __init__(self, pipeline_id: str, version: int, name: Optional[str], definition: Dict[str, Any], definition_hash: str, created: float):
+        self.pipeline_id = pipeline_id
+        self.version = version
+        self.name = name
+        self.definition = definition
+        self.definition_hash = definition_hash
+        self.created = created
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            'pipeline_id': self.pipeline_id,
+            'version': self.version,
+            'name': self.name,
+            'hash': self.definition_hash,
+            'num_nodes': len(self.definition.get('nodes', [])),
+            'num_edges': len(self.definition.get('edges', [])),
+            'created': self.created
+        }
+
+
+class CompiledPipeline:
+    """
+    A registered version ready to run.
+
+    Plans are built by `planner(bound_input_ids)` and cached per set of bound
+    inputs: bound inputs vary between invocations, so only subgraphs fed by the
+    remaining inputs can be constant-folded.
+    """
+    __slots__ = ('record', 'nodes', 'edges', 'options', 'input_ids', '_node_lookup', '_planner', '_plans')
+
+    def __init__(self, record: RegisteredPipeline, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]], options: Any, input_ids: Dict[str, str], planner: Callable[[FrozenSet[str]], Any]):
+        self.record = record
+        self.nodes = nodes
+        self.edges = edges
+        self.options = options
+        # Input node id or inputName -> input node id
+        self.input_ids = input_ids
+        self._node_lookup = {node['id']: node for node in nodes}
+        self._planner = planner
+        self._plans: Dict[FrozenSet[str], Any] = {}
+
+    def plan_for(self, bound: FrozenSet[str]) -> Any:
+        plan = self._plans.get(bound)
+        if plan is None:
+            plan = self._plans[bound] = self._planner(bound)
+        return plan
+
+    def bind(self, inputs: Dict[str, Any], parameters: FrozenSet[str] = frozenset()) -> Tuple[List[Dict[str, Any]], Any]:
+        """
+        Nodes with input values applied, and a fresh plan instance for them.
+
+        A string (or scalar) value replaces the node's `inputValue`; a dict is
+        merged into the node data, e.g. `{"fileId": ...}` to bind an upload.
+        `parameters` are further input nodes whose outputs are supplied at run
+        time, so the plan doesn't treat them as constants either.
+        """
+        bound_nodes: Dict[str, Dict[str, Any]] = {}
+        for name, value in inputs.items():
+            node_id = self.input_ids.get(name)
+            if node_id is None:
+                raise RegistryError(f'Unknown input {name!r}; expected one of {sorted(self.input_ids)}')
+            node = bound_nodes.get(node_id) or self._node_lookup[node_id]
+            data = dict(node.get('data', {}))
+            if isinstance(value, dict):
+                data.update(value)
+            else:
+                data['inputValue'] = value if isinstance(value, str) else json.dumps(value)
+            bound_nodes[node_id] = {**node, 'data': data}
+
+        plan = self.plan_for(frozenset(bound_nodes) | parameters)
+        if not bound_nodes:
+            return self.nodes, plan.instance()
+        nodes = [bound_nodes.get(node['id'], node) for node in self.nodes]
+        return nodes, plan.instance([bound_nodes.get(node['id'], node) for node in plan.nodes])
+
+
+class PipelineRegistry:
+    """Versioned pipeline definitions in SQLite, with an LRU of compiled versions"""
+
+    def __init__(self, path: str = PIPELINE_REGISTRY_DB, max_compiled: int = MAX_COMPILED_PIPELINES, latest_ttl: float = REGISTRY_LATEST_TTL):
+        self.path = path
+        self.max_compiled = max_compiled
+        self.latest_ttl = latest_ttl
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        # pipeline id -> (latest version, monotonic time it was read from the database)
+        self._latest: Dict[str, Tuple[int, float]] = {}
+        self._compiled: 'OrderedDict[Tuple[str, int], CompiledPipeline]' = OrderedDict()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS pipelines ('
+                ' pipeline_id TEXT NOT NULL,'
+                ' version INTEGER NOT NULL,'
+                ' name TEXT,'
+                ' definition TEXT NOT NULL,'
+                ' definition_hash TEXT NOT NULL,'
+                ' created REAL NOT NULL,'
+                ' PRIMARY KEY (pipeline_id, version))'
+            )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _record(self, row: Tuple) -> RegisteredPipeline:
+        pipeline_id, version, name, definition, definition_hash, created = row
+        return RegisteredPipeline(pipeline_id, version, name, json.loads(definition), definition_hash, created)
+
+    def register(self, definition: Dict[str, Any], pipeline_id: Optional[str] = None, name: Optional[str] = None) -> Tuple[RegisteredPipeline, bool]:
+        """
+        Store a new version of a pipeline; returns `(record, created)`.
+
+        Re-registering a definition identical to the latest version returns that
+        version instead of creating a new one.
+        """
+        if pipeline_id is None:
+            pipeline_id = uuid.uuid4().hex
+        elif not _PIPELINE_ID_PATTERN.match(pipeline_id):
+            raise RegistryError(f'Invalid pipeline id: {pipeline_id!r}')
+
+        definition_hash = canonical_hash(definition)
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                'SELECT pipeline_id, version, name, definition, definition_hash, created FROM pipelines'
+                ' WHERE pipeline_id = ? ORDER BY version DESC LIMIT 1', (pipeline_id,)
+            ).fetchone()
+            if row is not None and row[4] == definition_hash and (name is None or row[2] == name):
+                return self._record(row), False
+
+            version = row[1] + 1 if row is not None else 1
+            record = RegisteredPipeline(pipeline_id, version, name, definition, definition_hash, time.time())
+            db.execute(
+                'INSERT INTO pipelines VALUES (?, ?, ?, ?, ?, ?)',
+                (pipeline_id, version, name, json.dumps(definition), definition_hash, record.created)
+            )
+            db.commit()
+            self._latest[pipeline_id] = (version, time.monotonic())
+        return record, True
+
+    def get(self, pipeline_id: str, version: Optional[int] = None) -> RegisteredPipeline:
+        with self._lock:
+            db = self._db()
+            if version is None:
+                row = db.execute(
+                    'SELECT pipeline_id, version, name, definition, definition_hash, created FROM pipelines'
+                    ' WHERE pipeline_id = ? ORDER BY version DESC LIMIT 1', (pipeline_id,)
+                ).fetchone()
+            else:
+                row = db.execute(
+                    'SELECT pipeline_id, version, name, definition, definition_hash, created FROM pipelines'
+                    ' WHERE pipeline_id = ? AND version = ?', (pipeline_id, version)
+                ).fetchone()
+        if row is None:
+            suffix = f' version {version}' if version is not None else ''
+            raise RegistryError(f'Unknown pipeline: {pipeline_id}{suffix}')
+        return self._record(row)
+
+    def versions(self, pipeline_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db().execute(
+                'SELECT pipeline_id, version, name, definition, definition_hash, created FROM pipelines'
+                ' WHERE pipeline_id = ? ORDER BY version', (pipeline_id,)
+            ).fetchall()
+        if not rows:
+            raise RegistryError(f'Unknown pipeline: {pipeline_id}')
+        return [self._record(row).metadata() for row in rows]
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Latest version of every registered pipeline"""
+        with self._lock:
+            rows = self._db().execute(
+                'SELECT p.pipeline_id, p.version, p.name, p.definition, p.definition_hash, p.created FROM pipelines p'
+                ' JOIN (SELECT pipeline_id, MAX(version) AS version FROM pipelines GROUP BY pipeline_id) latest'
+                ' USING (pipeline_id, version) ORDER BY p.created'
+            ).fetchall()
+        return [self._record(row).metadata() for row in rows]
+
+    def delete(self, pipeline_id: str) -> None:
+        with self._lock:
+            db = self._db()
+            deleted = db.execute('DELETE FROM pipelines WHERE pipeline_id = ?', (pipeline_id,)).rowcount
+            db.commit()
+            self._forget(pipeline_id)
+        if not deleted:
+            raise RegistryError(f'Unknown pipeline: {pipeline_id}')
+
+    def _forget(self, pipeline_id: str) -> None:
+        # Called with the lock held
+        self._latest.pop(pipeline_id, None)
+        for key in [key for key in self._compiled if key[0] == pipeline_id]:
+            del self._compiled[key]
+
+    def latest_version(self, pipeline_id: str) -> Optional[int]:
+        """
+        Latest stored version of a pipeline, or None if it doesn't exist.
+
+        Served from memory for `latest_ttl` seconds after it was last read, then
+        checked against the database again; versions this worker has compiled
+        are dropped if the pipeline was deleted or replaced meanwhile.
+        """
+        cached = self._latest.get(pipeline_id)
+        now = time.monotonic()
+        if cached is not None and now - cached[1] < self.latest_ttl:
+            return cached[0]
+        with self._lock:
+            version = self._db().execute('SELECT MAX(version) FROM pipelines WHERE pipeline_id = ?', (pipeline_id,)).fetchone()[0]
+            if version is None or (cached is not None and version < cached[0]):
+                self._forget(pipeline_id)
+            if version is not None:
+                self._latest[pipeline_id] = (version, now)
+        return version
+
+    def compiled(self, pipeline_id: str, version: Optional[int], compile: Callable[[RegisteredPipeline], CompiledPipeline]) -> CompiledPipeline:
+        """
+        The compiled form of a version (latest by default).
+
+        Warm pipelines are served from memory, with at most a cheap check of the
+        latest version every `latest_ttl` seconds; others are loaded and
+        compiled with `compile` on first use.
+        """
+        latest = self.latest_version(pipeline_id)
+        if latest is None or (version is not None and version > latest):
+            suffix = f' version {version}' if version is not None else ''
+            raise RegistryError(f'Unknown pipeline: {pipeline_id}{suffix}')
+        if version is None:
+            version = latest
+        compiled = self._lookup_compiled((pipeline_id, version))
+        if compiled is not None:
+            return compiled
+
+        record = self.get(pipeline_id, version)
+        compiled = compile(record)
+        with self._lock:
+            self._compiled[(pipeline_id, record.version)] = compiled
+            while len(self._compiled) > self.max_compiled:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def warm(self, pipeline_id: str, version: Optional[int] = None) -> Optional[CompiledPipeline]:
+        """
+        The compiled form of a version if it can be served without the database.
+
+        Returns None when the version isn't compiled yet or the latest version
+        is due for a check; `compiled` then loads it.
+        """
+        cached = self._latest.get(pipeline_id)
+        if cached is None or time.monotonic() - cached[1] >= self.latest_ttl:
+            return None
+        if version is None:
+            version = cached[0]
+        elif version > cached[0]:
+            return None
+        return self._lookup_compiled((pipeline_id, version))
+
+    def _lookup_compiled(self, key: Tuple[str, int]) -> Optional[CompiledPipeline]:
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+        return compiled
+
+    def stats(self) -> Dict[str, Any]:
+        return {'compiled': len(self._compiled), 'max_compiled': self.max_compiled}
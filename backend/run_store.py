@@ -0,0 +1,349 @@
+# trunk-ignore-all(black)
+"""
+Durable history of pipeline runs.
+
+Every run and its per-node results (status, timings, errors and outputs) are
+written to a local SQLite database. Writes are queued and committed in batches
+by a background task, off the request path. Large list outputs are split into
+one row per item so they can be read back page by page.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+RUN_STORE_DB = os.getenv('RUN_STORE_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runs.db'))
+RUN_STORE_ENABLED = os.getenv('RUN_STORE_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+# Runs committed per transaction, and how long the writer waits to fill a batch
+RUN_STORE_BATCH_SIZE = int(os.getenv('RUN_STORE_BATCH_SIZE', '64'))
+RUN_STORE_FLUSH_INTERVAL = float(os.getenv('RUN_STORE_FLUSH_INTERVAL', '0.05'))
+
+# Runs waiting to be written; beyond this new runs are dropped rather than slowing requests
+RUN_STORE_QUEUE_SIZE = int(os.getenv('RUN_STORE_QUEUE_SIZE', '1000'))
+
+# Seconds a read of a specific run waits for it to be written if it's still queued
+RUN_STORE_READ_WAIT = float(os.getenv('RUN_STORE_READ_WAIT', '1.0'))
+
+# Oldest runs beyond this count are pruned
+RUN_STORE_MAX_RUNS = int(os.getenv('RUN_STORE_MAX_RUNS', '10000'))
+
+# Lists with at least this many items are stored (and paged) item by item
+OUTPUT_SPLIT_ITEMS = 100
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS runs ('
+    ' run_id TEXT PRIMARY KEY, pipeline_hash TEXT, pipeline_id TEXT, status TEXT NOT NULL,'
+    ' started REAL NOT NULL, total_time REAL, num_nodes INTEGER, num_edges INTEGER, failed_nodes INTEGER)',
+    'CREATE INDEX IF NOT EXISTS runs_by_hash ON runs (pipeline_hash, started)',
+    'CREATE INDEX IF NOT EXISTS runs_by_pipeline ON runs (pipeline_id, started)',
+    'CREATE INDEX IF NOT EXISTS runs_by_status ON runs (status, started)',
+    'CREATE INDEX IF NOT EXISTS runs_by_time ON runs (started)',
+    'CREATE TABLE IF NOT EXISTS node_results ('
+    ' run_id TEXT NOT NULL, node_id TEXT NOT NULL, node_type TEXT, status TEXT, error TEXT,'
+    ' execution_time REAL, started REAL, output_size INTEGER,'
+    ' PRIMARY KEY (run_id, node_id))',
+    'CREATE INDEX IF NOT EXISTS node_results_by_type ON node_results (node_type, started)',
+    'CREATE INDEX IF NOT EXISTS node_results_by_status ON node_results (status, started)',
+    'CREATE TABLE IF NOT EXISTS node_outputs ('
+    ' run_id TEXT NOT NULL, node_id TEXT NOT NULL, value TEXT NOT NULL,'
+    ' PRIMARY KEY (run_id, node_id))',
+    'CREATE TABLE IF NOT EXISTS output_items ('
+    ' run_id TEXT NOT NULL, node_id TEXT NOT NULL, path TEXT NOT NULL, idx INTEGER NOT NULL, item TEXT NOT NULL,'
+    ' PRIMARY KEY (run_id, node_id, path, idx)) WITHOUT ROWID',
+)
+
+
+class RunStoreError(Exception):
+    """Raised for unknown runs, nodes or output paths"""
+
+
+class RunRecord:
+    """A finished run waiting to be written"""
+    __slots__ = ('run_id', 'pipeline_hash', 'pipeline_id', 'status', 'started', 'total_time', 'num_nodes', 'num_edges', 'results', 'failed_nodes')
+
+    def __init__(self, run_id: str, pipeline_hash: Optional[str], pipeline_id: Optional[str], status: str, started: float, total_time: float, num_nodes: int, num_edges: int, results: List[Any], failed_nodes: int = 0):
+        self.run_id = run_id
+        self.pipeline_hash = pipeline_hash
+        self.pipeline_id = pipeline_id
+        self.status = status
+        self.started = started
+        self.total_time = total_time
+        self.num_nodes = num_nodes
+        self.num_edges = num_edges
+        # NodeResults; outputs are serialized by the writer
+        self.results = results
+        self.failed_nodes = failed_nodes
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+
+def split_output(output: Any) -> Tuple[Any, Dict[str, List[Any]]]:
+    """
+    Separate large lists from a JSON output.
+
+    A large top-level list, or a large list in a top-level field, is replaced by
+    `{'$items': <path>, 'length': n}` and returned separately keyed by path
+    ('' for the output itself).
+    """
+    if isinstance(output, list) and len(output) >= OUTPUT_SPLIT_ITEMS:
+        return {'$items': '', 'length': len(output)}, {'': output}
+    if not isinstance(output, dict):
+        return output, {}
+
+    items: Dict[str, List[Any]] = {}
+    value = {}
+    for key, field in output.items():
+        if isinstance(field, list) and len(field) >= OUTPUT_SPLIT_ITEMS:
+            items[key] = field
+            value[key] = {'$items': key, 'length': len(field)}
+        else:
+            value[key] = field
+    return value, items
+
+
+class RunStore:
+    """SQLite run history with an asynchronous batched writer"""
+
+    def __init__(self, path: str = RUN_STORE_DB, enabled: bool = RUN_STORE_ENABLED, batch_size: int = RUN_STORE_BATCH_SIZE, flush_interval: float = RUN_STORE_FLUSH_INTERVAL, queue_size: int = RUN_STORE_QUEUE_SIZE, max_runs: int = RUN_STORE_MAX_RUNS):
+        self.path = path
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        # run id -> set once the run has been written (or failed to be)
+        self._pending: Dict[str, asyncio.Event] = {}
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            columns = {row[1] for row in connection.execute('PRAGMA table_info(runs)')}
+            if 'failed_nodes' not in columns:
+                # Databases from before the column stored the count in the status text
+                connection.execute('ALTER TABLE runs ADD COLUMN failed_nodes INTEGER')
+                connection.execute(
+                    "UPDATE runs SET failed_nodes = CAST(substr(status, 18) AS INTEGER), status = 'partial_success'"
+                    " WHERE status LIKE 'partial_success (%'"
+                )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    # Writing
+
+    def record(self, run: RunRecord) -> bool:
+        """Queue a run for writing without waiting; returns False if it was dropped"""
+        if not self.enabled:
+            return False
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(run)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._pending.setdefault(run.run_id, asyncio.Event())
+        return True
+
+    def _ensure_writer(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._loop is not loop or self._task.done():
+            self._queue = asyncio.Queue(self.queue_size)
+            self._loop = loop
+            self._task = loop.create_task(self._writer(self._queue))
+
+    async def _writer(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"Run store write error: {e}")
+            finally:
+                for run in batch:
+                    event = self._pending.pop(run.run_id, None)
+                    if event is not None:
+                        event.set()
+                    queue.task_done()
+
+    async def flush(self) -> None:
+        """Wait until every queued run has been written"""
+        if self._queue is not None and self._loop is asyncio.get_running_loop() and not self._task.done():
+            await self._queue.join()
+
+    async def wait_written(self, run_id: str, timeout: float = RUN_STORE_READ_WAIT) -> None:
+        """
+        Give a run that is still queued up to `timeout` seconds to be written, so
+        reading it right after it finished finds it; other reads don't wait.
+        """
+        event = self._pending.get(run_id)
+        if event is not None and self._loop is asyncio.get_running_loop():
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _write_batch(self, batch: List[RunRecord]) -> None:
+        runs = []
+        node_rows = []
+        output_rows = []
+        item_rows = []
+        for run in batch:
+            runs.append((run.run_id, run.pipeline_hash, run.pipeline_id, run.status, run.started, run.total_time, run.num_nodes, run.num_edges, run.failed_nodes))
+            for result in run.results:
+                try:
+                    output = result.model_dump(mode='json', include={'output'})['output']
+                except Exception:
+                    # e.g. an uploaded file deleted since the run; keep the result without output
+                    output = None
+                output_size = None
+                if output is not None:
+                    value, items = split_output(output)
+                    encoded = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+                    output_size = len(encoded)
+                    output_rows.append((run.run_id, result.node_id, encoded))
+                    for path, field in items.items():
+                        for idx, item in enumerate(field):
+                            encoded_item = json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+                            output_size += len(encoded_item)
+                            item_rows.append((run.run_id, result.node_id, path, idx, encoded_item))
+                node_rows.append((run.run_id, result.node_id, result.node_type, result.status, result.error, result.execution_time, run.started, output_size))
+
+        with self._lock:
+            db = self._db()
+            with db:
+                db.executemany(
+                    'INSERT OR REPLACE INTO runs (run_id, pipeline_hash, pipeline_id, status, started, total_time, num_nodes, num_edges, failed_nodes)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', runs
+                )
+                db.executemany('INSERT OR REPLACE INTO node_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)', node_rows)
+                db.executemany('INSERT OR REPLACE INTO node_outputs VALUES (?, ?, ?)', output_rows)
+                db.executemany('INSERT OR REPLACE INTO output_items VALUES (?, ?, ?, ?, ?)', item_rows)
+                self._prune(db)
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        row = db.execute('SELECT started FROM runs ORDER BY started DESC LIMIT 1 OFFSET ?', (self.max_runs,)).fetchone()
+        if row is None:
+            return
+        old_runs = 'SELECT run_id FROM runs WHERE started <= ?'
+        for table in ('output_items', 'node_outputs', 'node_results'):
+            db.execute(f'DELETE FROM {table} WHERE run_id IN ({old_runs})', (row[0],))
+        db.execute('DELETE FROM runs WHERE started <= ?', (row[0],))
+
+    # Reading
+
+    def _query(self, sql: str, params: Tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._db().execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row, strict=True)) for row in cursor.fetchall()]
+
+    def _filters(self, filters: Dict[str, Any], since: Optional[float], until: Optional[float], prefix: str = '') -> Tuple[str, List[Any]]:
+        clauses = []
+        params: List[Any] = []
+        for column, value in filters.items():
+            if value is not None:
+                clauses.append(f'{prefix}{column} = ?')
+                params.append(value)
+        if since is not None:
+            clauses.append(f'{prefix}started >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append(f'{prefix}started < ?')
+            params.append(until)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query_runs(self, pipeline_hash: Optional[str] = None, pipeline_id: Optional[str] = None, status: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0) -> List[Dict[str, Any]]:
+        where, params = self._filters({'pipeline_hash': pipeline_hash, 'pipeline_id': pipeline_id, 'status': status}, since, until)
+        return self._query(f'SELECT * FROM runs{where} ORDER BY started DESC LIMIT ? OFFSET ?', (*params, min(limit, MAX_PAGE_SIZE), offset))
+
+    def query_node_results(self, node_type: Optional[str] = None, status: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0) -> List[Dict[str, Any]]:
+        where, params = self._filters({'node_type': node_type, 'status': status}, since, until)
+        return self._query(f'SELECT * FROM node_results{where} ORDER BY started DESC LIMIT ? OFFSET ?', (*params, min(limit, MAX_PAGE_SIZE), offset))
+
+    def node_latency_stats(self, node_type: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Execution time aggregates per node type and status"""
+        where, params = self._filters({'node_type': node_type}, since, until)
+        return self._query(
+            'SELECT node_type, status, COUNT(*) AS count, AVG(execution_time) AS avg_time,'
+            f' MIN(execution_time) AS min_time, MAX(execution_time) AS max_time FROM node_results{where}'
+            ' GROUP BY node_type, status ORDER BY node_type, status', tuple(params)
+        )
+
+    def get_run(self, run_id: str) -> Dict[str, Any]:
+        runs = self._query('SELECT * FROM runs WHERE run_id = ?', (run_id,))
+        if not runs:
+            raise RunStoreError(f'Unknown run: {run_id}')
+        run = runs[0]
+        run['node_results'] = self._query('SELECT node_id, node_type, status, error, execution_time, output_size FROM node_results WHERE run_id = ?', (run_id,))
+        for result in run['node_results']:
+            result['output_ref'] = f'/runs/{run_id}/nodes/{result["node_id"]}/output' if result['output_size'] is not None else None
+        return run
+
+    def get_output(self, run_id: str, node_id: str) -> Any:
+        """A node's output, with large lists replaced by `{'$items': path, 'length': n}`"""
+        rows = self._query('SELECT value FROM node_outputs WHERE run_id = ? AND node_id = ?', (run_id, node_id))
+        if not rows:
+            raise RunStoreError(f'No stored output for node {node_id} of run {run_id}')
+        return json.loads(rows[0]['value'])
+
+    def get_output_items(self, run_id: str, node_id: str, path: str = '', offset: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+        """One page of a large list output"""
+        limit = min(limit, MAX_PAGE_SIZE)
+        with self._lock:
+            db = self._db()
+            total = db.execute('SELECT COUNT(*) FROM output_items WHERE run_id = ? AND node_id = ? AND path = ?', (run_id, node_id, path)).fetchone()[0]
+            rows = db.execute(
+                'SELECT item FROM output_items WHERE run_id = ? AND node_id = ? AND path = ? AND idx >= ? ORDER BY idx LIMIT ?',
+                (run_id, node_id, path, offset, limit)
+            ).fetchall()
+        if not total:
+            raise RunStoreError(f'No paged output at {path!r} for node {node_id} of run {run_id}')
+        return {'path': path, 'offset': offset, 'limit': limit, 'total': total, 'items': [json.loads(row[0]) for row in rows]}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'written': self.written,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'failed': self.failed
+        }
@@ -0,0 +1,696 @@
+# trunk-ignore-all(black)
+"""
+Scheduled runs of registered pipelines.
+
+A schedule runs a registered pipeline every `interval` seconds or on a cron
+rule. Schedules are stored in a local SQLite database and, while the server
+runs, kept in a heap ordered by due time. One task sleeps until the earliest
+schedule is due, so waiting schedules cost no CPU however many there are, and
+each firing is O(log n).
+
+Ticks that pass while the server is down, or while the previous run of the
+schedule is still going, are handled by the schedule's `missed` policy: `skip`
+them, run `once` to catch up, or run `all` of them (up to MAX_CATCHUP_RUNS).
+`jitter` delays each run by a random 0..jitter seconds, so schedules on the
+same rule don't all start at once.
+
+Several workers can share the database: before firing, a worker claims the tick
+by moving the schedule's `next_tick` on from the value it last saw, in one
+conditional UPDATE. Only one worker's claim succeeds; the others reload the
+schedule instead of running it.
+"""
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, FrozenSet, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from tenants import DEFAULT_TENANT, percentile
+
+SCHEDULES_DB = os.getenv('SCHEDULES_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schedules.db'))
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+SCHEDULE_MIN_INTERVAL = float(os.getenv('SCHEDULE_MIN_INTERVAL', '1'))
+# Scheduled runs executing at once across all schedules; further runs wait
+SCHEDULE_MAX_CONCURRENT_RUNS = int(os.getenv('SCHEDULE_MAX_CONCURRENT_RUNS', '32'))
+# A tick run later than this (seconds past its jittered time) counts as missed
+SCHEDULE_MISFIRE_GRACE = float(os.getenv('SCHEDULE_MISFIRE_GRACE', '60'))
+# Runs owed to one schedule under the `all` policy
+MAX_CATCHUP_RUNS = int(os.getenv('SCHEDULE_MAX_CATCHUP_RUNS', '100'))
+# Seconds between writes of run state (last run, counts) to SQLite
+SCHEDULE_FLUSH_INTERVAL = float(os.getenv('SCHEDULE_FLUSH_INTERVAL', '1'))
+
+# Longest sleep of the scheduler task, so wall-clock changes are noticed
+MAX_SLEEP = 60.0
+MISSED_POLICIES = ('skip', 'once', 'all')
+LAG_SAMPLES = 1024
+
+_CRON_MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+_MONTH_NAMES = {name: i for i, name in enumerate(('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+_WEEKDAY_NAMES = {name: i for i, name in enumerate(('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'))}
+
+# The schedule and tick of the scheduled run in progress, for timer nodes to report
+current_tick: ContextVar[Optional[Dict[str, Any]]] = ContextVar('current_tick', default=None)
+
+
+class ScheduleError(Exception):
+    """Raised for invalid rules and unknown schedules"""
+
+
+def _cron_field(text: str, low: int, high: int, names: Dict[str, int]) -> FrozenSet[int]:
+    values: Set[int] = set()
+    for part in text.lower().split(','):
+        value_range, _, step_text = part.partition('/')
+        step = int(step_text) if step_text else 1
+        if value_range == '*':
+            start, end = low, high
+        else:
+            first, _, last = value_range.partition('-')
+            start = names[first] if first in names else int(first)
+            end = (names[last] if last in names else int(last)) if last else (high if step_text else start)
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(part)
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronRule:
+    """A five-field cron rule (minute hour day-of-month month day-of-week) in a timezone"""
+
+    def __init__(self, expression: str, timezone: Optional[str] = None):
+        self.expression = expression
+        fields = _CRON_MACROS.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ScheduleError(f'Cron rule needs 5 fields: {expression!r}')
+        try:
+            self.zone = ZoneInfo(timezone) if timezone else dt_timezone.utc
+        except (ZoneInfoNotFoundError, ValueError) as e:
+            raise ScheduleError(f'Unknown timezone: {timezone!r}') from e
+        try:
+            minutes = _cron_field(fields[0], 0, 59, {})
+            hours = _cron_field(fields[1], 0, 23, {})
+            self.days = _cron_field(fields[2], 1, 31, {})
+            self.months = _cron_field(fields[3], 1, 12, _MONTH_NAMES)
+            # 7 is Sunday too
+            weekdays = _cron_field(fields[4], 0, 7, _WEEKDAY_NAMES)
+        except (ValueError, KeyError) as e:
+            raise ScheduleError(f'Invalid cron rule {expression!r}: {e}') from e
+        self.minutes = sorted(minutes)
+        self.hours = sorted(hours)
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        # Like cron, a day matches either field when both are restricted
+        self.any_day = fields[2].startswith('*')
+        self.any_weekday = fields[4].startswith('*')
+
+    def _day_matches(self, day: datetime) -> bool:
+        in_month = day.day in self.days
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_after(self, timestamp: float) -> float:
+        """The first time after `timestamp` the rule fires"""
+        local = datetime.fromtimestamp(timestamp, self.zone).replace(second=0, microsecond=0, tzinfo=None) + timedelta(minutes=1)
+        # Rules such as Feb 30 never fire
+        limit = local + timedelta(days=366 * 5)
+        while local < limit:
+            if local.month not in self.months:
+                local = datetime(local.year + local.month // 12, local.month % 12 + 1, 1)
+                continue
+            if not self._day_matches(local):
+                local = datetime(local.year, local.month, local.day) + timedelta(days=1)
+                continue
+            hour = bisect_left(self.hours, local.hour)
+            if hour == len(self.hours):
+                local = datetime(local.year, local.month, local.day) + timedelta(days=1)
+                continue
+            if self.hours[hour] != local.hour:
+                local = local.replace(hour=self.hours[hour], minute=0)
+            minute = bisect_left(self.minutes, local.minute)
+            if minute == len(self.minutes):
+                local = local.replace(minute=0) + timedelta(hours=1)
+                continue
+            local = local.replace(minute=self.minutes[minute])
+            fire = local.replace(tzinfo=self.zone).timestamp()
+            if fire > timestamp:
+                return fire
+            # A wall-clock time repeated or skipped by a DST change
+            local += timedelta(minutes=1)
+        raise ScheduleError(f'Cron rule never fires: {self.expression!r}')
+
+
+class IntervalRule:
+    """Every `interval` seconds, on ticks counted from `anchor`"""
+
+    def __init__(self, interval: float, anchor: float):
+        if interval < SCHEDULE_MIN_INTERVAL:
+            raise ScheduleError(f'Interval must be at least {SCHEDULE_MIN_INTERVAL} seconds')
+        self.interval = interval
+        self.anchor = anchor
+
+    def next_after(self, timestamp: float) -> float:
+        if timestamp < self.anchor:
+            return self.anchor
+        ticks = math.floor((timestamp - self.anchor) / self.interval) + 1
+        # Rounding can land on `timestamp` itself
+        while self.anchor + ticks * self.interval <= timestamp:
+            ticks += 1
+        return self.anchor + ticks * self.interval
+
+
+class Schedule:
+    """A rule for running a registered pipeline, and the state of its runs"""
+    __slots__ = (
+        'schedule_id', 'pipeline_id', 'version', 'node_id', 'inputs', 'interval', 'cron', 'timezone', 'jitter', 'missed',
+        'enabled', 'tenant', 'created', 'anchor', 'next_tick', 'due', 'last_run', 'last_status', 'last_error', 'last_run_id',
+        'runs', 'skipped', 'saved_counts', 'pending', 'running', 'seq', 'rule'
+    )
+
+    def __init__(self, pipeline_id: str, interval: Optional[float] = None, cron: Optional[str] = None, timezone: Optional[str] = None, jitter: float = 0.0, missed: str = 'once', inputs: Optional[Dict[str, Any]] = None, version: Optional[int] = None, enabled: bool = True, tenant: str = DEFAULT_TENANT, schedule_id: Optional[str] = None, node_id: Optional[str] = None, start_at: Optional[float] = None):
+        if (interval is None) == (cron is None):
+            raise ScheduleError('A schedule needs either an interval or a cron rule')
+        if missed not in MISSED_POLICIES:
+            raise ScheduleError(f'Unknown missed-tick policy {missed!r}; expected one of {list(MISSED_POLICIES)}')
+        if jitter < 0:
+            raise ScheduleError('Jitter must not be negative')
+        self.schedule_id = schedule_id or uuid.uuid4().hex
+        self.pipeline_id = pipeline_id
+        self.version = version
+        # Timer node the schedule comes from, for schedules declared in pipelines
+        self.node_id = node_id
+        self.inputs = inputs or {}
+        self.interval = interval
+        self.cron = cron
+        self.timezone = timezone
+        self.jitter = jitter
+        self.missed = missed
+        self.enabled = enabled
+        self.tenant = tenant
+        self.created = time.time()
+        self.last_run: Optional[float] = None
+        self.last_status: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.last_run_id: Optional[str] = None
+        self.runs = 0
+        self.skipped = 0
+        # (runs, skipped) as last read or written; the store adds what came since
+        self.saved_counts = (0, 0)
+        # Runs owed, executed one after the other
+        self.pending = 0
+        self.running = False
+        # Heap entry currently valid for this schedule
+        self.seq = -1
+        if cron is not None:
+            self.anchor = start_at or self.created
+            self.rule: Any = CronRule(cron, timezone)
+            self.next_tick = self.rule.next_after(self.anchor - 1e-6 if start_at else self.anchor)
+        else:
+            self.anchor = start_at or self.created + interval
+            self.rule = IntervalRule(interval, self.anchor)
+            self.next_tick = self.anchor
+        self.due = self.next_tick
+
+    def same_rule(self, other: 'Schedule') -> bool:
+        return (self.interval, self.cron, self.timezone) == (other.interval, other.cron, other.timezone)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'schedule_id': self.schedule_id,
+            'pipeline_id': self.pipeline_id,
+            'version': self.version,
+            'node_id': self.node_id,
+            'inputs': self.inputs,
+            'interval': self.interval,
+            'cron': self.cron,
+            'timezone': self.timezone,
+            'jitter': self.jitter,
+            'missed': self.missed,
+            'enabled': self.enabled,
+            'tenant': self.tenant,
+            'created': self.created,
+            'next_run': self.due if self.enabled else None,
+            'last_run': self.last_run,
+            'last_status': self.last_status,
+            'last_error': self.last_error,
+            'last_run_id': self.last_run_id,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'pending': self.pending,
+            'running': self.running
+        }
+
+
+_COLUMNS = (
+    'schedule_id', 'pipeline_id', 'version', 'node_id', 'inputs', 'interval', 'cron', 'timezone', 'jitter', 'missed',
+    'enabled', 'tenant', 'created', 'anchor', 'next_tick', 'last_run', 'last_status', 'last_error', 'last_run_id', 'runs', 'skipped'
+)
+_STATE_COLUMNS = ('next_tick', 'last_run', 'last_status', 'last_error', 'last_run_id', 'runs', 'skipped')
+# next_tick is only written when a schedule is saved or a tick is claimed, and
+# run counts are added to, since other workers run the same schedules
+_RUN_COLUMNS = ('last_run', 'last_status', 'last_error', 'last_run_id')
+
+
+class ScheduleStore:
+    """Schedules in SQLite"""
+
+    def __init__(self, path: str = SCHEDULES_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS schedules ('
+                ' schedule_id TEXT PRIMARY KEY, pipeline_id TEXT NOT NULL, version INTEGER, node_id TEXT, inputs TEXT NOT NULL,'
+                ' interval REAL, cron TEXT, timezone TEXT, jitter REAL NOT NULL, missed TEXT NOT NULL,'
+                ' enabled INTEGER NOT NULL, tenant TEXT NOT NULL, created REAL NOT NULL, anchor REAL NOT NULL, next_tick REAL NOT NULL,'
+                ' last_run REAL, last_status TEXT, last_error TEXT, last_run_id TEXT, runs INTEGER NOT NULL, skipped INTEGER NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS schedules_by_pipeline ON schedules (pipeline_id)')
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _schedule(self, row: Tuple) -> Schedule:
+        values = dict(zip(_COLUMNS, row, strict=True))
+        schedule = Schedule(
+            values['pipeline_id'], values['interval'], values['cron'], values['timezone'], values['jitter'], values['missed'],
+            json.loads(values['inputs']), values['version'], bool(values['enabled']), values['tenant'], values['schedule_id'],
+            values['node_id'], values['anchor']
+        )
+        schedule.created = values['created']
+        for column in _STATE_COLUMNS:
+            setattr(schedule, column, values[column])
+        schedule.saved_counts = (schedule.runs, schedule.skipped)
+        schedule.due = schedule.next_tick
+        return schedule
+
+    def load(self) -> List[Schedule]:
+        with self._lock:
+            rows = self._db().execute(f'SELECT {", ".join(_COLUMNS)} FROM schedules').fetchall()
+        return [self._schedule(row) for row in rows]
+
+    def load_many(self, schedule_ids: List[str]) -> List[Schedule]:
+        """The stored form of some schedules; deleted ones are left out"""
+        with self._lock:
+            db = self._db()
+            rows = [db.execute(f'SELECT {", ".join(_COLUMNS)} FROM schedules WHERE schedule_id = ?', (schedule_id,)).fetchone() for schedule_id in schedule_ids]
+        return [self._schedule(row) for row in rows if row is not None]
+
+    def claim(self, ticks: List[Tuple[str, float, float]]) -> Set[str]:
+        """
+        Claim due ticks, given as `(schedule_id, next_tick, following_tick)`, in
+        one transaction. A tick is claimed by moving the stored `next_tick` on,
+        if it still has the value this worker saw; returns the claimed ids. The
+        others were fired by another worker, or their schedule was changed or
+        deleted meanwhile.
+        """
+        claimed = set()
+        with self._lock:
+            db = self._db()
+            for schedule_id, tick, following in ticks:
+                if db.execute('UPDATE schedules SET next_tick = ? WHERE schedule_id = ? AND next_tick = ?', (following, schedule_id, tick)).rowcount == 1:
+                    claimed.add(schedule_id)
+            db.commit()
+        return claimed
+
+    def save(self, schedule: Schedule) -> None:
+        row = [getattr(schedule, column) for column in _COLUMNS]
+        row[_COLUMNS.index('inputs')] = json.dumps(schedule.inputs)
+        with self._lock:
+            db = self._db()
+            db.execute(f'INSERT OR REPLACE INTO schedules VALUES ({", ".join("?" * len(_COLUMNS))})', row)
+            db.commit()
+        schedule.saved_counts = (row[_COLUMNS.index('runs')], row[_COLUMNS.index('skipped')])
+
+    def save_state(self, schedules: List[Schedule]) -> None:
+        """Write the run state of many schedules in one transaction"""
+        rows = []
+        counts = []
+        for schedule in schedules:
+            runs, skipped = schedule.runs, schedule.skipped
+            saved_runs, saved_skipped = schedule.saved_counts
+            rows.append([getattr(schedule, column) for column in _RUN_COLUMNS] + [runs - saved_runs, skipped - saved_skipped, schedule.schedule_id])
+            counts.append((runs, skipped))
+        with self._lock:
+            db = self._db()
+            db.executemany(f'UPDATE schedules SET {", ".join(f"{column} = ?" for column in _RUN_COLUMNS)}, runs = runs + ?, skipped = skipped + ? WHERE schedule_id = ?', rows)
+            db.commit()
+        for schedule, saved in zip(schedules, counts, strict=True):
+            schedule.saved_counts = saved
+
+    def delete(self, schedule_ids: List[str]) -> None:
+        with self._lock:
+            db = self._db()
+            db.executemany('DELETE FROM schedules WHERE schedule_id = ?', [(schedule_id,) for schedule_id in schedule_ids])
+            db.commit()
+
+
+# Runs a schedule's pipeline once; returns (status, run_id) or raises
+Runner = Callable[[Schedule], Awaitable[Tuple[str, Optional[str]]]]
+
+
+class Scheduler:
+    """Fires schedules from a heap ordered by due time and runs their pipelines"""
+
+    def __init__(self, store: ScheduleStore, runner: Optional[Runner] = None, max_concurrent_runs: int = SCHEDULE_MAX_CONCURRENT_RUNS, enabled: bool = SCHEDULER_ENABLED):
+        self.store = store
+        self.runner = runner
+        self.max_concurrent_runs = max_concurrent_runs
+        # When disabled, schedules can be managed and triggered by hand but don't fire
+        self.enabled = enabled
+        self._schedules: Dict[str, Schedule] = {}
+        # (due, seq, schedule_id); entries whose seq isn't the schedule's current one are stale
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._started = False
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._runs: Set[asyncio.Task] = set()
+        self._dirty: Set[str] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.ticks = 0
+        self.missed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._lags: Deque[float] = deque(maxlen=LAG_SAMPLES)
+
+    async def start(self) -> None:
+        """Load the stored schedules and start firing them"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._started:
+                return
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrent_runs)
+            for schedule in await asyncio.to_thread(self.store.load):
+                self._schedules[schedule.schedule_id] = schedule
+                if schedule.enabled:
+                    schedule.seq = next(self._seq)
+                    self._heap.append((schedule.due, schedule.seq, schedule.schedule_id))
+            # Ticks missed while the server was down fire right away, under the schedules' policies
+            heapq.heapify(self._heap)
+            if self.enabled:
+                self._task = asyncio.get_running_loop().create_task(self._loop(), context=contextvars.Context())
+            self._started = True
+
+    async def stop(self) -> None:
+        if not self._started:
+            return
+        tasks = [task for task in (self._task, *self._runs) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._runs.clear()
+        self._started = False
+        await self.flush()
+
+    def _push(self, schedule: Schedule) -> None:
+        schedule.seq = next(self._seq)
+        heapq.heappush(self._heap, (schedule.due, schedule.seq, schedule.schedule_id))
+        # Drop stale entries once they outnumber live ones
+        if len(self._heap) > 2 * len(self._schedules) + 1024:
+            self._heap = [entry for entry in self._heap if entry[2] in self._schedules and self._schedules[entry[2]].seq == entry[1]]
+            heapq.heapify(self._heap)
+        if self._heap[0][1] == schedule.seq:
+            self._wakeup.set()
+
+    async def _loop(self) -> None:
+        while True:
+            now = time.time()
+            due: List[Tuple[Schedule, Tuple[int, float, float]]] = []
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, schedule_id = heapq.heappop(self._heap)
+                schedule = self._schedules.get(schedule_id)
+                if schedule is not None and schedule.seq == seq and schedule.enabled:
+                    due.append((schedule, self._ticks(schedule, now)))
+            if due:
+                await self._claim_and_fire(due, now)
+            self._wakeup.clear()
+            timeout = min(self._heap[0][0] - time.time(), MAX_SLEEP) if self._heap else MAX_SLEEP
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def _ticks(self, schedule: Schedule, now: float) -> Tuple[int, float, float]:
+        """`(ticks due, last of them, next tick after now)` for a due schedule"""
+        ticks = 1
+        last = schedule.next_tick
+        tick = schedule.rule.next_after(last)
+        while tick <= now and ticks <= MAX_CATCHUP_RUNS:
+            ticks += 1
+            last = tick
+            tick = schedule.rule.next_after(tick)
+        if tick <= now:
+            tick = schedule.rule.next_after(now)
+        return ticks, last, tick
+
+    async def _claim_and_fire(self, due: List[Tuple[Schedule, Tuple[int, float, float]]], now: float) -> None:
+        """Fire the due schedules whose ticks this worker claims; reload the others"""
+        claims = [(schedule.schedule_id, schedule.next_tick, ticks[2]) for schedule, ticks in due]
+        claimed = await asyncio.to_thread(self.store.claim, claims)
+        lost = []
+        for schedule, ticks in due:
+            # Removed or replaced while claiming: nothing to fire here
+            if self._schedules.get(schedule.schedule_id) is not schedule:
+                continue
+            if schedule.schedule_id in claimed:
+                self._fire(schedule, now, *ticks)
+            else:
+                lost.append(schedule)
+        if lost:
+            await self._reload(lost)
+
+    async def _reload(self, schedules: List[Schedule]) -> None:
+        """
+        Take over the stored state of schedules another worker fired, changed or
+        deleted; queued and running runs are kept.
+        """
+        # Write this worker's runs first, so run counts add up across workers
+        await self.flush()
+        stored = {schedule.schedule_id: schedule for schedule in await asyncio.to_thread(self.store.load_many, [schedule.schedule_id for schedule in schedules])}
+        for schedule in schedules:
+            if self._schedules.get(schedule.schedule_id) is not schedule:
+                continue
+            current = stored.get(schedule.schedule_id)
+            if current is None:
+                del self._schedules[schedule.schedule_id]
+                self._dirty.discard(schedule.schedule_id)
+                continue
+            for attribute in Schedule.__slots__:
+                if attribute not in ('pending', 'running', 'seq', 'due'):
+                    setattr(schedule, attribute, getattr(current, attribute))
+            schedule.due = schedule.next_tick + random.uniform(0, schedule.jitter) if schedule.jitter else schedule.next_tick
+            if schedule.enabled:
+                self._push(schedule)
+            else:
+                schedule.seq = -1
+
+    def _fire(self, schedule: Schedule, now: float, ticks: int, last: float, tick: float) -> None:
+        """Queue the runs owed for the claimed ticks up to `now` and schedule the next tick"""
+        lag = now - schedule.due
+        schedule.next_tick = tick
+        schedule.due = tick + random.uniform(0, schedule.jitter) if schedule.jitter else tick
+        self._push(schedule)
+
+        # Only the latest tick can still run on time
+        late = now - last > SCHEDULE_MISFIRE_GRACE + schedule.jitter
+        if schedule.missed == 'skip':
+            runs = 0 if late or schedule.running else 1
+        elif schedule.missed == 'once':
+            runs = 1
+        else:
+            runs = ticks
+        if ticks == 1:
+            self._lags.append(lag)
+        self.ticks += ticks
+        self._queue(schedule, runs, ticks)
+        self._mark_dirty(schedule)
+
+    def _queue(self, schedule: Schedule, runs: int, ticks: int) -> None:
+        cap = MAX_CATCHUP_RUNS if schedule.missed == 'all' else 1
+        before = schedule.pending
+        schedule.pending = min(schedule.pending + runs, max(cap, schedule.pending))
+        skipped = ticks - (schedule.pending - before)
+        if skipped > 0:
+            schedule.skipped += skipped
+            self.missed += skipped
+        if schedule.pending and not schedule.running:
+            self._spawn(schedule)
+
+    def _spawn(self, schedule: Schedule) -> None:
+        schedule.running = True
+        # Runs don't inherit the context of whoever started the scheduler
+        task = asyncio.get_running_loop().create_task(self._drain(schedule), context=contextvars.Context())
+        self._runs.add(task)
+        task.add_done_callback(self._runs.discard)
+
+    async def _drain(self, schedule: Schedule) -> None:
+        try:
+            while schedule.pending and self._schedules.get(schedule.schedule_id) is schedule:
+                schedule.pending -= 1
+                await self._run(schedule)
+        finally:
+            schedule.running = False
+
+    async def _run(self, schedule: Schedule) -> None:
+        async with self._slots:
+            started = time.time()
+            current_tick.set({'schedule_id': schedule.schedule_id, 'run': schedule.runs + 1, 'started': started})
+            try:
+                status, run_id = await self.runner(schedule)
+                error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                status, run_id, error = 'error', None, str(e)
+        schedule.runs += 1
+        schedule.last_run = started
+        schedule.last_status = status
+        schedule.last_error = error
+        schedule.last_run_id = run_id
+        if status == 'success':
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self._mark_dirty(schedule)
+
+    def _mark_dirty(self, schedule: Schedule) -> None:
+        self._dirty.add(schedule.schedule_id)
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(SCHEDULE_FLUSH_INTERVAL, lambda: loop.create_task(self.flush()))
+
+    async def flush(self) -> None:
+        """Write the state of schedules that ran since the last flush"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        dirty = [self._schedules[schedule_id] for schedule_id in self._dirty if schedule_id in self._schedules]
+        self._dirty.clear()
+        if dirty:
+            await asyncio.to_thread(self.store.save_state, dirty)
+
+    async def add(self, schedule: Schedule) -> Schedule:
+        """Store a new schedule, or replace one with the same id"""
+        await self.start()
+        existing = self._schedules.get(schedule.schedule_id)
+        if existing is not None:
+            # Keep the run history, and the next tick unless the rule changed
+            for column in _STATE_COLUMNS:
+                setattr(schedule, column, getattr(existing, column))
+            schedule.created = existing.created
+            if not schedule.same_rule(existing):
+                schedule.next_tick = schedule.rule.next_after(time.time())
+            schedule.due = existing.due if schedule.next_tick == existing.next_tick and schedule.jitter == existing.jitter else schedule.next_tick
+            schedule.pending, schedule.running = existing.pending, existing.running
+        await asyncio.to_thread(self.store.save, schedule)
+        self._schedules[schedule.schedule_id] = schedule
+        if schedule.enabled:
+            self._push(schedule)
+        else:
+            schedule.seq = -1
+        return schedule
+
+    async def remove(self, schedule_ids: List[str]) -> None:
+        await self.start()
+        for schedule_id in schedule_ids:
+            if schedule_id not in self._schedules:
+                raise ScheduleError(f'Unknown schedule: {schedule_id}')
+        await asyncio.to_thread(self.store.delete, schedule_ids)
+        for schedule_id in schedule_ids:
+            # Its heap entry goes stale and is skipped
+            del self._schedules[schedule_id]
+            self._dirty.discard(schedule_id)
+
+    async def sync_pipeline(self, pipeline_id: str, declared: List[Schedule]) -> List[Schedule]:
+        """Make the schedules declared by a pipeline's timer nodes the only ones it has"""
+        await self.start()
+        keep = {schedule.schedule_id for schedule in declared}
+        stale = [schedule.schedule_id for schedule in self._schedules.values() if schedule.pipeline_id == pipeline_id and schedule.node_id is not None and schedule.schedule_id not in keep]
+        if stale:
+            await self.remove(stale)
+        return [await self.add(schedule) for schedule in declared]
+
+    async def remove_pipeline(self, pipeline_id: str) -> int:
+        await self.start()
+        schedule_ids = [schedule.schedule_id for schedule in self._schedules.values() if schedule.pipeline_id == pipeline_id]
+        if schedule_ids:
+            await self.remove(schedule_ids)
+        return len(schedule_ids)
+
+    async def trigger(self, schedule_id: str) -> Schedule:
+        """Run a schedule now, after any run in progress, without changing its next tick"""
+        schedule = await self.get(schedule_id)
+        schedule.pending += 1
+        if not schedule.running:
+            self._spawn(schedule)
+        return schedule
+
+    async def get(self, schedule_id: str) -> Schedule:
+        await self.start()
+        schedule = self._schedules.get(schedule_id)
+        if schedule is None:
+            raise ScheduleError(f'Unknown schedule: {schedule_id}')
+        return schedule
+
+    async def list(self, pipeline_id: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Schedule]:
+        """Schedules by next run time"""
+        await self.start()
+        schedules = [schedule for schedule in self._schedules.values() if pipeline_id is None or schedule.pipeline_id == pipeline_id]
+        schedules.sort(key=lambda schedule: (not schedule.enabled, schedule.due))
+        return schedules[offset:offset + limit]
+
+    def stats(self) -> Dict[str, Any]:
+        enabled = sum(1 for schedule in self._schedules.values() if schedule.enabled)
+        next_due = min((entry[0] for entry in self._heap[:1]), default=None)
+        return {
+            'firing': self.enabled,
+            'total': len(self._schedules),
+            'enabled': enabled,
+            'heap_entries': len(self._heap),
+            'next_due_in': max(next_due - time.time(), 0.0) if next_due is not None else None,
+            'running': sum(1 for schedule in self._schedules.values() if schedule.running),
+            'pending_runs': sum(schedule.pending for schedule in self._schedules.values()),
+            'ticks': self.ticks,
+            'missed': self.missed,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'lag': {'p50': percentile(self._lags, 0.5), 'p99': percentile(self._lags, 0.99)}
+        }
+
+
+scheduler = Scheduler(ScheduleStore())
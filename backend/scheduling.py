@@ -0,0 +1,139 @@
+# trunk-ignore-all(black)
+"""
+Order in which ready nodes start when worker slots are limited.
+
+With `max_concurrency` slots, picking the next ready node decides the total run
+time. The 'critical_path' policy starts the node with the longest estimated
+path to the end of the pipeline first: its upward rank, i.e. its own cost plus
+the most expensive chain of nodes after it. 'fifo' starts nodes in topological
+order, as the sequential executor does.
+
+Costs are estimated per node type from an exponentially weighted moving average
+of observed execution times, seeded from the run history.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import heapq
+import os
+
+# Concurrent nodes per run when the pipeline doesn't set max_concurrency
+PIPELINE_MAX_CONCURRENCY = int(os.getenv('PIPELINE_MAX_CONCURRENCY', '1'))
+
+# Weight of the newest observation in the per-type cost average
+COST_EWMA_ALPHA = float(os.getenv('SCHEDULER_COST_ALPHA', '0.2'))
+
+SCHEDULING_POLICIES = ('fifo', 'critical_path')
+
+# Seconds assumed for node kinds that haven't been observed yet
+DEFAULT_COST_SECONDS = {
+    'input': 0.1,
+    'text': 0.1,
+    'llm': 2.0,
+    'output': 0.2,
+    'calculator': 0.1,
+    'timer': 1.0,
+    'filter': 0.1,
+    'notification': 0.2,
+    'dataformat': 0.1,
+    'map': 1.0,
+    'composite': 1.0,
+    'generic': 0.2,
+}
+
+
+class CostModel:
+    """Moving average of execution time per node type"""
+
+    def __init__(self, alpha: float = COST_EWMA_ALPHA):
+        self.alpha = alpha
+        self._costs: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+
+    def observe(self, node_type: str, seconds: float) -> None:
+        cost = self._costs.get(node_type)
+        self._costs[node_type] = seconds if cost is None else cost + self.alpha * (seconds - cost)
+        self._samples[node_type] = self._samples.get(node_type, 0) + 1
+
+    def seed(self, averages: Iterable[Tuple[str, float, int]]) -> None:
+        """Start from historical `(node_type, average seconds, count)`; live observations win"""
+        for node_type, seconds, count in averages:
+            if node_type not in self._costs and seconds is not None:
+                self._costs[node_type] = seconds
+                self._samples[node_type] = count
+
+    def estimate(self, node: Dict[str, Any], kind: str) -> float:
+        data = node.get('data', {})
+        # A delay timer costs what it says
+        if kind == 'timer' and data.get('mode', 'delay') == 'delay':
+            try:
+                return float(data.get('duration', 1000)) / 1000.0
+            except (TypeError, ValueError):
+                pass
+        cost = self._costs.get(node['type'])
+        if cost is None:
+            return DEFAULT_COST_SECONDS.get(kind, DEFAULT_COST_SECONDS['generic'])
+        return cost
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            node_type: {'estimate': round(cost, 6), 'samples': self._samples.get(node_type, 0)}
+            for node_type, cost in sorted(self._costs.items())
+        }
+
+
+def upward_ranks(order: List[str], successors: Dict[str, List[str]], costs: Dict[str, float]) -> Dict[str, float]:
+    """Cost of each node plus the most expensive path after it, in one reverse topological pass"""
+    ranks: Dict[str, float] = {}
+    for node_id in reversed(order):
+        ranks[node_id] = costs[node_id] + max((ranks[successor] for successor in successors.get(node_id, ())), default=0.0)
+    return ranks
+
+
+class ReadyQueue:
+    """
+    Nodes whose inputs are available. Pops the highest rank first when ranks are
+    given (ties in topological order), otherwise in topological order.
+    """
+
+    def __init__(self, order: List[str], ranks: Optional[Dict[str, float]] = None):
+        self._position = {node_id: position for position, node_id in enumerate(order)}
+        self._ranks = ranks
+        self._heap: List[Tuple[float, int, str]] = []
+
+    def push(self, node_id: str) -> None:
+        rank = -self._ranks[node_id] if self._ranks is not None else 0.0
+        heapq.heappush(self._heap, (rank, self._position[node_id], node_id))
+
+    def pop(self) -> str:
+        return heapq.heappop(self._heap)[2]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+def simulate(order: List[str], successors: Dict[str, List[str]], costs: Dict[str, float], workers: int, policy: str) -> float:
+    """Makespan of running the DAG on `workers` slots with a scheduling policy"""
+    ranks = upward_ranks(order, successors, costs) if policy == 'critical_path' else None
+    waiting = dict.fromkeys(order, 0)
+    for node_id in order:
+        for successor in successors.get(node_id, ()):
+            waiting[successor] += 1
+
+    ready = ReadyQueue(order, ranks)
+    for node_id in order:
+        if waiting[node_id] == 0:
+            ready.push(node_id)
+
+    now = 0.0
+    running: List[Tuple[float, int, str]] = []
+    started = 0
+    while ready or running:
+        while ready and len(running) < workers:
+            node_id = ready.pop()
+            heapq.heappush(running, (now + costs[node_id], started, node_id))
+            started += 1
+        now, _, node_id = heapq.heappop(running)
+        for successor in successors.get(node_id, ()):
+            waiting[successor] -= 1
+            if waiting[successor] == 0:
+                ready.push(successor)
+    return now
@@ -0,0 +1,262 @@
+# trunk-ignore-all(black)
+"""
+Incremental readers for structured text inputs (JSON arrays, NDJSON and CSV).
+
+Records are parsed lazily from either an in-memory string or a text stream so
+large inputs can flow through the pipeline without building the whole
+structure up front.
+"""
+from typing import Any, Dict, Iterator, Optional, TextIO, Union
+from contextlib import nullcontext
+import csv
+import json
+
+# Only this many characters are inspected when guessing the format of an input
+SNIFF_PREFIX_SIZE = 4096
+
+# Characters read per refill when decoding a JSON array from a stream
+READ_CHUNK_SIZE = 64 * 1024
+
+STREAMABLE_FORMATS = ('json_array', 'ndjson', 'csv')
+CSV_DELIMITERS = ',;\t|'
+
+TextSource = Union[str, TextIO]
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def sniff_format(prefix: str, complete: bool = False) -> Dict[str, Any]:
+    """
+    Guess the format of a text input from a bounded prefix.
+
+    `complete` tells the sniffer that `prefix` is the whole input, which lets it
+    tell a single JSON object apart from newline-delimited JSON.
+    """
+    sample = prefix[:SNIFF_PREFIX_SIZE].lstrip()
+    if not sample:
+        return {'format': 'text'}
+
+    if sample[0] == '[':
+        return {'format': 'json_array'}
+
+    if sample[0] == '{':
+        first_line, newline, rest = sample.partition('\n')
+        if newline and rest.lstrip().startswith('{'):
+            try:
+                json.loads(first_line)
+                return {'format': 'ndjson'}
+            except ValueError:
+                pass
+        if complete and not sample.rstrip().endswith('}'):
+            return {'format': 'text'}
+        return {'format': 'json'}
+
+    if '\n' in sample and any(d in sample for d in CSV_DELIMITERS):
+        lines = sample.splitlines()
+        # Drop a possibly truncated last line before handing it to the sniffer
+        if not complete and len(lines) > 1:
+            lines = lines[:-1]
+        try:
+            dialect = csv.Sniffer().sniff('\n'.join(lines), delimiters=CSV_DELIMITERS)
+            return {'format': 'csv', 'delimiter': dialect.delimiter}
+        except csv.Error:
+            if ',' in sample:
+                return {'format': 'csv', 'delimiter': ','}
+
+    return {'format': 'text'}
+
+
+def iter_lines(source: TextSource) -> Iterator[str]:
+    """Yield lines (with line endings) without copying a string source"""
+    if not isinstance(source, str):
+        yield from source
+        return
+
+    start = 0
+    length = len(source)
+    while start < length:
+        end = source.find('\n', start)
+        if end == -1:
+            yield source[start:]
+            return
+        yield source[start:end + 1]
+        start = end + 1
+
+
+def iter_ndjson(source: TextSource) -> Iterator[Any]:
+    """Yield one decoded value per non-blank line"""
+    for line_number, line in enumerate(iter_lines(source), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid NDJSON on line {line_number}: {e.msg}') from e
+
+
+def iter_csv(source: TextSource, delimiter: str = ',') -> Iterator[Dict[str, str]]:
+    """Yield one dict per CSV row, keyed by the header row"""
+    yield from csv.DictReader(iter_lines(source), delimiter=delimiter)
+
+
+def iter_json_array(source: TextSource) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array one at a time"""
+    if isinstance(source, str):
+        yield from _iter_json_array_text(source)
+    else:
+        yield from _iter_json_array_stream(source)
+
+
+def _skip_whitespace(text: str, idx: int) -> int:
+    while idx < len(text) and text[idx] in _WHITESPACE:
+        idx += 1
+    return idx
+
+
+# What the array readers expect next: the opening bracket, the first element or
+# the closing bracket, an element after a comma, or a comma or the closing bracket
+_OPEN, _FIRST, _ELEMENT, _AFTER = range(4)
+
+
+def _array_token(state: int, char: str) -> int:
+    """
+    State after the structural character `char`, or -1 if `char` starts an
+    element where one is expected; raises for anything out of place.
+    """
+    if state == _OPEN:
+        if char != '[':
+            raise ValueError('Expected a JSON array')
+        return _FIRST
+    if state == _AFTER:
+        if char == ',':
+            return _ELEMENT
+        if char == ']':
+            return _OPEN
+        raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+    if char == ']':
+        if state == _ELEMENT:
+            raise ValueError("Expected a value after ',' in JSON array")
+        return _OPEN
+    if char == ',':
+        raise ValueError("Expected a value in JSON array, got ','")
+    return -1
+
+
+def _iter_json_array_text(text: str) -> Iterator[Any]:
+    state = _OPEN
+    idx = 0
+    while True:
+        idx = _skip_whitespace(text, idx)
+        if idx >= len(text):
+            raise ValueError('Unterminated JSON array' if state != _OPEN else 'Expected a JSON array')
+        following = _array_token(state, text[idx])
+        if following == _OPEN:
+            return
+        if following != -1:
+            state = following
+            idx += 1
+            continue
+        value, idx = _decoder.raw_decode(text, idx)
+        state = _AFTER
+        yield value
+
+
+def _iter_json_array_stream(stream: TextIO) -> Iterator[Any]:
+    buffer = ''
+    eof = False
+    state = _OPEN
+    read_size = READ_CHUNK_SIZE
+
+    while True:
+        buffer = buffer[_skip_whitespace(buffer, 0):]
+
+        if not buffer:
+            if eof:
+                raise ValueError('Unterminated JSON array' if state != _OPEN else 'Expected a JSON array')
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer = chunk
+            continue
+
+        following = _array_token(state, buffer[0])
+        if following == _OPEN:
+            return
+        if following != -1:
+            state = following
+            buffer = buffer[1:]
+            continue
+
+        try:
+            value, end = _decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = None
+
+        # A value that runs to the end of the buffer may be a truncated number
+        # or literal, so only accept it once more input has been seen
+        if end is None or (end == len(buffer) and not eof):
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer += chunk
+            # Grow the read size so one huge element isn't re-decoded per chunk
+            read_size = min(read_size * 2, 64 * READ_CHUNK_SIZE)
+            continue
+
+        read_size = READ_CHUNK_SIZE
+        buffer = buffer[end:]
+        state = _AFTER
+        yield value
+
+
+class RecordStream:
+    """
+    Re-iterable, lazily parsed sequence of records.
+
+    Each iteration re-reads the source, so several downstream nodes can consume
+    the same stream without the parsed records ever being held in memory at once.
+    """
+    __slots__ = ('source', 'format', 'delimiter')
+
+    def __init__(self, source: Any, format: str, delimiter: str = ','):
+        if format not in STREAMABLE_FORMATS:
+            raise ValueError(f'Unsupported record format: {format}')
+        self.source = source
+        self.format = format
+        self.delimiter = delimiter
+
+    def _open(self):
+        if isinstance(self.source, str):
+            return nullcontext(self.source)
+        return self.source.open_text()
+
+    def __iter__(self) -> Iterator[Any]:
+        with self._open() as text:
+            if self.format == 'json_array':
+                yield from iter_json_array(text)
+            elif self.format == 'ndjson':
+                yield from iter_ndjson(text)
+            else:
+                yield from iter_csv(text, self.delimiter)
+
+    def to_jsonable(self) -> list:
+        return list(self)
+
+    def __repr__(self) -> str:
+        return f'RecordStream(format={self.format!r})'
+
+
+def record_stream_for(text: Any, format_info: Optional[Dict[str, Any]] = None) -> Optional[RecordStream]:
+    """
+    Wrap `text` in a RecordStream when its (sniffed) format is streamable.
+
+    `text` may also be any object with an `open_text()` method, such as an
+    uploaded file handle; pass `format_info` in that case.
+    """
+    if format_info is None:
+        format_info = sniff_format(text[:SNIFF_PREFIX_SIZE], complete=len(text) <= SNIFF_PREFIX_SIZE)
+    if format_info['format'] not in STREAMABLE_FORMATS:
+        return None
+    return RecordStream(text, format_info['format'], format_info.get('delimiter', ','))
@@ -0,0 +1,280 @@
+# trunk-ignore-all(black)
+"""
+Columnar table used as the tabular data interchange between nodes.
+
+Rows share a single schema and values are stored per column in typed arrays
+(`array('q')` for integers, `array('d')` for floats, plain lists otherwise), so
+key strings are not repeated for every row. Each column has one type: a column
+whose values aren't all numbers holds text, and missing values are NaN in float
+columns, None in text columns and flagged in a null mask in integer columns.
+Tables are only turned back into lists of dicts when they are serialized to JSON.
+"""
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import math
+import re
+
+INT = 'int'
+FLOAT = 'float'
+STR = 'str'
+
+NUMERIC_TYPES = (INT, FLOAT)
+
+# Plain decimal numbers only; float() would also take "nan", "Inf" or "1_000"
+_NUMBER = re.compile(r'-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+# Source texts kept per column for numbers such as '1.50' that print differently,
+# so they read back the same if the column turns out to be text; beyond this,
+# such numbers are written the way Python prints them
+MAX_SOURCE_TEXTS = 4096
+
+
+class Schema:
+    """Column names and types shared by every row of a table"""
+    __slots__ = ('names', 'types', 'index')
+
+    def __init__(self, names: Iterable[str], types: Iterable[str]):
+        self.names = tuple(names)
+        self.types = tuple(types)
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+    def to_jsonable(self) -> List[Dict[str, str]]:
+        return [{'name': name, 'type': dtype} for name, dtype in zip(self.names, self.types, strict=True)]
+
+    def __repr__(self) -> str:
+        return f"Schema({', '.join(f'{n}:{t}' for n, t in zip(self.names, self.types, strict=True))})"
+
+
+class _ColumnBuilder:
+    """Appends values to the narrowest column type that can hold them all"""
+    __slots__ = ('dtype', 'values', 'nulls', 'texts')
+
+    def __init__(self, backfill: int = 0):
+        self.dtype = INT
+        self.values = array('q')
+        # 1 for each missing value while the column holds integers, once there is one
+        self.nulls: Optional[bytearray] = None
+        # Source text of numbers that wouldn't be written back the same way
+        # (e.g. '1.50'), in case the column turns out to hold text
+        self.texts: Optional[Dict[int, str]] = None
+        for _ in range(backfill):
+            self.append(None)
+
+    def append(self, value: Any) -> None:
+        text = None
+        if isinstance(value, str):
+            if self.dtype == STR:
+                self.values.append(value if value.strip() else None)
+                return
+            text = value
+            value = _parse_scalar(value)
+            if isinstance(value, str):
+                self._promote(STR)
+                self.values.append(value)
+                return
+            if value is not None and _text(value) != text:
+                if self.texts is None:
+                    self.texts = {}
+                if len(self.texts) < MAX_SOURCE_TEXTS:
+                    self.texts[len(self.values)] = text
+        elif self.dtype == STR:
+            # Numbers in a text column become text too
+            self.values.append(_text(value))
+            return
+
+        if self.dtype == INT:
+            if value is None:
+                if self.nulls is None:
+                    self.nulls = bytearray(len(self.values))
+                self.nulls.append(1)
+                self.values.append(0)
+                return
+            if isinstance(value, int) and not isinstance(value, bool):
+                try:
+                    self.values.append(value)
+                    if self.nulls is not None:
+                        self.nulls.append(0)
+                    return
+                except OverflowError:
+                    pass
+            self._promote(FLOAT if isinstance(value, float) else STR)
+
+        if self.dtype == FLOAT:
+            if value is None:
+                self.values.append(math.nan)
+                return
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.values.append(float(value))
+                return
+            self._promote(STR)
+
+        self.values.append(text if text is not None else _text(value))
+
+    def _promote(self, dtype: str) -> None:
+        nulls = self.nulls
+        if dtype == FLOAT:
+            values = array('d', self.values)
+            if nulls is not None:
+                for i in _set_indices(nulls):
+                    values[i] = math.nan
+        else:
+            values = [_text(_unbox(self.dtype, v)) for v in self.values]
+            if nulls is not None:
+                for i in _set_indices(nulls):
+                    values[i] = None
+            for i, text in (self.texts or {}).items():
+                values[i] = text
+            self.texts = None
+        self.values = values
+        self.nulls = None
+        self.dtype = dtype
+
+
+def _set_indices(mask: bytearray) -> Iterator[int]:
+    i = mask.find(1)
+    while i != -1:
+        yield i
+        i = mask.find(1, i + 1)
+
+
+def _text(value: Any) -> Any:
+    """A number as text, whole floats without '.0'; other values are kept"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e16:
+        return str(int(value))
+    return str(value)
+
+
+def _parse_scalar(value: str) -> Any:
+    """Infer a number from CSV-style text, keeping identifiers like '007' as text"""
+    text = value.strip()
+    if not text:
+        return None
+    if text != value or not _NUMBER.fullmatch(text):
+        return value
+    digits = text.lstrip('-')
+    if digits.isdigit():
+        if len(digits) > 1 and digits[0] == '0':
+            return value
+        return int(text)
+    number = float(text)
+    # Overflowing exponents such as 1e999 stay text
+    return number if math.isfinite(number) else value
+
+
+def _unbox(dtype: str, value: Any) -> Any:
+    if dtype == FLOAT and value != value:
+        return None
+    return value
+
+
+class Table:
+    """Record batch with a shared schema and one typed array per column"""
+    __slots__ = ('schema', 'columns', 'num_rows', 'nulls')
+
+    def __init__(self, schema: Schema, columns: List[Any], num_rows: int, nulls: Optional[List[Optional[bytearray]]] = None):
+        self.schema = schema
+        self.columns = columns
+        self.num_rows = num_rows
+        # Per column, the null mask of an integer column with missing values, else None
+        self.nulls = nulls if nulls is not None else [None] * len(columns)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Any]) -> 'Table':
+        """Build a table from an iterable of dicts (or scalars) in one pass"""
+        names: List[str] = []
+        builders: Dict[str, _ColumnBuilder] = {}
+        num_rows = 0
+
+        for record in records:
+            if not isinstance(record, dict):
+                record = {'value': record}
+            for key in record:
+                if key not in builders:
+                    names.append(key)
+                    builders[key] = _ColumnBuilder(backfill=num_rows)
+            for key in names:
+                builders[key].append(record.get(key))
+            num_rows += 1
+
+        schema = Schema(names, (builders[name].dtype for name in names))
+        return cls(schema, [builders[name].values for name in names], num_rows, [builders[name].nulls for name in names])
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def column(self, name: str) -> Any:
+        return self.columns[self.schema.index[name]]
+
+    def numeric_columns(self) -> List[Tuple[str, array]]:
+        """Numeric columns as float arrays, with NaN for missing values"""
+        columns = []
+        for name, dtype, column, nulls in zip(self.schema.names, self.schema.types, self.columns, self.nulls, strict=True):
+            if dtype == FLOAT:
+                columns.append((name, column))
+            elif dtype == INT:
+                column = array('d', column)
+                if nulls is not None:
+                    for i in _set_indices(nulls):
+                        column[i] = math.nan
+                columns.append((name, column))
+        return columns
+
+    def numeric_values(self, names: Optional[Iterable[str]] = None) -> array:
+        """Concatenate numeric columns into one float array, skipping missing values"""
+        values = array('d')
+        selected = set(names) if names is not None else None
+        for name, column in self.numeric_columns():
+            if selected is not None and name not in selected:
+                continue
+            values.extend(v for v in column if v == v)
+        return values
+
+    def present(self, name: str) -> Iterator[Any]:
+        """Values of a column, with None for missing ones"""
+        i = self.schema.index[name]
+        column, nulls = self.columns[i], self.nulls[i]
+        if self.schema.types[i] == FLOAT:
+            return (None if v != v else v for v in column)
+        if nulls is not None:
+            return (None if null else v for v, null in zip(column, nulls, strict=True))
+        return iter(column)
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """Yield rows as dicts; only used at the JSON/CSV boundary"""
+        names = self.schema.names
+        for values in zip(*(self.present(name) for name in names), strict=True):
+            yield dict(zip(names, values, strict=True))
+
+    __iter__ = rows
+
+    def take(self, mask: Iterable[bool]) -> 'Table':
+        """Return a new table with the rows whose mask entry is true"""
+        indices = [i for i, keep in enumerate(mask) if keep]
+        columns = []
+        for column in self.columns:
+            if isinstance(column, array):
+                columns.append(array(column.typecode, (column[i] for i in indices)))
+            else:
+                columns.append([column[i] for i in indices])
+        nulls = [bytearray(column_nulls[i] for i in indices) if column_nulls is not None else None for column_nulls in self.nulls]
+        return Table(self.schema, columns, len(indices), nulls)
+
+    def to_jsonable(self) -> List[Dict[str, Any]]:
+        return list(self.rows())
+
+    def __repr__(self) -> str:
+        return f'Table({self.num_rows} rows, {self.schema!r})'
+
+
+def find_table(value: Any, depth: int = 2) -> Optional[Table]:
+    """Locate a table in a node output, looking a couple of dict levels deep"""
+    if isinstance(value, Table):
+        return value
+    if depth and isinstance(value, dict):
+        for item in value.values():
+            table = find_table(item, depth - 1)
+            if table is not None:
+                return table
+    return None
@@ -0,0 +1,93 @@
+# trunk-ignore-all(black)
+"""
+Compiled templates for text node variable substitution.
+
+A template is split once into literal text and placeholders, and rendered by
+joining the pieces, so rendering is linear in the size of the template and its
+output however many variables it has. Placeholders are `{{path}}` with a dotted
+path such as `{{input_1.value}}` or `{{customInput-1.value}}`, and the legacy
+`{input}` and `$input`. Compiled templates are cached by their text.
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple, Union
+import os
+import re
+
+# Compiled templates kept, by template text; longer templates are compiled per use
+TEMPLATE_CACHE_SIZE = int(os.getenv('TEMPLATE_CACHE_SIZE', '256'))
+TEMPLATE_CACHE_MAX_LENGTH = int(os.getenv('TEMPLATE_CACHE_MAX_LENGTH', str(64 * 1024)))
+
+_PLACEHOLDER = re.compile(r'\{\{\s*([\w-]+(?:\.[\w-]+)*)\s*\}\}|\{input\}|\$input\b')
+
+_MISSING = object()
+
+# A literal, or (path, placeholder text to keep when the path doesn't resolve)
+Segment = Union[str, Tuple[Tuple[str, ...], str]]
+
+
+def display(value: Any) -> str:
+    """Text for a substituted value; node outputs show their `value` (or `content`)"""
+    if isinstance(value, dict):
+        value = value.get('value', value.get('content', value))
+    return str(value)
+
+
+def resolve(context: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    value = context.get(path[0], _MISSING)
+    for key in path[1:]:
+        if isinstance(value, dict):
+            value = value.get(key, _MISSING)
+        elif isinstance(value, (list, tuple)) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return _MISSING
+    return value
+
+
+class Template:
+    """A template split into literal and placeholder segments"""
+    __slots__ = ('text', 'segments', 'variables')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.segments: List[Segment] = []
+        # Dotted paths of the {{...}} placeholders, in order of appearance
+        self.variables: List[str] = []
+        position = 0
+        for match in _PLACEHOLDER.finditer(text):
+            if match.start() > position:
+                self.segments.append(text[position:match.start()])
+            name = match.group(1)
+            if name is not None:
+                self.variables.append(name)
+            self.segments.append((tuple((name or 'input').split('.')), match.group(0)))
+            position = match.end()
+        if position < len(text):
+            self.segments.append(text[position:])
+
+    def render(self, context: Dict[str, Any]) -> str:
+        """Substitute every placeholder whose path resolves in `context`; others are kept as written"""
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+                continue
+            path, placeholder = segment
+            value = resolve(context, path)
+            parts.append(placeholder if value is _MISSING else display(value))
+        return ''.join(parts)
+
+    def __repr__(self) -> str:
+        return f'Template({len(self.segments)} segments, {len(self.variables)} variables)'
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _cached_template(text: str) -> Template:
+    return Template(text)
+
+
+def compile_template(text: str) -> Template:
+    """Compile a template, cached by its text unless it is very long"""
+    if len(text) > TEMPLATE_CACHE_MAX_LENGTH:
+        return Template(text)
+    return _cached_template(text)
@@ -0,0 +1,285 @@
+# trunk-ignore-all(black)
+"""
+Tenants and fair sharing of execution capacity between them.
+
+Requests name their tenant in the X-Tenant-ID header. Runs waiting for
+admission and nodes waiting for a slot in their pool are queued per tenant and
+served by deficit round robin, weighted per tenant. A tenant submitting large
+batches then only gets its share, while small interactive pipelines of other
+tenants keep their latency. Tenants can also be capped in concurrent pipelines
+and concurrent nodes.
+
+Weights and caps are `tenant=value` lists, e.g. `TENANT_WEIGHTS="ui=4,batch=1"`.
+"""
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+import math
+import os
+import re
+
+TENANT_HEADER = 'x-tenant-id'
+DEFAULT_TENANT = 'default'
+
+_TENANT_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# Tenant of the running pipeline; copied into the tasks it starts
+current_tenant: ContextVar[str] = ContextVar('current_tenant', default=DEFAULT_TENANT)
+
+# Recent run latencies kept per tenant for the percentiles
+LATENCY_SAMPLES = 1024
+
+# Tenants whose statistics are kept; beyond this, idle tenants without settings
+# are forgotten, oldest first (tenant ids come from a request header)
+TENANT_STATS_MAX = int(os.getenv('TENANT_STATS_MAX', '1024'))
+
+
+class TenantError(Exception):
+    """Raised for malformed tenant ids"""
+
+
+def parse_tenant_values(spec: str) -> Dict[str, float]:
+    values = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        tenant, _, value = item.partition('=')
+        try:
+            values[tenant.strip()] = float(value)
+        except ValueError as e:
+            raise ValueError(f'Invalid tenant setting {item!r}; expected tenant=value') from e
+    return values
+
+
+TENANT_WEIGHTS = parse_tenant_values(os.getenv('TENANT_WEIGHTS', ''))
+
+# Concurrent pipelines / nodes per tenant, by default and per tenant (0: no cap)
+TENANT_MAX_PIPELINES = int(os.getenv('TENANT_MAX_PIPELINES', '0'))
+TENANT_MAX_NODES = int(os.getenv('TENANT_MAX_NODES', '0'))
+TENANT_PIPELINE_CAPS = parse_tenant_values(os.getenv('TENANT_PIPELINE_CAPS', ''))
+TENANT_NODE_CAPS = parse_tenant_values(os.getenv('TENANT_NODE_CAPS', ''))
+
+
+def tenant_id(header: Optional[str]) -> str:
+    """Tenant named by the request header, or the default tenant"""
+    if not header:
+        return DEFAULT_TENANT
+    tenant = header.strip()
+    if not _TENANT_PATTERN.match(tenant):
+        raise TenantError(f'Invalid tenant id: {tenant!r}')
+    return tenant
+
+
+def percentile(samples: Any, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class FairQueue:
+    """
+    Per-tenant FIFO queues served by deficit round robin.
+
+    Each turn a tenant earns `quantum * weight` of credit and is served while
+    its credit covers the cost of its oldest item, so tenants share capacity in
+    proportion to their weights whatever the cost of their items. Tenants that
+    may not start anything (e.g. at their cap) are passed over without earning
+    credit, and rounds in which nobody could be served are skipped in one step.
+    """
+
+    def __init__(self, quantum: float, weight: Callable[[str], float]):
+        self.quantum = quantum
+        self._weight = weight
+        self._queues: Dict[str, Deque[Tuple[Any, float]]] = {}
+        self._deficit: Dict[str, float] = {}
+        self._rotation: Deque[str] = deque()
+        # Whether the tenant at the head of the rotation got its credit for this turn
+        self._credited = False
+        self._size = 0
+
+    def push(self, tenant: str, item: Any, cost: float) -> None:
+        queue = self._queues.get(tenant)
+        if queue is None:
+            queue = self._queues[tenant] = deque()
+            self._deficit[tenant] = 0.0
+            self._rotation.append(tenant)
+        queue.append((item, cost))
+        self._size += 1
+
+    def remove(self, tenant: str, item: Any) -> None:
+        queue = self._queues.get(tenant)
+        if queue is None:
+            return
+        for entry in queue:
+            if entry[0] is item:
+                queue.remove(entry)
+                self._size -= 1
+                break
+        if not queue:
+            self._drop(tenant)
+
+    def _drop(self, tenant: str) -> None:
+        if self._rotation[0] == tenant:
+            self._credited = False
+        del self._queues[tenant]
+        del self._deficit[tenant]
+        self._rotation.remove(tenant)
+
+    def _next_turn(self) -> None:
+        self._rotation.rotate(-1)
+        self._credited = False
+
+    def _skip_rounds(self, can_start: Callable[[str, float], bool]) -> None:
+        """
+        After a whole round without serving anyone, credit the eligible tenants
+        for the rounds it takes until the first of them can be served, at once
+        rather than a round per call (costs can be many quanta).
+        """
+        rounds: Dict[str, float] = {}
+        for tenant in self._rotation:
+            cost = self._queues[tenant][0][1]
+            if can_start(tenant, cost):
+                rounds[tenant] = (cost - self._deficit[tenant]) / (self.quantum * self._weight(tenant))
+        if not rounds:
+            return
+        first = min(rounds, key=rounds.get)
+        # Each tenant still earns its own credit on its next turn
+        skipped = max(math.ceil(rounds[first]) - 1, 0)
+        for tenant in rounds:
+            self._deficit[tenant] += skipped * self.quantum * self._weight(tenant)
+        # Guard against rounding: the first tenant's next turn must cover its item
+        cost = self._queues[first][0][1]
+        self._deficit[first] = max(self._deficit[first], cost - self.quantum * self._weight(first))
+
+    def peek(self, can_start: Callable[[str, float], bool]) -> Optional[Tuple[str, Any, float]]:
+        """Next `(tenant, item, cost)` by DRR among tenants allowed to start one, if any"""
+        blocked = 0
+        unserved = 0
+        while self._rotation and blocked < len(self._rotation):
+            tenant = self._rotation[0]
+            item, cost = self._queues[tenant][0]
+            if not can_start(tenant, cost):
+                blocked += 1
+                self._next_turn()
+                continue
+            blocked = 0
+            if not self._credited:
+                self._deficit[tenant] += self.quantum * self._weight(tenant)
+                self._credited = True
+            if self._deficit[tenant] >= cost:
+                return tenant, item, cost
+            self._next_turn()
+            unserved += 1
+            if unserved >= len(self._rotation):
+                self._skip_rounds(can_start)
+                unserved = 0
+        return None
+
+    def pop_head(self) -> None:
+        """Remove the item returned by the last `peek`"""
+        tenant = self._rotation[0]
+        queue = self._queues[tenant]
+        _, cost = queue.popleft()
+        self._size -= 1
+        self._deficit[tenant] -= cost
+        if not queue:
+            self._drop(tenant)
+
+    def pop(self, can_start: Callable[[str, float], bool]) -> Optional[Tuple[str, Any, float]]:
+        entry = self.peek(can_start)
+        if entry is not None:
+            self.pop_head()
+        return entry
+
+    def queued(self, tenant: str) -> int:
+        queue = self._queues.get(tenant)
+        return len(queue) if queue is not None else 0
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class TenantStats:
+    __slots__ = ('pipelines', 'nodes', 'completed', 'rejected', 'latencies')
+
+    def __init__(self):
+        self.pipelines = 0
+        self.nodes = 0
+        self.completed = 0
+        self.rejected = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+
+class Tenants:
+    """Weights, caps and running counts per tenant"""
+
+    def __init__(self, weights: Dict[str, float] = TENANT_WEIGHTS, max_pipelines: int = TENANT_MAX_PIPELINES, max_nodes: int = TENANT_MAX_NODES, pipeline_caps: Dict[str, float] = TENANT_PIPELINE_CAPS, node_caps: Dict[str, float] = TENANT_NODE_CAPS, max_stats: int = TENANT_STATS_MAX):
+        self.weights = weights
+        self.max_pipelines = max_pipelines
+        self.max_nodes = max_nodes
+        self.pipeline_caps = pipeline_caps
+        self.node_caps = node_caps
+        self.max_stats = max_stats
+        # Least recently used first
+        self._stats: 'OrderedDict[str, TenantStats]' = OrderedDict()
+        self.forgotten = 0
+
+    def stats_for(self, tenant: str) -> TenantStats:
+        stats = self._stats.get(tenant)
+        if stats is None:
+            stats = self._stats[tenant] = TenantStats()
+            if len(self._stats) > self.max_stats:
+                self._evict(tenant)
+        else:
+            self._stats.move_to_end(tenant)
+        return stats
+
+    def _configured(self, tenant: str) -> bool:
+        return tenant in self.weights or tenant in self.pipeline_caps or tenant in self.node_caps
+
+    def _evict(self, keep: str) -> None:
+        # Tenants with running pipelines or nodes keep their counts
+        idle = [tenant for tenant, stats in self._stats.items() if not stats.pipelines and not stats.nodes and tenant != keep and not self._configured(tenant)]
+        for tenant in idle:
+            if len(self._stats) <= self.max_stats:
+                return
+            del self._stats[tenant]
+            self.forgotten += 1
+
+    def weight(self, tenant: str) -> float:
+        return max(self.weights.get(tenant, 1.0), 0.01)
+
+    def node_cap(self, tenant: str) -> int:
+        return int(self.node_caps.get(tenant, self.max_nodes))
+
+    def can_start_pipeline(self, tenant: str) -> bool:
+        cap = int(self.pipeline_caps.get(tenant, self.max_pipelines))
+        return cap <= 0 or self.stats_for(tenant).pipelines < cap
+
+    def can_start_node(self, tenant: str) -> bool:
+        cap = self.node_cap(tenant)
+        return cap <= 0 or self.stats_for(tenant).nodes < cap
+
+    def record_latency(self, tenant: str, seconds: float) -> None:
+        stats = self.stats_for(tenant)
+        stats.completed += 1
+        stats.latencies.append(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            tenant: {
+                'weight': self.weight(tenant),
+                'running_pipelines': stats.pipelines,
+                'running_nodes': stats.nodes,
+                'completed': stats.completed,
+                'rejected': stats.rejected,
+                'latency': {
+                    'avg': sum(stats.latencies) / len(stats.latencies) if stats.latencies else 0.0,
+                    'p50': percentile(stats.latencies, 0.5),
+                    'p99': percentile(stats.latencies, 0.99)
+                }
+            }
+            for tenant, stats in sorted(self._stats.items())
+        }
+
+
+tenants = Tenants()
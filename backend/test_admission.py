@@ -0,0 +1,93 @@
+# trunk-ignore-all(black)
+"""
+Tests for admission control of pipeline runs.
+
+    python -m pytest test_admission.py
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from admission import NODE_COST_WEIGHTS, AdmissionController, AdmissionRejected, pipeline_cost
+from tenants import Tenants
+
+
+def controller(**limits):
+    return AdmissionController(tenants=Tenants(), **limits)
+
+
+def test_pipeline_cost_weights_node_kinds():
+    assert pipeline_cost(['text', 'text']) == 2
+    assert pipeline_cost(['llm', 'text']) == NODE_COST_WEIGHTS['llm'] + 1
+
+
+def test_runs_over_the_limit_wait_their_turn():
+    admission = controller(max_pipelines=1, max_queue=5, queue_timeout=5)
+    order = []
+
+    async def run(name):
+        async with admission.admit(1):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(run(name) for name in 'abc'))
+
+    asyncio.run(main())
+    assert order == ['a', 'b', 'c']
+    assert admission.stats()['admitted'] == 3
+    assert admission.stats()['running'] == 0
+
+
+def test_weighted_nodes_are_limited_too():
+    admission = controller(max_pipelines=10, max_nodes=10, max_queue=0)
+
+    async def main():
+        await admission.acquire(8)
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(3)
+        await admission.acquire(2)
+
+    asyncio.run(main())
+    assert admission.stats()['inflight_nodes'] == 10
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    admission = controller(max_pipelines=1, max_queue=0)
+
+    async def main():
+        await admission.acquire(1)
+        with pytest.raises(AdmissionRejected) as e:
+            await admission.acquire(1)
+        return e.value
+
+    rejection = asyncio.run(main())
+    assert rejection.retry_after >= 1
+    assert admission.stats()['rejected'] == {'queue_full': 1, 'queue_timeout': 0}
+
+
+def test_waiting_runs_time_out():
+    admission = controller(max_pipelines=1, max_queue=5, queue_timeout=0.05)
+
+    async def main():
+        await admission.acquire(1)
+        with pytest.raises(AdmissionRejected, match='Not admitted within'):
+            await admission.acquire(1)
+
+    asyncio.run(main())
+    assert admission.stats()['rejected']['queue_timeout'] == 1
+    assert admission.stats()['queued'] == 0
+
+
+def test_rejected_requests_get_503(monkeypatch):
+    admission = controller(max_pipelines=1, max_queue=0)
+    # As if a run were holding the only slot
+    admission.running = 1
+    monkeypatch.setattr(main, 'admission', admission)
+    nodes = [{'id': 'in', 'type': 'customInput', 'data': {'inputValue': 'x'}}]
+    with TestClient(main.app) as client:
+        response = client.post('/pipelines/parse', json={'nodes': nodes, 'edges': []}, headers={'cache-control': 'no-cache'})
+    assert response.status_code == 503
+    assert int(response.headers['retry-after']) >= 1
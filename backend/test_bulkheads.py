@@ -0,0 +1,91 @@
+# trunk-ignore-all(black)
+"""
+Tests for the per-node-kind concurrency pools.
+
+    python -m pytest test_bulkheads.py
+"""
+import asyncio
+
+import pytest
+
+from bulkheads import DEFAULT_POOL_LIMITS, Bulkhead, BulkheadFull, NodePools, parse_pool_limits
+from tenants import Tenants
+
+
+def test_parse_pool_limits():
+    limits = parse_pool_limits('llm=2:10, timer=5,custom=3')
+    assert limits['llm'] == (2, 10)
+    assert limits['timer'] == (5, DEFAULT_POOL_LIMITS['timer'][1])
+    assert limits['custom'] == (3, DEFAULT_POOL_LIMITS['generic'][1])
+    assert limits['text'] == DEFAULT_POOL_LIMITS['text']
+    with pytest.raises(ValueError):
+        parse_pool_limits('llm=many')
+
+
+def test_holders_are_limited_and_waiters_queue():
+    pool = Bulkhead('test', limit=2, max_queue=10, tenants=Tenants())
+
+    async def hold():
+        async with pool.slot():
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(hold() for _ in range(6)))
+
+    asyncio.run(main())
+    stats = pool.stats()
+    assert stats['peak_active'] == 2
+    assert stats['completed'] == 6
+    assert stats['active'] == 0 and stats['queued'] == 0
+
+
+def test_full_queue_rejects_right_away():
+    pool = Bulkhead('test', limit=1, max_queue=1, tenants=Tenants())
+
+    async def main():
+        await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(BulkheadFull):
+            await pool.acquire()
+        pool.release()
+        await waiter
+        pool.release()
+
+    asyncio.run(main())
+    assert pool.stats()['rejected'] == 1
+    assert pool.stats()['active'] == 0
+
+
+def test_cancelled_waiters_leave_the_queue():
+    pool = Bulkhead('test', limit=1, max_queue=5, tenants=Tenants())
+
+    async def main():
+        await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        assert pool.stats()['queued'] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert pool.stats()['queued'] == 0
+        pool.release()
+
+    asyncio.run(main())
+    assert pool.stats()['active'] == 0
+
+
+def test_kinds_have_separate_pools():
+    pools = NodePools(parse_pool_limits('llm=1:0'), Tenants())
+
+    async def main():
+        async with pools.slot('llm'):
+            # A busy LLM pool rejects more LLM nodes but not text nodes
+            with pytest.raises(BulkheadFull):
+                async with pools.slot('llm'):
+                    pass
+            async with pools.slot('text'):
+                pass
+
+    asyncio.run(main())
+    assert pools.pool('llm').stats()['rejected'] == 1
+    assert pools.pool('text').stats()['completed'] == 1
@@ -0,0 +1,94 @@
+# trunk-ignore-all(black)
+"""
+Tests for the pipeline result cache and ETag revalidation.
+
+    python -m pytest test_cache.py
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache import PipelineResultCache, canonical_hash, etag_matches
+
+PIPELINE = {
+    'nodes': [
+        {'id': 'a', 'type': 'customInput', 'data': {'inputType': 'Number', 'inputValue': '20'}},
+        {'id': 'b', 'type': 'customInput', 'data': {'inputType': 'Number', 'inputValue': '22'}},
+        {'id': 'calc', 'type': 'calculator', 'data': {'operation': 'add'}}
+    ],
+    'edges': [{'source': 'a', 'target': 'calc'}, {'source': 'b', 'target': 'calc'}]
+}
+
+
+def test_canonical_hash_ignores_key_order():
+    assert canonical_hash({'a': 1, 'b': [1, 2]}) == canonical_hash({'b': [1, 2], 'a': 1})
+    assert canonical_hash({'a': 1}) != canonical_hash({'a': 2})
+
+
+def test_evicts_least_recently_used_entries():
+    cache = PipelineResultCache(ttl=60, max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a').result == 1
+    assert cache.get('c').result == 3
+
+
+def test_evicts_entries_over_the_byte_budget():
+    cache = PipelineResultCache(ttl=60, max_entries=10, max_bytes=100)
+    first = cache.put('a', 1)
+    cache.add_body(first, ('application/json', None), b'x' * 60, None)
+    second = cache.put('b', 2)
+    cache.add_body(second, ('application/json', None), b'x' * 60, None)
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 60
+
+
+def test_expired_entries_are_misses():
+    cache = PipelineResultCache(ttl=-1, max_entries=10)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_body_aliases_point_at_entries():
+    cache = PipelineResultCache(ttl=60, max_entries=10)
+    cache.put('key', 1)
+    cache.alias('raw', 'key')
+    assert cache.get_by_body('raw').result == 1
+    assert cache.get_by_body('other') is None
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"x", W/"abc"', True),
+    ('*', True),
+    ('"abd"', False),
+    (None, False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, 'W/"abc"') is expected
+
+
+def test_repeat_submissions_are_served_from_the_cache():
+    main.pipeline_cache.clear()
+    with TestClient(main.app) as client:
+        first = client.post('/pipelines/parse', json=PIPELINE)
+        assert first.status_code == 200
+        assert first.headers['x-cache'] == 'miss'
+        etag = first.headers['etag']
+
+        second = client.post('/pipelines/parse', json=PIPELINE)
+        assert second.headers['x-cache'] == 'hit'
+        assert second.headers['etag'] == etag
+        assert second.content == first.content
+
+        revalidated = client.post('/pipelines/parse', json=PIPELINE, headers={'if-none-match': etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b''
+
+        bypassed = client.post('/pipelines/parse', json=PIPELINE, headers={'cache-control': 'no-cache'})
+        assert bypassed.headers['x-cache'] == 'miss'
@@ -0,0 +1,86 @@
+# trunk-ignore-all(black)
+"""
+Tests for run checkpoints: saving, reopening, write failures and sweeping.
+
+    python -m pytest test_checkpoints.py
+"""
+import os
+import shutil
+import threading
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from checkpoints import CheckpointError, CheckpointStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(str(tmp_path))
+
+
+def test_saved_outputs_are_reopened_from_the_manifest(store):
+    run_id = uuid.uuid4().hex
+    checkpoint = store.create(run_id, {'nodes': [], 'edges': []})
+    assert checkpoint.save('a', {'value': 1})
+    assert checkpoint.save('b', [1, 2])
+
+    reopened = store.open(run_id)
+    assert reopened.pipeline == {'nodes': [], 'edges': []}
+    assert set(reopened.completed()) == {'a', 'b'}
+    assert reopened.load(['a', 'b']) == {'a': {'value': 1}, 'b': [1, 2]}
+
+
+def test_unpicklable_outputs_are_skipped(store):
+    checkpoint = store.create(uuid.uuid4().hex, {})
+    assert not checkpoint.save('a', threading.Lock())
+    assert checkpoint.paths == {}
+
+
+def test_write_failures_are_skipped(store):
+    checkpoint = store.create(uuid.uuid4().hex, {})
+    shutil.rmtree(checkpoint.directory)
+    assert not checkpoint.save('a', {'value': 1})
+    assert checkpoint.paths == {}
+
+
+def test_inherited_checkpoints_are_referenced(store):
+    first = store.create(uuid.uuid4().hex, {})
+    first.save('a', 1)
+    second = store.create(uuid.uuid4().hex, {}, inherited={'a': first.paths['a']})
+    assert second.load(['a']) == {'a': 1}
+
+
+def test_unknown_and_invalid_runs(store):
+    with pytest.raises(CheckpointError):
+        store.open(uuid.uuid4().hex)
+    with pytest.raises(CheckpointError):
+        store.open('../etc')
+
+
+def test_sweep_deletes_old_checkpoints(store):
+    run_id = uuid.uuid4().hex
+    store.create(run_id, {}).save('a', 1)
+    assert store.sweep(max_age=3600) == 0
+    assert store.sweep(max_age=-1) == 1
+    assert not os.path.exists(os.path.join(store.root, run_id))
+
+
+def test_runs_go_on_when_checkpoints_cant_be_written(tmp_path, monkeypatch):
+    # The checkpoint root is a file, so no run directory can be created
+    root = os.path.join(tmp_path, 'not-a-directory')
+    open(root, 'w').close()
+    monkeypatch.setattr(main, 'checkpoint_store', CheckpointStore(root))
+    nodes = [
+        {'id': 'in', 'type': 'customInput', 'data': {'inputValue': 'hello'}},
+        {'id': 'out', 'type': 'customOutput', 'data': {'outputFormat': 'text'}}
+    ]
+    with TestClient(main.app) as client:
+        response = client.post(
+            '/pipelines/parse', json={'nodes': nodes, 'edges': [{'source': 'in', 'target': 'out'}], 'options': {'checkpoint': True}},
+            headers={'cache-control': 'no-cache'}
+        )
+    assert response.status_code == 200, response.text
+    assert response.json()['status'] == 'success'
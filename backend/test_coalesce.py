@@ -0,0 +1,94 @@
+# trunk-ignore-all(black)
+"""
+Tests for in-flight coalescing of identical pipeline submissions.
+
+    python -m pytest test_coalesce.py
+"""
+import asyncio
+
+import pytest
+
+from coalesce import IdempotencyConflict, InFlightCoalescer, coalescing_key
+
+
+def counting_factory(calls, delay=0.05):
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return len(calls)
+    return factory
+
+
+def test_concurrent_submissions_share_one_execution():
+    calls = []
+    coalescer = InFlightCoalescer(grace=0)
+
+    async def main():
+        factory = counting_factory(calls)
+        return await asyncio.gather(*(coalescer.run('k', 'f', factory) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [result for result, _ in results] == [1] * 5
+    assert sum(shared for _, shared in results) == 4
+    assert coalescer.stats()['in_flight'] == 0
+
+
+def test_late_duplicates_reuse_the_result_within_the_grace_window():
+    calls = []
+    coalescer = InFlightCoalescer(grace=60)
+
+    async def main():
+        factory = counting_factory(calls, delay=0)
+        first = await coalescer.run('k', 'f', factory)
+        second = await coalescer.run('k', 'f', factory)
+        return first, second
+
+    assert asyncio.run(main()) == ((1, False), (1, True))
+    assert len(calls) == 1
+
+
+def test_reused_idempotency_key_with_another_pipeline_conflicts():
+    coalescer = InFlightCoalescer(idempotency_ttl=60)
+
+    async def main():
+        await coalescer.run('k', 'f', counting_factory([], delay=0), idempotent=True)
+        await coalescer.run('k', 'other', counting_factory([], delay=0), idempotent=True)
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(main())
+
+
+def test_execution_is_cancelled_when_every_waiter_goes_away():
+    started = []
+    cancelled = []
+    coalescer = InFlightCoalescer(grace=0)
+
+    async def factory():
+        started.append(1)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def main():
+        waiters = [asyncio.ensure_future(coalescer.run('k', 'f', factory)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled
+        waiters[1].cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert started == [1]
+    assert cancelled == [1]
+    assert coalescer.stats()['in_flight'] == 0
+
+
+def test_keys_are_scoped_to_the_tenant():
+    assert coalescing_key(None, 'hash', 'a') != coalescing_key(None, 'hash', 'b')
+    assert coalescing_key(' key ', 'hash', 'a') == ('idempotency:a:key', True)
+    assert coalescing_key('', 'hash', 'a') == ('pipeline:a:hash', False)
@@ -0,0 +1,108 @@
+# trunk-ignore-all(black)
+"""
+Tests for composite nodes: sub-pipeline runs, memoization and recursion limits.
+
+    python -m pytest test_composites.py
+"""
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from composites import CompositeError, CompositeMemo, composite_scope, memo_key
+from registry import PipelineRegistry
+
+GREETING = {
+    'nodes': [
+        {'id': 'name', 'type': 'customInput', 'data': {'inputName': 'name', 'inputValue': 'nobody'}},
+        {'id': 'text', 'type': 'text', 'data': {'text': 'Hello {{value}}'}},
+        {'id': 'out', 'type': 'customOutput', 'data': {'outputFormat': 'text'}}
+    ],
+    'edges': [{'source': 'name', 'target': 'text'}, {'source': 'text', 'target': 'out'}]
+}
+
+
+def test_scope_refuses_recursion_and_deep_nesting(monkeypatch):
+    with composite_scope('a'):
+        with composite_scope('b'):
+            with pytest.raises(CompositeError, match='includes itself'):
+                with composite_scope('a'):
+                    pass
+    monkeypatch.setattr('composites.MAX_COMPOSITE_DEPTH', 1)
+    with composite_scope('a'):
+        with pytest.raises(CompositeError, match='nested deeper'):
+            with composite_scope('b'):
+                pass
+
+
+def test_memo_keys_need_plain_json_inputs():
+    assert memo_key('hash', {'a': 1}, {'value': 1}) == memo_key('hash', {'a': 1}, {'value': 1})
+    assert memo_key('hash', {'a': 1}, None) != memo_key('other', {'a': 1}, None)
+    assert memo_key('hash', {}, object()) is None
+
+
+def test_memo_shares_concurrent_and_later_runs():
+    memo = CompositeMemo()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'output'
+
+    async def share():
+        outputs = await asyncio.gather(*(memo.run('key', factory) for _ in range(3)))
+        outputs.append(await memo.run('key', factory))
+        return outputs
+
+    assert asyncio.run(share()) == ['output'] * 4
+    assert calls == [1]
+    assert memo.stats()['hits'] == 3
+    assert memo.stats()['misses'] == 1
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'pipeline_registry', PipelineRegistry(os.path.join(tmp_path, 'pipelines.db')))
+    main.composite_memo.clear()
+    with TestClient(main.app) as client:
+        yield client
+
+
+def register(client, definition, pipeline_id):
+    response = client.put(f'/pipelines/registry/{pipeline_id}', json=definition)
+    assert response.status_code == 200, response.text
+
+
+def composite_result(client, composite_data, node_id='composite'):
+    nodes = [{'id': node_id, 'type': 'composite', 'data': composite_data}]
+    response = client.post('/pipelines/parse', json={'nodes': nodes, 'edges': []}, headers={'cache-control': 'no-cache'})
+    assert response.status_code == 200, response.text
+    return response.json()['execution_results'][0]
+
+
+def test_composite_runs_the_registered_pipeline(client):
+    register(client, GREETING, 'greeting')
+    result = composite_result(client, {'pipelineId': 'greeting', 'inputs': {'name': 'ann'}})
+    assert result['status'] == 'success'
+    assert 'Hello ann' in str(result['output'])
+    # Deterministic fragments are memoized, also for other nodes using them (which
+    # makes it another pipeline, so it isn't coalesced with the first run)
+    composite_result(client, {'pipelineId': 'greeting', 'inputs': {'name': 'ann'}}, 'another_composite')
+    assert main.composite_memo.stats()['hits'] == 1
+
+
+def test_composite_that_includes_itself_fails(client):
+    loop = {'nodes': [{'id': 'composite', 'type': 'composite', 'data': {'pipelineId': 'loop'}}], 'edges': []}
+    register(client, loop, 'loop')
+    result = composite_result(client, {'pipelineId': 'loop'})
+    assert result['status'] == 'error'
+    assert 'includes itself' in result['error']
+
+
+def test_unknown_sub_pipeline_fails(client):
+    result = composite_result(client, {'pipelineId': 'missing'})
+    assert result['status'] == 'error'
+    assert 'Unknown pipeline' in result['error']
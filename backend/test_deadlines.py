@@ -0,0 +1,82 @@
+# trunk-ignore-all(black)
+"""
+Tests for the remaining-time budget handed to node handlers.
+
+    python -m pytest test_deadlines.py
+"""
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from deadlines import BUDGET_MARGIN, node_budget, remaining_budget, within_budget
+
+
+def test_no_budget_outside_of_a_node():
+    assert remaining_budget() is None
+    assert within_budget(5) == 5
+
+
+def test_nested_budgets_never_extend_the_outer_one():
+    with node_budget(0.5):
+        assert 0.4 < remaining_budget() <= 0.5
+        with node_budget(10):
+            assert remaining_budget() <= 0.5
+        with node_budget(0.1):
+            assert remaining_budget() <= 0.1
+            assert within_budget(5) <= 0.1 - BUDGET_MARGIN
+    assert remaining_budget() is None
+
+
+def test_budget_follows_into_tasks_and_threads():
+    async def check():
+        with node_budget(1):
+            in_task = await asyncio.ensure_future(asyncio.sleep(0, remaining_budget()))
+            in_thread = await asyncio.to_thread(remaining_budget)
+        return in_task, in_thread
+
+    in_task, in_thread = asyncio.run(check())
+    assert in_task is not None and in_task <= 1
+    assert in_thread is not None and in_thread <= 1
+    # Plain threads don't inherit the context
+    seen = []
+    with node_budget(1):
+        thread = threading.Thread(target=lambda: seen.append(remaining_budget()))
+        thread.start()
+        thread.join()
+    assert seen == [None]
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_delays_are_cut_short_to_the_pipeline_budget(client):
+    nodes = [
+        {'id': 'in', 'type': 'customInput', 'data': {'inputValue': 'x'}},
+        {'id': 'delay', 'type': 'timer', 'data': {'mode': 'delay', 'duration': 5000}},
+        {'id': 'out', 'type': 'customOutput', 'data': {}}
+    ]
+    edges = [{'source': 'in', 'target': 'delay'}, {'source': 'delay', 'target': 'out'}]
+    response = client.post(
+        '/pipelines/parse', json={'nodes': nodes, 'edges': edges, 'options': {'timeout_ms': 500, 'include_intermediate': True}},
+        headers={'cache-control': 'no-cache'}
+    )
+    result = response.json()
+    delay = next(item for item in result['execution_results'] if item['node_id'] == 'delay')
+    assert delay['status'] == 'success'
+    assert delay['output']['truncated'] is True
+    assert delay['output']['actual_duration'] < 1000
+
+
+def test_nodes_the_budget_cant_cover_are_skipped():
+    nodes = [{'id': 'text', 'type': 'text', 'data': {'text': 'hi'}}, {'id': 'delay', 'type': 'timer', 'data': {}}]
+    plan = main.plan_pipeline(nodes, [], main.compile_graph(nodes, []), main.ExecutionOptions(optimize=False))
+    assert main.budget_shortfall(nodes[0], plan, 0.05) == 'Skipped: needs at least 100 ms, 50 ms of the time budget left'
+    assert main.budget_shortfall(nodes[0], plan, 0.5) is None
+    # Timers adapt to any budget
+    assert main.budget_shortfall(nodes[1], plan, 0.0) is None
@@ -0,0 +1,120 @@
+# trunk-ignore-all(black)
+"""
+Tests for the calculator expression sandbox: what compiles, what is rejected,
+and that scalar, loop and numpy evaluation fail the same way.
+
+    python -m pytest test_expressions.py
+"""
+from array import array
+import math
+
+import pytest
+
+import expressions
+from expressions import ExpressionError, compile_expression
+
+
+@pytest.mark.parametrize('text', [
+    # Attribute access
+    'x.real',
+    '(1).__class__',
+    'x.__class__.__bases__',
+    # Subscripts and slices
+    'x[0]',
+    'x[1:2]',
+    # Strings and other non-numeric constants
+    "'a'",
+    "'a' * 3",
+    'b"x"',
+    'True + 1',
+    'None',
+    # Dunder and underscore names
+    '__import__',
+    '__builtins__',
+    '_x + 1',
+    '_aggregate_0',
+    # Calls to anything but the whitelisted functions
+    "__import__('os')",
+    "eval('1')",
+    "open('/etc/passwd')",
+    'getattr(x, 1)',
+    'x(1)',
+    '(lambda: 1)()',
+    'sum(x)(1)',
+    # Calls with keywords or unpacking
+    'round(x, digits=2)',
+    'max(*x)',
+    # Other syntax
+    'lambda: 1',
+    '[x, y]',
+    '{x: 1}',
+    'x if y else 1',
+    '(y := 1)',
+    '1 < x < 2',
+    'x and y',
+    'not x',
+    '~x',
+    'x << 1',
+])
+def test_rejects_unsafe_expressions(text):
+    with pytest.raises(ExpressionError):
+        compile_expression(text)
+
+
+def test_rejects_functions_used_as_values():
+    with pytest.raises(ExpressionError, match='is a function'):
+        compile_expression('sqrt + 1')
+
+
+def test_rejects_oversized_expressions():
+    with pytest.raises(ExpressionError):
+        compile_expression('+'.join(['x'] * 300))
+    with pytest.raises(ExpressionError):
+        compile_expression('1' * (expressions.MAX_EXPRESSION_LENGTH + 1))
+
+
+def test_compiled_code_has_no_builtins():
+    # Only whitelisted names can be reached, even if the checker were bypassed
+    expression = compile_expression('x + 1')
+    assert expression._scalar.__globals__['__builtins__'] == {}
+
+
+def test_evaluates_scalars_and_arrays():
+    assert compile_expression('(a * 1.2 + b) / n').evaluate({'a': 10, 'b': 3, 'n': 3}) == pytest.approx(5.0)
+    assert compile_expression('x - mean(x)').evaluate({'x': [1, 2, 3]}) == array('d', [-1.0, 0.0, 1.0])
+    assert compile_expression('where(x > 1, x, 0)').evaluate({'x': [1, 2]}) == array('d', [0.0, 2.0])
+
+
+def test_unknown_variable():
+    with pytest.raises(ExpressionError, match='Unknown variable'):
+        compile_expression('x + y').evaluate({'x': 1})
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+@pytest.mark.parametrize('text, variables', [
+    ('x * 1e308', {'x': 10}),
+    ('x * 1e308', {'x': [1, 10]}),
+    ('x + 1', {'x': math.inf}),
+    ('x + 1', {'x': [1, math.nan]}),
+    ('exp(x)', {'x': [1, 1000]}),
+    # Integer results would make this an unbounded big-integer power
+    ('floor(x) ** floor(y)', {'x': 1e300, 'y': 1e5}),
+    ('ceil(x) ** round(y)', {'x': 1e300, 'y': 1e5}),
+    ('floor(x) ** floor(y)', {'x': [1e300], 'y': [1e5]}),
+])
+def test_non_finite_results_are_errors(monkeypatch, use_numpy, text, variables):
+    if use_numpy and expressions.numpy is None:
+        pytest.skip('numpy is not installed')
+    if not use_numpy:
+        monkeypatch.setattr(expressions, 'numpy', None)
+        compile_expression.cache_clear()
+    try:
+        with pytest.raises(ExpressionError):
+            compile_expression(text).evaluate(variables)
+    finally:
+        compile_expression.cache_clear()
+
+
+def test_division_by_zero():
+    with pytest.raises(ExpressionError, match='Division by zero'):
+        compile_expression('1 / x').evaluate({'x': 0})
@@ -0,0 +1,49 @@
+# trunk-ignore-all(black)
+"""
+Tests for the compact pipeline graph: ordering, cycle and dangling edge reports.
+
+    python -m pytest test_graph.py
+"""
+from graph import compile_graph
+
+
+def graph_of(node_ids, edge_pairs):
+    nodes = [{'id': node_id} for node_id in node_ids]
+    edges = [{'source': source, 'target': target} for source, target in edge_pairs]
+    return compile_graph(nodes, edges)
+
+
+def test_orders_nodes_topologically():
+    graph = graph_of(['c', 'b', 'a'], [('a', 'b'), ('b', 'c'), ('a', 'c')])
+    assert graph.is_dag
+    assert graph.order_ids() == ['a', 'b', 'c']
+    assert [graph.ids[i] for i in graph.successors(graph.index['a'])] == ['b', 'c']
+
+
+def test_reports_one_cycle_as_a_closed_path():
+    graph = graph_of(['start', 'a', 'b', 'c', 'after'], [('start', 'a'), ('a', 'b'), ('b', 'c'), ('c', 'a'), ('c', 'after')])
+    assert not graph.is_dag
+    assert graph.cycle[0] == graph.cycle[-1]
+    assert set(graph.cycle) == {'a', 'b', 'c'}
+    assert len(graph.cycle) == 4
+    assert graph.describe_cycle().count(' -> ') == 3
+    assert graph.order_ids() == ['start']
+
+
+def test_self_loop_is_a_cycle():
+    graph = graph_of(['a'], [('a', 'a')])
+    assert graph.cycle == ['a', 'a']
+
+
+def test_edges_to_unknown_nodes_are_reported():
+    graph = graph_of(['a', 'b'], [('a', 'b'), ('a', 'ghost'), ('ghost', 'b')])
+    assert graph.is_dag
+    assert graph.order_ids() == ['a', 'b']
+    assert graph.dangling_edges == [('a', 'ghost'), ('ghost', 'b')]
+    assert graph.describe_dangling_edges() == 'a -> ghost, ghost -> b'
+
+
+def test_duplicate_node_ids_are_interned_once():
+    graph = graph_of(['a', 'a', 'b'], [('a', 'b')])
+    assert graph.num_nodes == 2
+    assert graph.order_ids() == ['a', 'b']
@@ -0,0 +1,89 @@
+# trunk-ignore-all(black)
+"""
+Tests for map nodes: per-element subgraph runs, concurrency, failures and streamed progress.
+
+    python -m pytest test_map.py
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """Unknown node types run as 'generic': this one doubles the element and fails on 2"""
+    running = {'now': 0, 'peak': 0}
+
+    async def handler(node, input_data):
+        running['now'] += 1
+        running['peak'] = max(running['peak'], running['now'])
+        try:
+            # Later elements finish first
+            await asyncio.sleep(0.05 * (4 - input_data['value']))
+            if input_data['value'] == 2:
+                raise ValueError('two is not allowed')
+            return input_data['value'] * 2
+        finally:
+            running['now'] -= 1
+
+    monkeypatch.setitem(main.NODE_HANDLERS, 'generic', handler)
+    return running
+
+
+def map_pipeline(values, **map_data):
+    subgraph = {
+        'nodes': [{'id': 'item', 'type': 'customInput'}, {'id': 'work', 'type': 'workerNode', 'data': {}}],
+        'edges': [{'source': 'item', 'target': 'work'}]
+    }
+    nodes = [
+        {'id': 'in', 'type': 'customInput', 'data': {'inputType': 'File', 'inputValue': json.dumps(values)}},
+        {'id': 'map', 'type': 'map', 'data': {'subgraph': subgraph, **map_data}},
+        {'id': 'out', 'type': 'customOutput', 'data': {'outputFormat': 'json'}}
+    ]
+    edges = [{'source': 'in', 'target': 'map'}, {'source': 'map', 'target': 'out'}]
+    return {'nodes': nodes, 'edges': edges, 'options': {'include_intermediate': True}}
+
+
+def map_output(client, body):
+    response = client.post('/pipelines/parse', json=body, headers={'cache-control': 'no-cache'})
+    assert response.status_code == 200, response.text
+    return next(item['output'] for item in response.json()['execution_results'] if item['node_id'] == 'map')
+
+
+def test_elements_run_concurrently_and_keep_their_order(client, worker):
+    output = map_output(client, map_pipeline([1, 2, 3], concurrency=3))
+    assert worker['peak'] == 3
+    assert [item['index'] for item in output['results']] == [0, 1, 2]
+    assert [item.get('output') for item in output['results']] == [2, None, 6]
+    assert (output['succeeded'], output['failed']) == (2, 1)
+    assert 'two is not allowed' in output['results'][1]['error']
+
+
+def test_concurrency_is_bounded(client, worker):
+    map_output(client, map_pipeline([1, 1, 1, 1], concurrency=2))
+    assert worker['peak'] == 2
+
+
+def test_unordered_results_come_in_completion_order(client, worker):
+    output = map_output(client, map_pipeline([1, 3], concurrency=2, ordered=False))
+    assert [item['index'] for item in output['results']] == [1, 0]
+
+
+def test_streamed_progress_has_an_event_per_element(client, worker):
+    response = client.post('/pipelines/stream', json=map_pipeline([1, 2, 3], concurrency=3))
+    events = [json.loads(line) for line in response.text.splitlines()]
+    items = [event for event in events if event['event'] == 'map_item']
+    assert len(items) == 3
+    # Ordered mode holds an element back until the earlier ones are done
+    assert [event['index'] for event in items] == [0, 1, 2]
+    assert events[-1]['event'] == 'result'
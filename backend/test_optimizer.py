@@ -0,0 +1,55 @@
+# trunk-ignore-all(black)
+"""
+Tests for the optimizer's fold cache and its size bounds.
+
+    python -m pytest test_optimizer.py
+"""
+from optimizer import FoldCache, approximate_size
+from table import Table
+
+
+def test_evicts_least_recently_used_outputs():
+    cache = FoldCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_evicts_outputs_over_the_byte_budget():
+    cache = FoldCache(max_entries=10, max_bytes=3000, max_entry_bytes=2000)
+    cache.put('a', 'x' * 1200)
+    cache.put('b', 'y' * 1200)
+    cache.put('c', 'z' * 1200)
+    assert 'a' not in cache
+    assert 'b' in cache and 'c' in cache
+    assert cache.stats()['bytes'] <= 3000
+
+
+def test_skips_outputs_over_the_entry_limit():
+    cache = FoldCache(max_entries=10, max_bytes=10_000, max_entry_bytes=1000)
+    cache.put('small', 'x')
+    cache.put('big', {'rows': ['x' * 100] * 50})
+    assert 'big' not in cache
+    assert 'small' in cache
+    assert cache.stats()['skipped'] == 1
+
+
+def test_replacing_an_entry_releases_its_bytes():
+    cache = FoldCache(max_entries=10, max_bytes=10_000, max_entry_bytes=1000)
+    cache.put('a', 'x' * 500)
+    cache.put('a', 'x')
+    assert cache.stats()['bytes'] == approximate_size('x', 1000)
+    cache.clear()
+    assert cache.stats()['bytes'] == 0
+
+
+def test_approximate_size_counts_nested_values_and_tables():
+    table = Table.from_records({'id': i, 'name': f'user_{i}'} for i in range(1000))
+    assert approximate_size(table, 10**9) > 8 * 1000
+    assert approximate_size({'data': ['x' * 1000]}, 10**9) > 1000
+    # Counting stops once the limit is passed
+    assert approximate_size(['x' * 1000] * 1000, 5000) < 10_000
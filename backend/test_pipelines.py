@@ -0,0 +1,63 @@
+# trunk-ignore-all(black)
+"""
+End-to-end tests of pipelines through POST /pipelines/parse.
+
+    python -m pytest test_pipelines.py
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+CSV = 'id,amount,name\n1,10,ann\n2,20,bob\n'
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def run(client, nodes, edges, **options):
+    response = client.post('/pipelines/parse', json={'nodes': nodes, 'edges': edges, 'options': options}, headers={'cache-control': 'no-cache'})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def output_of(result, node_id):
+    return next(item['output'] for item in result['execution_results'] if item['node_id'] == node_id)
+
+
+def csv_chain(node):
+    """CSV file input -> dataFormat -> `node`"""
+    nodes = [
+        {'id': 'in', 'type': 'customInput', 'data': {'inputType': 'File', 'inputValue': CSV}},
+        {'id': 'fmt', 'type': 'dataFormat', 'data': {'outputFormat': 'json'}},
+        node
+    ]
+    edges = [{'source': 'in', 'target': 'fmt'}, {'source': 'fmt', 'target': node['id']}]
+    return nodes, edges
+
+
+def test_data_format_passes_the_table_to_calculator_columns(client):
+    result = run(client, *csv_chain({'id': 'calc', 'type': 'calculator', 'data': {'operation': 'sum', 'column': 'amount'}}))
+    assert output_of(result, 'calc')['result'] == 30.0
+
+
+def test_data_format_passes_the_table_to_column_filters(client):
+    result = run(client, *csv_chain({'id': 'filter', 'type': 'filterNode', 'data': {'filterType': 'contains', 'filterValue': 'b', 'filterField': 'name'}}))
+    output = output_of(result, 'filter')
+    assert output['reason'] == "1 of 2 rows matched contains 'b' on 'name'"
+    assert output['original_data'] == [{'id': 2, 'amount': 20, 'name': 'bob'}]
+
+
+def test_delay_timer_passes_its_input_on(client):
+    nodes = [
+        {'id': 'in', 'type': 'customInput', 'data': {'inputValue': 'hello'}},
+        {'id': 'delay', 'type': 'timer', 'data': {'mode': 'delay', 'duration': 10}},
+        {'id': 'out', 'type': 'customOutput', 'data': {'outputFormat': 'json'}}
+    ]
+    edges = [{'source': 'in', 'target': 'delay'}, {'source': 'delay', 'target': 'out'}]
+    result = run(client, nodes, edges, include_intermediate=True)
+    assert output_of(result, 'delay')['data'] == {'type': 'text', 'value': 'hello', 'length': 5}
+    assert '"value": "hello"' in output_of(result, 'out')['data']
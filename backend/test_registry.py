@@ -0,0 +1,96 @@
+# trunk-ignore-all(black)
+"""
+Tests for the versioned pipeline registry and invocation by id.
+
+    python -m pytest test_registry.py
+"""
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from registry import PipelineRegistry, RegistryError
+
+DEFINITION = {
+    'nodes': [
+        {'id': 'in', 'type': 'customInput', 'data': {'inputName': 'name', 'inputValue': 'x'}},
+        {'id': 'text', 'type': 'text', 'data': {'text': 'Hello {{input}}'}},
+        {'id': 'out', 'type': 'customOutput', 'data': {'outputFormat': 'text'}}
+    ],
+    'edges': [{'source': 'in', 'target': 'text'}, {'source': 'text', 'target': 'out'}]
+}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return PipelineRegistry(os.path.join(tmp_path, 'pipelines.db'), max_compiled=2)
+
+
+def test_versions_are_added_only_for_changed_definitions(registry):
+    first, created = registry.register(DEFINITION, 'greet')
+    assert (first.version, created) == (1, True)
+    same, created = registry.register(DEFINITION, 'greet')
+    assert (same.version, created) == (1, False)
+    changed = {**DEFINITION, 'nodes': DEFINITION['nodes'][:2], 'edges': DEFINITION['edges'][:1]}
+    second, created = registry.register(changed, 'greet')
+    assert (second.version, created) == (2, True)
+    assert [v['version'] for v in registry.versions('greet')] == [1, 2]
+    assert registry.get('greet').version == 2
+    assert registry.get('greet', 1).definition == DEFINITION
+
+
+def test_unknown_and_invalid_pipelines(registry):
+    with pytest.raises(RegistryError):
+        registry.get('missing')
+    with pytest.raises(RegistryError):
+        registry.register(DEFINITION, 'not a valid id')
+    registry.register(DEFINITION, 'greet')
+    with pytest.raises(RegistryError):
+        registry.compiled('greet', 2, main.compile_registered_pipeline)
+
+
+def test_compiled_versions_are_kept_in_an_lru(registry):
+    compiles = []
+
+    def compile(record):
+        compiles.append(record.pipeline_id)
+        return main.compile_registered_pipeline(record)
+
+    for pipeline_id in ('a', 'b', 'c'):
+        registry.register(DEFINITION, pipeline_id)
+    registry.compiled('a', None, compile)
+    registry.compiled('b', None, compile)
+    assert registry.compiled('a', None, compile) is registry.warm('a')
+    registry.compiled('c', None, compile)
+    assert compiles == ['a', 'b', 'c']
+    assert registry.warm('b') is None
+    assert registry.warm('a') is not None
+    assert registry.stats()['compiled'] == 2
+
+
+def test_deleting_drops_compiled_versions(registry):
+    registry.register(DEFINITION, 'greet')
+    registry.compiled('greet', None, main.compile_registered_pipeline)
+    registry.delete('greet')
+    assert registry.warm('greet') is None
+    with pytest.raises(RegistryError):
+        registry.compiled('greet', None, main.compile_registered_pipeline)
+
+
+def test_invocation_options_override_the_registered_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'pipeline_registry', PipelineRegistry(os.path.join(tmp_path, 'pipelines.db')))
+    with TestClient(main.app) as client:
+        response = client.post('/pipelines/registry', json={**DEFINITION, 'options': {'include_intermediate': True}})
+        assert response.status_code == 200, response.text
+        pipeline_id = response.json()['pipeline_id']
+
+        response = client.post(f'/pipelines/registry/{pipeline_id}/invoke', json={'inputs': {'name': 'ann'}, 'options': {'explain': True}})
+        assert response.status_code == 200, response.text
+        result = response.json()
+        assert response.headers['x-pipeline-version'] == '1'
+        # include_intermediate from the registration is kept, explain is added
+        assert {item['node_id'] for item in result['execution_results']} == {'in', 'text', 'out'}
+        assert result['optimization'] is not None
+
+        assert client.post('/pipelines/registry/missing/invoke', json={}).status_code == 404
@@ -0,0 +1,84 @@
+# trunk-ignore-all(black)
+"""
+Tests for the run history store: batched writes, queries, paging and pruning.
+
+    python -m pytest test_run_store.py
+"""
+import asyncio
+import os
+
+import pytest
+
+from main import NodeResult
+from run_store import OUTPUT_SPLIT_ITEMS, RunRecord, RunStore, RunStoreError, split_output
+
+
+def make_run(run_id, started, status='success', output=None, pipeline_id=None):
+    results = [NodeResult(node_id='out', node_type='customOutput', status='success', output=output, execution_time=0.01)]
+    return RunRecord(run_id, 'hash', pipeline_id, status, started, 0.01, 1, 0, results)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RunStore(os.path.join(tmp_path, 'runs.db'), enabled=True, max_runs=3)
+
+
+def test_split_output_moves_large_lists_out():
+    rows = list(range(OUTPUT_SPLIT_ITEMS))
+    assert split_output(rows) == ({'$items': '', 'length': OUTPUT_SPLIT_ITEMS}, {'': rows})
+    value, items = split_output({'rows': rows, 'count': 1})
+    assert value == {'rows': {'$items': 'rows', 'length': OUTPUT_SPLIT_ITEMS}, 'count': 1}
+    assert items == {'rows': rows}
+    assert split_output({'few': [1, 2]}) == ({'few': [1, 2]}, {})
+
+
+def test_queries_are_newest_first_and_paged(store):
+    store._write_batch([make_run('a', 1.0), make_run('b', 2.0, status='error'), make_run('c', 3.0, pipeline_id='p')])
+    assert [run['run_id'] for run in store.query_runs()] == ['c', 'b', 'a']
+    assert [run['run_id'] for run in store.query_runs(limit=1, offset=1)] == ['b']
+    assert [run['run_id'] for run in store.query_runs(status='error')] == ['b']
+    assert [run['run_id'] for run in store.query_runs(pipeline_id='p')] == ['c']
+    assert [run['run_id'] for run in store.query_runs(since=2.0, until=3.0)] == ['b']
+    assert store.node_latency_stats()[0]['count'] == 3
+
+
+def test_large_outputs_are_stored_item_by_item(store):
+    rows = [{'i': i} for i in range(250)]
+    store._write_batch([make_run('a', 1.0, output={'rows': rows})])
+    assert store.get_output('a', 'out') == {'rows': {'$items': 'rows', 'length': 250}}
+    page = store.get_output_items('a', 'out', 'rows', offset=200, limit=100)
+    assert page['total'] == 250
+    assert page['items'] == rows[200:]
+    run = store.get_run('a')
+    assert run['node_results'][0]['output_ref'] == '/runs/a/nodes/out/output'
+    with pytest.raises(RunStoreError):
+        store.get_output_items('a', 'out', 'missing')
+    with pytest.raises(RunStoreError):
+        store.get_run('missing')
+
+
+def test_oldest_runs_are_pruned_with_their_outputs(store):
+    store._write_batch([make_run(f'run{i}', float(i), output={'rows': list(range(OUTPUT_SPLIT_ITEMS))}) for i in range(5)])
+    assert [run['run_id'] for run in store.query_runs()] == ['run4', 'run3', 'run2']
+    with pytest.raises(RunStoreError):
+        store.get_output('run0', 'out')
+    with pytest.raises(RunStoreError):
+        store.get_output_items('run1', 'out', 'rows')
+
+
+def test_recorded_runs_are_written_in_batches(store):
+    async def main():
+        for i in range(3):
+            assert store.record(make_run(f'run{i}', float(i)))
+        await store.wait_written('run2')
+        await store.flush()
+
+    asyncio.run(main())
+    assert len(store.query_runs()) == 3
+    assert store.stats()['written'] == 3
+    assert store.stats()['batches'] >= 1
+
+
+def test_disabled_store_records_nothing(tmp_path):
+    store = RunStore(os.path.join(tmp_path, 'runs.db'), enabled=False)
+    assert not store.record(make_run('a', 1.0))
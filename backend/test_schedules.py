@@ -0,0 +1,57 @@
+# trunk-ignore-all(black)
+"""
+Tests for firing schedules from several workers sharing one database.
+
+    python -m pytest test_schedules.py
+"""
+from collections import Counter
+import asyncio
+import os
+
+import schedules
+from schedules import Schedule, ScheduleStore, Scheduler
+
+
+def test_a_tick_is_claimed_once(tmp_path):
+    store = ScheduleStore(os.path.join(tmp_path, 'schedules.db'))
+    schedule = Schedule('p', interval=60, schedule_id='s')
+    store.save(schedule)
+    tick = schedule.next_tick
+    assert store.claim([('s', tick, tick + 60)]) == {'s'}
+    # Another worker that saw the same tick loses
+    assert store.claim([('s', tick, tick + 60)]) == set()
+    assert store.claim([('missing', tick, tick + 60)]) == set()
+    assert store.load()[0].next_tick == tick + 60
+
+
+def test_workers_run_each_tick_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(schedules, 'SCHEDULE_MIN_INTERVAL', 0.1)
+    path = os.path.join(tmp_path, 'schedules.db')
+    runs = Counter()
+
+    def runner(worker):
+        async def run(schedule):
+            runs[worker, schedule.schedule_id, schedule.next_tick] += 1
+            return 'success', None
+        return run
+
+    async def main():
+        first = Scheduler(ScheduleStore(path), runner('first'), enabled=True)
+        for i in range(5):
+            await first.add(Schedule('p', interval=0.2, schedule_id=f's{i}'))
+        second = Scheduler(ScheduleStore(path), runner('second'), enabled=True)
+        await first.start()
+        await second.start()
+        await asyncio.sleep(1.1)
+        await first.remove(['s0'])
+        await asyncio.sleep(0.5)
+        await first.stop()
+        await second.stop()
+        assert 's0' not in second._schedules
+        return ScheduleStore(path).load()
+
+    stored = asyncio.run(main())
+    ticks = Counter((schedule_id, tick) for (_, schedule_id, tick) in runs.elements())
+    assert ticks and max(ticks.values()) == 1
+    # Both workers' runs are counted
+    assert sum(schedule.runs for schedule in stored) == sum(count for (_, schedule_id, _), count in runs.items() if schedule_id != 's0')
@@ -0,0 +1,86 @@
+# trunk-ignore-all(black)
+"""
+Tests for the cost model and the order in which ready nodes start.
+
+    python -m pytest test_scheduling.py
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from scheduling import DEFAULT_COST_SECONDS, CostModel, ReadyQueue, simulate, upward_ranks
+
+# a1 and a2 are independent; b feeds the expensive c
+ORDER = ['a1', 'a2', 'b', 'c']
+SUCCESSORS = {'b': ['c']}
+COSTS = {'a1': 1.0, 'a2': 1.0, 'b': 1.0, 'c': 5.0}
+
+
+def test_cost_model_averages_observations():
+    model = CostModel(alpha=0.5)
+    node = {'id': 'n', 'type': 'text', 'data': {}}
+    assert model.estimate(node, 'text') == DEFAULT_COST_SECONDS['text']
+    model.observe('text', 1.0)
+    model.observe('text', 3.0)
+    assert model.estimate(node, 'text') == 2.0
+    # History only fills in types not observed live
+    model.seed([('text', 10.0, 5), ('llm', 4.0, 2)])
+    assert model.estimate(node, 'text') == 2.0
+    assert model.stats()['llm'] == {'estimate': 4.0, 'samples': 2}
+
+
+def test_delay_timers_cost_their_duration():
+    model = CostModel()
+    assert model.estimate({'id': 't', 'type': 'timer', 'data': {'duration': 2500}}, 'timer') == 2.5
+
+
+def test_upward_ranks_include_the_longest_path_after_a_node():
+    assert upward_ranks(ORDER, SUCCESSORS, COSTS) == {'a1': 1.0, 'a2': 1.0, 'b': 6.0, 'c': 5.0}
+
+
+def test_ready_queue_pops_by_rank_then_order():
+    queue = ReadyQueue(ORDER, {'a1': 1.0, 'a2': 1.0, 'b': 6.0, 'c': 5.0})
+    for node_id in ('a2', 'b', 'a1'):
+        queue.push(node_id)
+    assert [queue.pop() for _ in range(len(queue))] == ['b', 'a1', 'a2']
+    fifo = ReadyQueue(ORDER)
+    for node_id in ('b', 'a2', 'a1'):
+        fifo.push(node_id)
+    assert [fifo.pop() for _ in range(len(fifo))] == ['a1', 'a2', 'b']
+
+
+def test_critical_path_first_shortens_the_run():
+    assert simulate(ORDER, SUCCESSORS, COSTS, 2, 'fifo') == 7.0
+    assert simulate(ORDER, SUCCESSORS, COSTS, 2, 'critical_path') == 6.0
+    assert simulate(ORDER, SUCCESSORS, COSTS, 1, 'critical_path') == 8.0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def handler(node, input_data):
+        await asyncio.sleep(node['data']['sleep'])
+        return node['id']
+
+    monkeypatch.setitem(main.NODE_HANDLERS, 'generic', handler)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_independent_nodes_run_concurrently(client):
+    nodes = [
+        {'id': 'left', 'type': 'slowNode', 'data': {'sleep': 0.3}},
+        {'id': 'right', 'type': 'slowNode', 'data': {'sleep': 0.3}},
+        {'id': 'out', 'type': 'customOutput', 'data': {}}
+    ]
+    edges = [{'source': 'left', 'target': 'out'}, {'source': 'right', 'target': 'out'}]
+
+    def total_time(**options):
+        response = client.post('/pipelines/parse', json={'nodes': nodes, 'edges': edges, 'options': options}, headers={'cache-control': 'no-cache'})
+        result = response.json()
+        assert result['status'] == 'success'
+        return result['total_execution_time']
+
+    assert total_time(max_concurrency=1) >= 0.6
+    assert total_time(max_concurrency=2) < 0.55
@@ -0,0 +1,75 @@
+# trunk-ignore-all(black)
+"""
+Tests for the incremental JSON array, NDJSON and CSV readers.
+
+    python -m pytest test_streaming.py
+"""
+import asyncio
+import io
+
+import pytest
+
+import streaming
+from streaming import RecordStream, iter_json_array, sniff_format
+
+
+def _sources(text):
+    # The same text as a string and as a stream read a few characters at a time
+    return [text, io.StringIO(text)]
+
+
+@pytest.fixture(autouse=True)
+def small_reads(monkeypatch):
+    monkeypatch.setattr(streaming, 'READ_CHUNK_SIZE', 3)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('[]', []),
+    (' [ ] ', []),
+    ('[1,2 , 3]', [1, 2, 3]),
+    ('[12345678, 9]', [12345678, 9]),
+    ('[{"a": [1, 2]}, "x,]", null]', [{'a': [1, 2]}, 'x,]', None]),
+])
+def test_reads_arrays(text, expected):
+    for source in _sources(text):
+        assert list(iter_json_array(source)) == expected
+
+
+@pytest.mark.parametrize('text', [
+    '[1,,,2 3]',
+    '[1,2,]',
+    '[,1]',
+    '[,]',
+    '[1 2]',
+    '[1',
+    '[1,',
+    '',
+    '{"a": 1}',
+])
+def test_rejects_malformed_arrays(text):
+    for source in _sources(text):
+        with pytest.raises(ValueError):
+            list(iter_json_array(source))
+
+
+def test_sniffs_formats():
+    assert sniff_format('[1, 2]')['format'] == 'json_array'
+    assert sniff_format('{"a": 1}\n{"a": 2}\n')['format'] == 'ndjson'
+    assert sniff_format('{"a": 1}', complete=True)['format'] == 'json'
+    assert sniff_format('a;b\n1;2\n3;4\n') == {'format': 'csv', 'delimiter': ';'}
+
+
+def test_record_stream_is_reiterable():
+    records = RecordStream('a,b\n1,2\n3,4\n', 'csv')
+    assert list(records) == [{'a': '1', 'b': '2'}, {'a': '3', 'b': '4'}]
+    assert list(records) == list(records)
+
+
+def test_csv_output_rejects_mixed_records():
+    import main
+    node = {'id': 'format', 'type': 'dataFormat', 'data': {'outputFormat': 'csv'}}
+    result = asyncio.run(main.execute_data_format_node(node, RecordStream('{"a": 1}\n2\n', 'ndjson')))
+    assert not result['conversion_info']['conversion_successful']
+    assert 'mix of objects and values' in result['conversion_info']['error']
+    result = asyncio.run(main.execute_data_format_node(node, RecordStream('{"a": 1}\n{"a": 2, "b": 3}\n', 'ndjson')))
+    assert result['formatted_output'].split() == ['a', '1', '2']
@@ -0,0 +1,78 @@
+# trunk-ignore-all(black)
+"""
+Tests for the columnar Table: type inference, missing values and row access.
+
+    python -m pytest test_table.py
+"""
+from array import array
+import csv
+import io
+import math
+
+from table import FLOAT, INT, STR, Table, find_table
+
+
+def _csv_table(text):
+    return Table.from_records(csv.DictReader(io.StringIO(text)))
+
+
+def test_infers_one_type_per_column():
+    table = _csv_table('id,price,name\n1,2.5,a\n2,3,b\n')
+    assert table.schema.types == (INT, FLOAT, STR)
+    assert isinstance(table.column('id'), array) and table.column('id').typecode == 'q'
+    assert list(table.column('price')) == [2.5, 3.0]
+
+
+def test_blank_cells_keep_integer_columns():
+    table = _csv_table('id,count\n1,10\n2,\n3,30\n')
+    assert table.schema.types == (INT, INT)
+    assert list(table.rows()) == [{'id': 1, 'count': 10}, {'id': 2, 'count': None}, {'id': 3, 'count': 30}]
+    assert list(table.numeric_values(['count'])) == [10.0, 30.0]
+    counts = dict(table.numeric_columns())['count']
+    assert counts[0] == 10.0 and math.isnan(counts[1])
+
+
+def test_csv_round_trip_keeps_integers():
+    table = _csv_table('a,b\n1,\n,2\n')
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(table.schema.names)
+    writer.writerows(row.values() for row in table.rows())
+    assert output.getvalue() == 'a,b\n1,\n,2\n'
+
+
+def test_identifiers_make_the_whole_column_text():
+    table = _csv_table('zip,n\n90210,1\n02134,2\n10001,\n,4\n')
+    assert table.schema.types == (STR, INT)
+    assert [row['zip'] for row in table.rows()] == ['90210', '02134', '10001', None]
+    # Numbers read before the column turned out to be text keep their exact text
+    table = _csv_table('score\n10\n20.5\n1.50\n-0\n1e3\nx\n')
+    assert [row['score'] for row in table.rows()] == ['10', '20.5', '1.50', '-0', '1e3', 'x']
+
+
+def test_numbers_before_text_become_text():
+    table = Table.from_records([{'v': 1}, {'v': None}, {'v': 'x'}, {'v': 3}, {'v': True}])
+    assert table.schema.types == (STR,)
+    assert [row['v'] for row in table.rows()] == ['1', None, 'x', '3', True]
+    table = Table.from_records([{'v': 2.5}, {'v': 3.0}, {'v': 'x'}])
+    assert [row['v'] for row in table.rows()] == ['2.5', '3', 'x']
+
+
+def test_integers_with_nulls_become_floats():
+    table = Table.from_records([{'v': 1}, {}, {'v': 2.5}])
+    assert table.schema.types == (FLOAT,)
+    assert [row['v'] for row in table.rows()] == [1.0, None, 2.5]
+
+
+def test_take_keeps_null_masks():
+    table = _csv_table('id,count\n1,\n2,20\n3,\n')
+    taken = table.take([True, False, True])
+    assert list(taken.rows()) == [{'id': 1, 'count': None}, {'id': 3, 'count': None}]
+    assert list(table.present('count')) == [None, 20, None]
+
+
+def test_scalars_and_lookup():
+    table = Table.from_records([1, 2, 3])
+    assert table.schema.names == ('value',)
+    assert find_table({'result': {'data': table}}) is table
+    assert find_table({'a': {'b': {'c': table}}}) is None
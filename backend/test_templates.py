@@ -0,0 +1,58 @@
+# trunk-ignore-all(black)
+"""
+Tests for compiled text node templates.
+
+    python -m pytest test_templates.py
+"""
+import pytest
+
+import templates
+from templates import Template, compile_template
+
+CONTEXT = {
+    'input': {'type': 'text', 'value': 'hello'},
+    'input_1': {'value': 'one', 'items': ['a', 'b']},
+    'customInput-1': {'content': 'file text'},
+    'count': 3
+}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('{{input}} world', 'hello world'),
+    ('{{ input_1.value }}', 'one'),
+    ('{{input_1.items.1}}', 'b'),
+    ('{{customInput-1}}', 'file text'),
+    ('{{count}} items', '3 items'),
+    ('legacy {input} and $input', 'legacy hello and hello'),
+    ('no placeholders', 'no placeholders'),
+    ('', ''),
+])
+def test_renders_placeholders(text, expected):
+    assert Template(text).render(CONTEXT) == expected
+
+
+@pytest.mark.parametrize('text', [
+    '{{missing}}',
+    '{{input_1.missing}}',
+    '{{input_1.items.5}}',
+    '{{count.value}}',
+])
+def test_unresolved_placeholders_are_kept(text):
+    assert Template(text).render(CONTEXT) == text
+
+
+def test_lists_variables_in_order():
+    assert Template('{{b}} {input} {{a.x}} {{b}}').variables == ['b', 'a.x', 'b']
+
+
+def test_rendering_is_linear_in_the_output():
+    # A value containing placeholder syntax is not expanded again
+    text = ' '.join('{{input}}' for _ in range(1000))
+    rendered = Template(text).render({'input': '{{input}}'})
+    assert rendered == text
+
+
+def test_compiled_templates_are_cached_unless_long(monkeypatch):
+    assert compile_template('Hi {{input}}') is compile_template('Hi {{input}}')
+    monkeypatch.setattr(templates, 'TEMPLATE_CACHE_MAX_LENGTH', 5)
+    assert compile_template('Hi {{input}}') is not compile_template('Hi {{input}}')
@@ -0,0 +1,84 @@
+# trunk-ignore-all(black)
+"""
+Tests for tenant ids, caps and the weighted fair queue shared by admission and node pools.
+
+    python -m pytest test_tenants.py
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from tenants import DEFAULT_TENANT, FairQueue, TenantError, Tenants, parse_tenant_values, tenant_id
+
+
+def allow_all(tenant, cost):
+    return True
+
+
+def drain(queue, can_start=allow_all):
+    served = []
+    while True:
+        entry = queue.pop(can_start)
+        if entry is None:
+            return served
+        served.append(entry[1])
+
+
+def test_tenant_ids():
+    assert tenant_id(None) == DEFAULT_TENANT
+    assert tenant_id(' acme ') == 'acme'
+    with pytest.raises(TenantError):
+        tenant_id('no spaces allowed')
+
+
+def test_parse_tenant_values():
+    assert parse_tenant_values('a=2, b=0.5') == {'a': 2.0, 'b': 0.5}
+    with pytest.raises(ValueError):
+        parse_tenant_values('a=lots')
+
+
+def test_tenants_take_turns_by_weight():
+    weights = {'heavy': 2.0}
+    queue = FairQueue(1.0, lambda tenant: weights.get(tenant, 1.0))
+    for i in range(6):
+        queue.push('heavy', f'h{i}', 1.0)
+        queue.push('light', f'l{i}', 1.0)
+    first = drain(queue)[:6]
+    assert sum(item.startswith('h') for item in first) == 4
+
+
+def test_one_tenants_expensive_items_dont_starve_the_others():
+    queue = FairQueue(1.0, lambda tenant: 1.0)
+    for i in range(3):
+        queue.push('batch', f'b{i}', 10.0)
+    for i in range(3):
+        queue.push('small', f's{i}', 1.0)
+    served = drain(queue)
+    assert served.index('s2') < served.index('b1')
+    assert len(queue) == 0
+
+
+def test_capped_tenants_are_passed_over():
+    queue = FairQueue(1.0, lambda tenant: 1.0)
+    queue.push('capped', 'c', 1.0)
+    queue.push('free', 'f', 1.0)
+    assert drain(queue, lambda tenant, cost: tenant != 'capped') == ['f']
+    assert queue.queued('capped') == 1
+
+
+def test_caps_and_idle_stats_eviction():
+    tenants = Tenants(weights={}, max_pipelines=1, pipeline_caps={'big': 3}, node_caps={}, max_stats=2)
+    tenants.stats_for('a').pipelines += 1
+    assert not tenants.can_start_pipeline('a')
+    assert tenants.can_start_pipeline('big')
+    tenants.stats_for('b')
+    tenants.stats_for('c')
+    # 'a' is busy and kept, the idle 'b' is forgotten
+    assert tenants.forgotten == 1
+    assert 'a' in tenants.stats() and 'b' not in tenants.stats()
+
+
+def test_invalid_tenant_header_is_rejected():
+    with TestClient(main.app) as client:
+        response = client.post('/pipelines/parse', json={'nodes': [], 'edges': []}, headers={'x-tenant-id': 'bad tenant', 'cache-control': 'no-cache'})
+    assert response.status_code == 400
@@ -0,0 +1,106 @@
+# trunk-ignore-all(black)
+"""
+Tests for node and pipeline timeouts and cancellation on client disconnect.
+
+    python -m pytest test_timeouts.py
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def slow_handler(monkeypatch):
+    """Unknown node types run as 'generic'; make them sleep for `data.sleep` seconds"""
+    cancelled = []
+
+    async def handler(node, input_data):
+        try:
+            await asyncio.sleep(node['data']['sleep'])
+        except asyncio.CancelledError:
+            cancelled.append(node['id'])
+            raise
+        return {'slept': node['data']['sleep']}
+
+    monkeypatch.setitem(main.NODE_HANDLERS, 'generic', handler)
+    return cancelled
+
+
+def run(client, nodes, edges, **options):
+    response = client.post('/pipelines/parse', json={'nodes': nodes, 'edges': edges, 'options': options}, headers={'cache-control': 'no-cache'})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def result_of(result, node_id):
+    return next(item for item in result['execution_results'] if item['node_id'] == node_id)
+
+
+def test_node_timeout_stops_the_node(client, slow_handler):
+    nodes = [
+        {'id': 'slow', 'type': 'slowNode', 'data': {'sleep': 5, 'timeout': 50}},
+        {'id': 'out', 'type': 'customOutput', 'data': {}}
+    ]
+    result = run(client, nodes, [{'source': 'slow', 'target': 'out'}])
+    slow = result_of(result, 'slow')
+    assert slow['status'] == 'timeout'
+    assert slow['error'] == 'Node timed out after 50 ms'
+    assert slow['execution_time'] < 1
+    assert slow_handler == ['slow']
+    assert result['status'].startswith('partial_success')
+
+
+def test_pipeline_timeout_stops_running_and_pending_nodes(client, slow_handler):
+    nodes = [
+        {'id': 'first', 'type': 'slowNode', 'data': {'sleep': 0.05}},
+        {'id': 'second', 'type': 'slowNode', 'data': {'sleep': 5}},
+        {'id': 'out', 'type': 'customOutput', 'data': {}}
+    ]
+    edges = [{'source': 'first', 'target': 'second'}, {'source': 'second', 'target': 'out'}]
+    result = run(client, nodes, edges, timeout_ms=400, include_intermediate=True)
+    assert result['status'] == 'timeout'
+    assert result_of(result, 'first')['status'] == 'success'
+    assert result_of(result, 'second')['error'] == main.PIPELINE_TIMEOUT_ERROR
+    assert result_of(result, 'out')['status'] in ('timeout', 'skipped')
+    assert result['total_execution_time'] < 2
+
+
+def test_timeout_option_must_be_positive(client):
+    response = client.post('/pipelines/parse', json={'nodes': [], 'edges': [], 'options': {'timeout_ms': 0}})
+    assert response.status_code == 422
+
+
+class DisconnectedRequest:
+    async def is_disconnected(self):
+        return True
+
+
+def test_disconnect_cancels_the_run(monkeypatch):
+    monkeypatch.setattr(main, 'DISCONNECT_POLL_INTERVAL', 0.01)
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def disconnect():
+        with pytest.raises(HTTPException) as e:
+            await main.cancel_on_disconnect(DisconnectedRequest(), work())
+        assert e.value.status_code == 499
+        await asyncio.sleep(0)
+
+    asyncio.run(disconnect())
+    assert cancelled == [True]
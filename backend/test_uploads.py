@@ -0,0 +1,101 @@
+# trunk-ignore-all(black)
+"""
+Tests for the upload store: size limit, completion scan and session expiry.
+
+    python -m pytest test_uploads.py
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from streaming import SNIFF_PREFIX_SIZE, sniff_format
+from uploads import UploadError, UploadNotFound, UploadStore, UploadTooLarge
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _upload(store, *chunks, complete=True):
+    async def upload():
+        handle = store.create('data.csv')
+        await store.append(handle.file_id, _chunks(*chunks))
+        if complete:
+            await store.complete(handle.file_id, sniff_format, SNIFF_PREFIX_SIZE)
+        return store.get(handle.file_id)
+    return asyncio.run(upload())
+
+
+def test_completion_scans_format_and_lines(tmp_path):
+    store = UploadStore(str(tmp_path))
+    handle = _upload(store, b'id,name\n1,a\n', b'2,b\n3,c')
+    assert handle.complete and handle.size == 19
+    assert handle.lines == 4
+    assert handle.format_info == {'format': 'csv', 'delimiter': ','}
+    assert handle.metadata()['format'] == 'csv'
+
+
+def test_scan_sniffs_only_a_prefix(tmp_path, monkeypatch):
+    monkeypatch.setattr('uploads.UPLOAD_CHUNK_SIZE', 7)
+    store = UploadStore(str(tmp_path))
+    handle = _upload(store, '[{"a": "é"}]\n'.encode() * 500)
+    assert handle.lines == 500
+    assert handle.format_info['format'] == 'json_array'
+
+
+def test_rejects_uploads_over_the_limit(tmp_path):
+    store = UploadStore(str(tmp_path), max_size=10)
+    with pytest.raises(UploadTooLarge):
+        _upload(store, b'12345', b'678901')
+    # What was received before the limit is kept, so the client can see where it stopped
+    [meta] = [name for name in os.listdir(tmp_path) if name.endswith('.json')]
+    assert store.get(meta[:-5]).size == 5
+
+
+def test_sweeps_abandoned_sessions_only(tmp_path):
+    store = UploadStore(str(tmp_path), session_ttl=60)
+    done = _upload(store, b'a\n')
+    abandoned = _upload(store, b'b\n', complete=False)
+    active = _upload(store, b'c\n', complete=False)
+    old = time.time() - 120
+    for handle in (done, abandoned):
+        os.utime(os.path.join(tmp_path, handle.file_id + '.json'), (old, old))
+    assert store.sweep() == 1
+    assert store.get(done.file_id).complete
+    assert store.get(active.file_id).size == 2
+    with pytest.raises(UploadNotFound):
+        store.get(abandoned.file_id)
+
+
+def test_completed_uploads_take_no_more_chunks(tmp_path):
+    store = UploadStore(str(tmp_path))
+    handle = _upload(store, b'x')
+    with pytest.raises(UploadError):
+        asyncio.run(store.append(handle.file_id, _chunks(b'y')))
+
+
+def test_endpoints_answer_413_over_the_limit(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    monkeypatch.setattr(main.upload_store, 'max_size', 8)
+    with TestClient(main.app) as client:
+        assert client.post('/uploads', files={'file': ('big.txt', b'0123456789')}).status_code == 413
+        session = client.post('/uploads/sessions', params={'name': 'big.txt'}).json()
+        try:
+            assert client.put(f"/uploads/{session['file_id']}/chunks", content=b'0123', params={'offset': 0}).status_code == 200
+            assert client.put(f"/uploads/{session['file_id']}/chunks", content=b'456789', params={'offset': 4}).status_code == 413
+            upload = client.post('/uploads', files={'file': ('small.csv', b'a,b\n1,2\n')}).json()
+            assert (upload['size'], upload['lines'], upload['format']) == (8, 2, 'csv')
+            pipeline = {
+                'nodes': [{'id': 'in', 'type': 'customInput', 'data': {'fileId': upload['file_id']}}],
+                'edges': []
+            }
+            response = client.post('/pipelines/parse', json=pipeline, headers={'cache-control': 'no-cache'}).json()
+            output = response['execution_results'][0]['output']
+            assert (output['lines'], output['format'], output['preview']) == (2, 'csv', 'a,b\n1,2\n')
+        finally:
+            main.upload_store.delete(session['file_id'])
+            main.upload_store.delete(upload['file_id'])
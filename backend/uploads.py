@@ -0,0 +1,282 @@
+# trunk-ignore-all(black)
+"""
+Local spill store for uploaded files.
+
+Uploads are written to disk in chunks and referenced from input nodes by a
+file handle, so large inputs never have to be embedded in the pipeline JSON or
+loaded into Python strings. Completing an upload reads it once in chunks to
+sniff its format and count its lines, which input nodes then report without
+touching the file. Uploads are capped at UPLOAD_MAX_SIZE bytes, and sessions
+left incomplete for UPLOAD_SESSION_TTL seconds are deleted.
+"""
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+import asyncio
+import codecs
+import io
+import json
+import os
+import re
+import time
+import uuid
+import weakref
+
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
+
+# Bytes read from the request body / written to disk per step
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Characters of the file shown wherever a node needs it as plain text
+PREVIEW_SIZE = 1024
+
+# Largest upload in bytes (0: no limit)
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', str(1024 ** 3)))
+# Seconds an incomplete upload may go without a chunk before it is deleted, and between sweeps
+UPLOAD_SESSION_TTL = float(os.getenv('UPLOAD_SESSION_TTL', str(24 * 3600)))
+UPLOAD_SWEEP_INTERVAL = float(os.getenv('UPLOAD_SWEEP_INTERVAL', '600'))
+
+_FILE_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """Raised for out-of-order chunks and writes to completed uploads"""
+
+
+class UploadNotFound(UploadError):
+    """Raised for unknown or malformed file ids"""
+
+
+class UploadTooLarge(UploadError):
+    """Raised when an upload would grow past UPLOAD_MAX_SIZE"""
+
+
+class FileHandle:
+    """Reference to an uploaded file; content is only read on demand"""
+    __slots__ = ('file_id', 'name', 'path', 'size', 'complete', 'created', 'format_info', 'lines')
+
+    def __init__(self, file_id: str, name: str, path: str, size: int, complete: bool, created: float, format_info: Optional[Dict[str, Any]] = None, lines: Optional[int] = None):
+        self.file_id = file_id
+        self.name = name
+        self.path = path
+        self.size = size
+        self.complete = complete
+        self.created = created
+        # Sniffed format and line count, known once the upload is complete
+        self.format_info = format_info
+        self.lines = lines
+
+    def open_text(self, encoding: str = 'utf-8') -> io.TextIOWrapper:
+        """Open the file as a text stream (used by RecordStream)"""
+        return open(self.path, 'r', encoding=encoding, errors='replace', newline='')
+
+    def iter_chunks(self, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def scan(self, sniff: Any, prefix_size: int) -> None:
+        """
+        Read the file once in chunks: sniff its format from the first
+        `prefix_size` characters with `sniff(prefix, complete)` and count lines.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        prefix = ''
+        lines = 0
+        last = b''
+        for chunk in self.iter_chunks():
+            if len(prefix) < prefix_size:
+                prefix += decoder.decode(chunk)
+            lines += chunk.count(b'\n')
+            last = chunk
+        complete = len(prefix) < prefix_size
+        if complete:
+            prefix += decoder.decode(b'', final=True)
+        # A last line without a line break counts too
+        self.lines = lines + (1 if last and not last.endswith(b'\n') else 0)
+        self.format_info = sniff(prefix[:prefix_size], complete)
+
+    def read_text(self, limit: int) -> str:
+        with self.open_text() as f:
+            return f.read(limit)
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            'file_id': self.file_id,
+            'name': self.name,
+            'size': self.size,
+            'complete': self.complete,
+            'created': self.created,
+            'format': self.format_info['format'] if self.format_info else None,
+            'lines': self.lines
+        }
+
+    def to_jsonable(self) -> Dict[str, Any]:
+        return self.metadata()
+
+    def __str__(self) -> str:
+        # Text-oriented nodes only ever see a bounded preview of the file
+        preview = self.read_text(PREVIEW_SIZE)
+        return preview + ('...' if self.size > len(preview) else '')
+
+    def __repr__(self) -> str:
+        return f'FileHandle({self.file_id!r}, size={self.size})'
+
+
+class UploadStore:
+    """Writes uploads to a local directory alongside a small JSON metadata file"""
+
+    def __init__(self, root: str = UPLOAD_DIR, max_size: int = UPLOAD_MAX_SIZE, session_ttl: float = UPLOAD_SESSION_TTL, sweep_interval: float = UPLOAD_SWEEP_INTERVAL):
+        self.root = root
+        self.max_size = max_size
+        self.session_ttl = session_ttl
+        self.sweep_interval = sweep_interval
+        self.swept = 0
+        self._sweeper: Optional[asyncio.Task] = None
+        # One lock per upload being written, so concurrent chunks can't interleave
+        self._locks: 'weakref.WeakValueDictionary[str, asyncio.Lock]' = weakref.WeakValueDictionary()
+
+    def _lock(self, file_id: str) -> asyncio.Lock:
+        lock = self._locks.get(file_id)
+        if lock is None:
+            lock = self._locks[file_id] = asyncio.Lock()
+        return lock
+
+    def _paths(self, file_id: str):
+        if not _FILE_ID_PATTERN.match(file_id or ''):
+            raise UploadNotFound(f'Invalid file id: {file_id}')
+        base = os.path.join(self.root, file_id)
+        return base + '.bin', base + '.json'
+
+    def _save_metadata(self, handle: FileHandle) -> None:
+        _, meta_path = self._paths(handle.file_id)
+        with open(meta_path, 'w') as f:
+            json.dump({'name': handle.name, 'size': handle.size, 'complete': handle.complete, 'created': handle.created, 'format_info': handle.format_info, 'lines': handle.lines}, f)
+
+    def create(self, name: str) -> FileHandle:
+        """Start a new (empty) upload"""
+        os.makedirs(self.root, exist_ok=True)
+        file_id = uuid.uuid4().hex
+        data_path, _ = self._paths(file_id)
+        open(data_path, 'wb').close()
+        handle = FileHandle(file_id, os.path.basename(name or 'upload') or 'upload', data_path, 0, False, time.time())
+        self._save_metadata(handle)
+        return handle
+
+    def get(self, file_id: str) -> FileHandle:
+        data_path, meta_path = self._paths(file_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except FileNotFoundError as e:
+            raise UploadNotFound(f'Unknown file id: {file_id}') from e
+        return FileHandle(file_id, meta['name'], data_path, meta['size'], meta['complete'], meta['created'], meta.get('format_info'), meta.get('lines'))
+
+    async def append(self, file_id: str, chunks: AsyncIterator[bytes], offset: Optional[int] = None) -> FileHandle:
+        """
+        Append a stream of byte chunks to an upload.
+
+        When `offset` is given it must match the bytes received so far, which
+        lets clients resume an interrupted chunked upload safely. Bytes past the
+        recorded size (left by a request that broke off) are overwritten, and the
+        size received is saved even if the stream fails. A chunk that would take
+        the upload past `max_size` raises UploadTooLarge and isn't written.
+        """
+        async with self._lock(file_id):
+            handle = self.get(file_id)
+            if handle.complete:
+                raise UploadError(f'Upload {file_id} is already complete')
+            if offset is not None and offset != handle.size:
+                raise UploadError(f'Expected offset {handle.size}, got {offset}')
+
+            f = await asyncio.to_thread(open, handle.path, 'r+b')
+            try:
+                await asyncio.to_thread(self._truncate, f, handle.size)
+                async for chunk in chunks:
+                    if chunk:
+                        if self.max_size and handle.size + len(chunk) > self.max_size:
+                            raise UploadTooLarge(f'Upload {file_id} exceeds the maximum size of {self.max_size} bytes')
+                        await asyncio.to_thread(f.write, chunk)
+                        handle.size += len(chunk)
+            finally:
+                await asyncio.to_thread(self._close, f, handle)
+        return handle
+
+    @staticmethod
+    def _truncate(f: Any, size: int) -> None:
+        f.seek(size)
+        f.truncate()
+
+    def _close(self, f: Any, handle: FileHandle) -> None:
+        try:
+            f.close()
+        finally:
+            self._save_metadata(handle)
+
+    async def complete(self, file_id: str, sniff: Any, prefix_size: int) -> FileHandle:
+        """Mark an upload complete after scanning it (see `FileHandle.scan`)"""
+        async with self._lock(file_id):
+            handle = self.get(file_id)
+            if not handle.complete:
+                await asyncio.to_thread(handle.scan, sniff, prefix_size)
+                handle.complete = True
+                await asyncio.to_thread(self._save_metadata, handle)
+        return handle
+
+    def delete(self, file_id: str) -> None:
+        for path in self._paths(file_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def sweep(self, max_age: Optional[float] = None) -> int:
+        """
+        Delete incomplete uploads that haven't received a chunk for `max_age`
+        seconds (the session TTL by default); returns how many were deleted.
+        """
+        cutoff = time.time() - (self.session_ttl if max_age is None else max_age)
+        deleted = 0
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            file_id, extension = os.path.splitext(entry.name)
+            if extension != '.json' or not _FILE_ID_PATTERN.match(file_id):
+                continue
+            try:
+                # The metadata is rewritten after every chunk
+                if entry.stat().st_mtime >= cutoff or self.get(file_id).complete:
+                    continue
+            except (OSError, ValueError, UploadError):
+                continue
+            lock = self._locks.get(file_id)
+            if lock is not None and lock.locked():
+                continue
+            self.delete(file_id)
+            deleted += 1
+        self.swept += deleted
+        return deleted
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Upload sweep error: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def start_sweeper(self) -> None:
+        if self.session_ttl > 0 and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_periodically())
+
+    async def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+
+upload_store = UploadStore()
@@ -0,0 +1,141 @@
+# trunk-ignore-all(black)
+"""
+Content negotiation for pipeline requests and responses.
+
+Request bodies may be JSON or MessagePack, optionally gzip/zstd compressed
+(`Content-Type` / `Content-Encoding`). Responses are encoded according to the
+client's `Accept` / `Accept-Encoding` headers. MessagePack and zstd support
+depend on the optional `msgpack` and `zstandard` packages.
+"""
+from typing import Any, Optional, Tuple
+import gzip
+import os
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+# Upper bound for decompressed request bodies, to guard against compression bombs
+MAX_DECOMPRESSED_SIZE = int(os.getenv('MAX_DECOMPRESSED_SIZE', str(256 * 1024 * 1024)))
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+class WireFormatError(Exception):
+    """Raised for request bodies that can't be decoded; carries an HTTP status"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def media_type(header: Optional[str]) -> str:
+    return (header or '').split(';', 1)[0].strip().lower()
+
+
+def _accepted(header: Optional[str]) -> list:
+    """Parse an Accept-style header into tokens ordered by preference (q=0 dropped)"""
+    tokens = []
+    for position, part in enumerate((header or '').split(',')):
+        fields = [f.strip() for f in part.split(';')]
+        token = fields[0].lower()
+        if not token:
+            continue
+        quality = 1.0
+        for field in fields[1:]:
+            if field.startswith('q='):
+                try:
+                    quality = float(field[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            tokens.append((-quality, position, token))
+    return [token for _, _, token in sorted(tokens)]
+
+
+def is_msgpack(value: str) -> bool:
+    return value in MSGPACK_MEDIA_TYPES
+
+
+def decompress(body: bytes, content_encoding: Optional[str]) -> bytes:
+    """Undo the request's Content-Encoding, bounded by MAX_DECOMPRESSED_SIZE"""
+    encoding = (content_encoding or 'identity').strip().lower()
+    if encoding in ('', 'identity'):
+        return body
+
+    if encoding in ('gzip', 'x-gzip'):
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            data = decompressor.decompress(body, MAX_DECOMPRESSED_SIZE + 1)
+        except zlib.error as e:
+            raise WireFormatError(400, f'Invalid gzip body: {str(e)}') from e
+    elif encoding == 'zstd':
+        if zstandard is None:
+            raise WireFormatError(415, 'zstd request bodies require the zstandard package')
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                data = reader.read(MAX_DECOMPRESSED_SIZE + 1)
+        except zstandard.ZstdError as e:
+            raise WireFormatError(400, f'Invalid zstd body: {str(e)}') from e
+    else:
+        raise WireFormatError(415, f'Unsupported Content-Encoding: {content_encoding}')
+
+    if len(data) > MAX_DECOMPRESSED_SIZE:
+        raise WireFormatError(413, 'Decompressed request body is too large')
+    return data
+
+
+def decode_msgpack(body: bytes) -> Any:
+    if msgpack is None:
+        raise WireFormatError(415, 'MessagePack requests require the msgpack package')
+    try:
+        return msgpack.unpackb(body, raw=False)
+    except (ValueError, msgpack.UnpackException) as e:
+        raise WireFormatError(400, f'Invalid MessagePack body: {str(e)}') from e
+
+
+def choose_media_type(accept: Optional[str]) -> str:
+    """Pick MessagePack only when the client prefers it and it is available"""
+    for token in _accepted(accept):
+        if is_msgpack(token) and msgpack is not None:
+            return MSGPACK_MEDIA_TYPES[0]
+        if token in (JSON_MEDIA_TYPE, 'application/*', '*/*'):
+            return JSON_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    for token in _accepted(accept_encoding):
+        if token == 'zstd' and zstandard is not None:
+            return 'zstd'
+        if token in ('gzip', 'x-gzip'):
+            return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """Compress a response body; small bodies are sent as is"""
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), 'zstd'
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), 'gzip'
+
+
+def encode_msgpack(payload: Any) -> bytes:
+    return msgpack.packb(payload, use_bin_type=True)